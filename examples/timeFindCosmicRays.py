@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+# Copyright 2008-2014 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+
+"""
+Time findCosmicRays on a synthetic image with different scanning options, checking that the
+results don't depend on them
+
+Run with:
+   python timeFindCosmicRays.py [--size N] [--nCR N] [--nCrPixelMax N] [--nThreads N] [--repeat N]
+
+e.g. --size 8192 --nCR 100000 --nCrPixelMax 2000000 for about a million CR pixels
+"""
+
+import argparse
+import time
+from math import sqrt, log
+
+import numpy as np
+
+import lsst.pex.config as pexConfig
+import lsst.afw.image as afwImage
+import lsst.meas.algorithms as measAlg
+
+def makeImage(size, nCR, seed=666):
+    """Make a MaskedImage of noise with nCR straight cosmic rays"""
+    rand = np.random.RandomState(seed)
+    mi = afwImage.MaskedImageF(size, size)
+    im = mi.getImage().getArray()
+    im[:] = 1000 + 10*rand.randn(size, size)
+    mi.getVariance().set(100)
+
+    for i in range(nCR):
+        x, y = rand.randint(0, size, 2)
+        dx, dy = [(1, 0), (0, 1), (1, 1), (1, -1)][rand.randint(4)]
+        for j in range(rand.randint(1, 20)):
+            xx, yy = x + j*dx, y + j*dy
+            if 0 <= xx < size and 0 <= yy < size:
+                im[yy, xx] += 1000*(1 + rand.uniform())
+
+    return mi
+
+def timeFindCosmicRays(mi, psf, repeat=3, **kwargs):
+    """Return the best time to run findCosmicRays on a copy of mi, the number of CRs, and the result"""
+    crConfig = measAlg.FindCosmicRaysConfig()
+    for k, v in kwargs.items():
+        setattr(crConfig, k, v)
+    policy = pexConfig.makePolicy(crConfig)
+
+    best = None
+    for i in range(repeat):
+        out = mi.Factory(mi, True)
+        t0 = time.time()
+        crs = measAlg.findCosmicRays(out, psf, 1000.0, policy)
+        dt = time.time() - t0
+        best = dt if best is None else min(best, dt)
+
+    return best, len(crs), out
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=2048, help="width and height of image")
+    parser.add_argument("--nCR", type=int, default=2000, help="number of cosmic rays to add")
+    parser.add_argument("--nCrPixelMax", type=int, default=None, help="maximum number of CR pixels")
+    parser.add_argument("--nThreads", type=int, default=4, help="number of threads to try")
+    parser.add_argument("--repeat", type=int, default=3, help="number of times to time each option")
+    args = parser.parse_args()
+
+    psf = measAlg.DoubleGaussianPsf(21, 21, 2.5/(2*sqrt(2*log(2))))
+    mi = makeImage(args.size, args.nCR)
+
+    options = [("serial scan", dict(useRowKernel=False, nThreads=1)),
+               ("row kernel", dict(useRowKernel=True, nThreads=1)),
+               ]
+    if args.nThreads > 1:
+        options.append(("row kernel, %d threads" % args.nThreads,
+                        dict(useRowKernel=True, nThreads=args.nThreads)))
+
+    reference = None
+    for name, kwargs in options:
+        if args.nCrPixelMax is not None:
+            kwargs["nCrPixelMax"] = args.nCrPixelMax
+        dt, nCR, out = timeFindCosmicRays(mi, psf, repeat=args.repeat, **kwargs)
+        if reference is None:
+            reference = (nCR, out)
+            same = True
+        else:
+            same = (nCR == reference[0] and
+                    (out.getImage().getArray() == reference[1].getImage().getArray()).all() and
+                    (out.getMask().getArray() == reference[1].getMask().getArray()).all())
+        print "%-30s %8.3fs  %5d CRs  %s" % (name, dt, nCR, "" if same else "*** results differ ***")
+
+if __name__ == "__main__":
+    main()
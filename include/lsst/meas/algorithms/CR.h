@@ -29,6 +29,7 @@
 //
 #include <vector>
 #include "lsst/base.h"
+#include "lsst/afw/geom/Point.h"
 #include "lsst/afw/image/MaskedImage.h"
 
 namespace lsst { namespace afw {
@@ -41,6 +42,28 @@ namespace lsst {
 namespace meas {
 namespace algorithms {
 
+/**
+ * @brief The PSF-dependent thresholds used by condition #3 of findCosmicRays
+ *
+ * These depend only on the PSF at a point and the policy's cond3_fac2, so when the same PSF is used
+ * for several calls to findCosmicRays (e.g. for the amplifiers of a CCD) they may be computed once
+ * and reused.
+ */
+class CrThresholds {
+public:
+    /// Compute the thresholds from the PSF at a point
+    CrThresholds(lsst::afw::detection::Psf const & psf,   ///< the image's PSF
+                 lsst::afw::geom::Point2D const & position, ///< where to evaluate the PSF
+                 double cond3Fac2                         ///< 2nd fiddle factor for condition #3
+                );
+
+    double getThresH() const { return _thresH; } ///< horizontal threshold
+    double getThresV() const { return _thresV; } ///< vertical threshold
+    double getThresD() const { return _thresD; } ///< diagonal threshold
+private:
+    double _thresH, _thresV, _thresD;
+};
+
 template <typename MaskedImageT>
 std::vector<boost::shared_ptr<lsst::afw::detection::Footprint> >
 findCosmicRays(MaskedImageT& image,
@@ -50,6 +73,21 @@ findCosmicRays(MaskedImageT& image,
                bool const keep = false
               );
 
+template <typename MaskedImageT>
+std::vector<boost::shared_ptr<lsst::afw::detection::Footprint> >
+findCosmicRays(MaskedImageT& image,
+               CrThresholds const &thresholds,
+               double const bkgd,
+               lsst::pex::policy::Policy const& policy,
+               bool const keep = false
+              );
+
+template <typename MaskedImageT>
+void removeCosmicRays(MaskedImageT& image,
+                      std::vector<boost::shared_ptr<lsst::afw::detection::Footprint> > const& crs,
+                      double const bkgd
+                     );
+
 }}}
 
 #endif
@@ -32,9 +32,15 @@
 #include "lsst/afw/table/types.h"
 #include "lsst/afw/geom/Box.h"
 #include "lsst/afw/math/warpExposure.h"
+#include "lsst/afw/geom/XYTransform.h"
 
 namespace lsst { namespace meas { namespace algorithms {
 
+class WarpedPsf;
+
+// Spatial index of CoaddPsf inputs in coadd pixel coordinates; defined only in the source file.
+class CoaddPsfInputIndex;
+
 /**
  *  @brief CoaddPsf is the Psf derived to be used for non-PSF-matched Coadd images.
  *
@@ -99,6 +105,95 @@ public:
     /// Return the bounding box (in component image Pixel coordinates) of the component image at index
     afw::geom::Box2I getBBox(int index);
 
+    /**
+     *  @brief Use precomputed grids of local affine approximations to the coadd-to-input transforms.
+     *
+     *  Warping each input Psf requires the local linearization of the transform from coadd to input
+     *  pixels, which normally goes through both Wcss.  When enabled, a grid of linearizations is
+     *  precomputed over each input's footprint on the coadd, and interpolated bilinearly.  Each grid is
+     *  refined until the interpolated position and linear terms agree with the exact ones to within
+     *  the tolerance; inputs for which this isn't possible keep using the exact transform.
+     *
+     *  The setting is not persisted.
+     *
+     *  @param[in] tolerance  Maximum difference (in input pixels for the position, and per pixel for
+     *                        the linear terms) between the interpolated and exact linearizations; 0
+     *                        disables the grids.
+     */
+    void setAffineTransformGridTolerance(double tolerance);
+
+    /// Return the affine transform grid tolerance (0 if the grids are disabled)
+    double getAffineTransformGridTolerance() const { return _affineTransformGridTolerance; }
+
+    /**
+     *  @brief Set the tolerance for skipping the warp of component Psfs whose local distortion is
+     *         pixel-aligned (see WarpedPsf::setFastPathTolerance).
+     *
+     *  This is common for inputs that share the coadd's tangent plane and pixel scale.  The setting is
+     *  not persisted.
+     *
+     *  @param[in] tolerance  Maximum displacement in pixels; 0 (the default) disables the fast path.
+     */
+    void setWarpFastPathTolerance(double tolerance);
+
+    /// Return the tolerance for the pixel-aligned warp fast path (0 if it is disabled)
+    double getWarpFastPathTolerance() const { return _warpFastPathTolerance; }
+
+    /// Return the number of component Psf images computed without warping
+    std::size_t getWarpFastPathCount() const { return _warpFastPathCount; }
+
+    /**
+     *  @brief Set the number of threads used to warp the component Psfs.
+     *
+     *  With more than one thread, the component Psfs of each kernel image are warped in parallel
+     *  (using OpenMP; without OpenMP support, they are warped serially), each thread with its own
+     *  warping kernel.  They are always summed in the same order, so the result does not depend on
+     *  the number of threads.  Components are warped serially if two inputs share the same Psf object,
+     *  as Psfs may not be evaluated concurrently.
+     *
+     *  The setting is not persisted.
+     *
+     *  @param[in] threadCount  Number of threads; 1 (the default) disables threading.
+     */
+    void setThreadCount(int threadCount);
+
+    /// Return the number of threads used to warp the component Psfs
+    int getThreadCount() const { return int(_warpingControls.size()); }
+
+    /**
+     *  @brief Enable, resize or disable the cache of realised kernel images.
+     *
+     *  Cache entries are keyed by position, color and the set of input images that contain the
+     *  position at which the Psf is computed, and are evicted in least-recently-used order once more than capacity images are
+     *  held.  Changing the cache settings discards all cached images and resets the hit/miss counters.
+     *
+     *  The cache is a runtime setting only; it is not persisted, and is not shared with clones.
+     *
+     *  @param[in] capacity         Maximum number of kernel images to keep; 0 disables the cache.
+     *  @param[in] positionQuantum  If positive, positions are snapped to the centre of a square cell
+     *                              of this size (in coadd pixels) before the Psf is computed, so all
+     *                              positions within a cell share a single cache entry; the inputs used
+     *                              are those containing the cell's centre (if the centre isn't in any
+     *                              input, the Psf is computed at the requested position, uncached).
+     *                              If zero, only evaluations at exactly the same position are shared.
+     */
+    void setKernelImageCacheSize(std::size_t capacity, double positionQuantum=0.0);
+
+    /// Return the maximum number of kernel images kept in the cache (0 if the cache is disabled)
+    std::size_t getKernelImageCacheSize() const;
+
+    /// Return the size of the cells positions are snapped to before a cache lookup
+    double getKernelImageCachePositionQuantum() const;
+
+    /// Return the number of kernel image computations satisfied from the cache
+    std::size_t getKernelImageCacheHits() const;
+
+    /// Return the number of kernel image computations that missed the cache
+    std::size_t getKernelImageCacheMisses() const;
+
+    /// Discard all cached kernel images and reset the hit/miss counters
+    void clearKernelImageCache() const;
+
     /**
      *  @brief Return true if the CoaddPsf persistable (always true).
      *
@@ -120,6 +215,12 @@ protected:
         afw::image::Color const & color
     ) const;
 
+    // Shares the component WarpedPsfs between points that are covered by the same inputs.
+    virtual std::vector<PTR(afw::detection::Psf::Image)> doComputeKernelImages(
+        std::vector<afw::geom::Point2D> const & points,
+        afw::image::Color const & color
+    ) const;
+
     // See afw::table::io::Persistable::getPersistenceName
     virtual std::string getPersistenceName() const;
 
@@ -140,12 +241,63 @@ protected:
 
 private:
 
+    // LRU cache of kernel images; defined only in the source file.
+    class KernelImageCache;
+
+    // Set up the exact coadd-to-input transforms
+    void _initInputTransforms();
+
+    // Make the warped Psfs of the given inputs; component k uses warping control k % getThreadCount()
+    std::vector<CONST_PTR(WarpedPsf)> _makeComponents(std::vector<std::size_t> const & inputs) const;
+
+    // Add the number of fast-path warps of the given components to the total
+    void _countFastPaths(std::vector<CONST_PTR(WarpedPsf)> const & components) const;
+
+    // Return true if the component Psfs of the given inputs may be warped in parallel
+    bool _canWarpInParallel(std::vector<std::size_t> const & inputs) const;
+
+    // Warp components [begin, end) at the given position; in parallel, begin must be a multiple of
+    // getThreadCount()
+    std::vector<PTR(afw::detection::Psf::Image)> _warpComponents(
+        afw::geom::Point2D const & position,
+        afw::image::Color const & color,
+        std::vector<CONST_PTR(WarpedPsf)> const & components,
+        int begin,
+        int end,
+        bool parallel
+    ) const;
+
+    // Return the inputs to use for the Psf at ccdXY, setting position to the point at which the Psf
+    // is to be computed and cacheable to whether the result may be cached
+    std::vector<std::size_t> _getInputs(
+        afw::geom::Point2D const & ccdXY,
+        afw::geom::Point2D & position,
+        bool & cacheable
+    ) const;
+
+    // Compute the kernel image at position from the given inputs (which must contain position) and
+    // their warped Psfs, using the cache if cacheable
+    PTR(afw::detection::Psf::Image) _computeKernelImage(
+        afw::geom::Point2D const & position,
+        afw::image::Color const & color,
+        std::vector<std::size_t> const & inputs,
+        std::vector<CONST_PTR(WarpedPsf)> const & components,
+        bool cacheable
+    ) const;
+
     afw::table::ExposureCatalog _catalog;
     CONST_PTR(afw::image::Wcs) _coaddWcs;
     afw::table::Key<double> _weightKey;
     afw::geom::Point2D _averagePosition;
     std::string _warpingKernelName;   // could be removed if we could get this from _warpingControl (#2949)
     CONST_PTR(afw::math::WarpingControl) _warpingControl;
+    std::vector<CONST_PTR(afw::math::WarpingControl)> _warpingControls;   // one per thread
+    CONST_PTR(CoaddPsfInputIndex) _inputIndex;
+    std::vector<CONST_PTR(afw::geom::XYTransform)> _inputTransforms;   // coadd to input pixels, per input
+    double _affineTransformGridTolerance;
+    double _warpFastPathTolerance;
+    mutable std::size_t _warpFastPathCount;
+    PTR(KernelImageCache) _kernelImageCache;  // null if caching is disabled
 };
 
 }}} // namespace lsst::meas::algorithms
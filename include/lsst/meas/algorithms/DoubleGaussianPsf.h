@@ -68,6 +68,31 @@ protected:
     virtual void write(OutputArchiveHandle & handle) const;
 
 private:
+
+    // Analytic overrides of the generic kernel machinery: the image is a sum of outer products of
+    // 1-d Gaussians, and the shape and aperture flux are those of the continuous profile if the
+    // kernel's box doesn't truncate it significantly (otherwise they are measured from the kernel
+    // image, as in ImagePsf).
+
+    // Return true if the kernel's box is large enough for the analytic shape and aperture flux
+    bool isAnalytic() const;
+
+    virtual PTR(Image) doComputeKernelImage(
+        afw::geom::Point2D const & position, afw::image::Color const & color
+    ) const;
+
+    virtual double doComputeApertureFlux(
+        double radius, afw::geom::Point2D const & position, afw::image::Color const & color
+    ) const;
+
+    virtual afw::geom::ellipses::Quadrupole doComputeShape(
+        afw::geom::Point2D const & position, afw::image::Color const & color
+    ) const;
+
+    virtual std::vector<afw::geom::ellipses::Quadrupole> doComputeShapes(
+        std::vector<afw::geom::Point2D> const & points, afw::image::Color const & color
+    ) const;
+
     double _sigma1;
     double _sigma2;
     double _b;
@@ -23,6 +23,9 @@
 #ifndef LSST_MEAS_ALGORITHMS_ImagePsf_h_INCLUDED
 #define LSST_MEAS_ALGORITHMS_ImagePsf_h_INCLUDED
 
+#include <vector>
+
+#include "ndarray.h"
 #include "lsst/afw/detection/Psf.h"
 
 namespace lsst { namespace meas { namespace algorithms {
@@ -33,8 +36,42 @@ namespace lsst { namespace meas { namespace algorithms {
  *  ImagePsf exists only to provide implementations of doComputeApertureFlux and doComputeShape
  *  for its derived classes.  These implementations use the SincFlux and SdssShape algorithms
  *  defined in meas_algorithms, and hence could not be included with the Psf base class in afw.
+ *
+ *  It also provides batch versions of computeKernelImage and computeShape, which derived classes
+ *  may specialize to share work between positions.
  */
 class ImagePsf : public afw::table::io::PersistableFacade<ImagePsf>, public afw::detection::Psf {
+public:
+
+    /**
+     *  @brief Compute the kernel images at many positions at once.
+     *
+     *  @param[in] points  Array of shape (N, 2) holding the (x, y) positions; positions with NaN
+     *                     coordinates are replaced by getAveragePosition(), as in computeKernelImage.
+     *  @param[in] color   Color of the source.
+     *
+     *  @return an array of shape (N, H, W), with H and W odd and just large enough to hold all N kernel
+     *          images.  Each image is zero-padded so that its origin falls on pixel [i, H//2, W//2].
+     */
+    ndarray::Array<double,3,3> computeKernelImages(
+        ndarray::Array<double const,2,1> const & points,
+        afw::image::Color const & color=afw::image::Color()
+    ) const;
+
+    /**
+     *  @brief Compute the second moments of the Psf at many positions at once.
+     *
+     *  @param[in] points  Array of shape (N, 2) holding the (x, y) positions; positions with NaN
+     *                     coordinates are replaced by getAveragePosition(), as in computeShape.
+     *  @param[in] color   Color of the source.
+     *
+     *  @return an array of shape (N, 3) holding (Ixx, Iyy, Ixy) for each position.
+     */
+    ndarray::Array<double,2,2> computeShapes(
+        ndarray::Array<double const,2,1> const & points,
+        afw::image::Color const & color=afw::image::Color()
+    ) const;
+
 protected:
  
     explicit ImagePsf(bool isFixed=false) : afw::detection::Psf(isFixed) {}
@@ -47,6 +84,23 @@ protected:
         afw::geom::Point2D const & position, afw::image::Color const & color
     ) const;
 
+    /**
+     *  Batch implementation of computeKernelImage, used by computeKernelImages; the returned images
+     *  are not modified.  The default implementation calls computeKernelImage for each point.
+     */
+    virtual std::vector<PTR(Image)> doComputeKernelImages(
+        std::vector<afw::geom::Point2D> const & points, afw::image::Color const & color
+    ) const;
+
+    /**
+     *  Batch implementation of computeShape, used by computeShapes.  The default implementation
+     *  measures the images from doComputeKernelImages in the same way as doComputeShape, so derived
+     *  classes that override doComputeShape should override this as well.
+     */
+    virtual std::vector<afw::geom::ellipses::Quadrupole> doComputeShapes(
+        std::vector<afw::geom::Point2D> const & points, afw::image::Color const & color
+    ) const;
+
 };
 
 }}} // namespace lsst::meas::algorithms
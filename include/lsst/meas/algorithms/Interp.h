@@ -106,12 +106,47 @@ private:
     unsigned int _type;                 //!< Type of defect
 };
 
+/**
+ * @brief The Defects to be patched in images with a given bounding box, clipped, sorted, and classified
+ * row by row
+ *
+ * Building a plan does everything interpolateOverDefects needs that doesn't depend on the pixel values,
+ * so a plan may be built once per detector and applied to many images.
+ */
+class DefectInterpolationPlan {
+public:
+    typedef boost::shared_ptr<DefectInterpolationPlan> Ptr;
+    typedef boost::shared_ptr<DefectInterpolationPlan const> ConstPtr;
+
+    DefectInterpolationPlan(std::vector<Defect::Ptr> const &badList,
+                            lsst::afw::geom::BoxI const &bbox,
+                            int nThreads=1
+                           );
+
+    /// Return the (PARENT) bounding box of the images that the plan applies to
+    lsst::afw::geom::BoxI getBBox() const { return _bbox; }
+    /// Return the 1-D Defects in row y (0-indexed, relative to the bounding box's origin)
+    std::vector<Defect::Ptr> const &getRow(int y) const { return _rows.at(y); }
+private:
+    lsst::afw::geom::BoxI _bbox;
+    std::vector<std::vector<Defect::Ptr> > _rows;
+};
+
+template <typename MaskedImageT>
+void interpolateOverDefects(MaskedImageT &image,
+                            DefectInterpolationPlan const &plan,
+                            double fallbackValue = 0.0,
+                            bool useFallbackValueAtEdge=false,
+                            int nThreads=1
+                           );
+
 template <typename MaskedImageT>
 void interpolateOverDefects(MaskedImageT &image,
                             lsst::afw::detection::Psf const &psf,
                             std::vector<Defect::Ptr> &badList,
                             double fallbackValue = 0.0,
-                            bool useFallbackValueAtEdge=false
+                            bool useFallbackValueAtEdge=false,
+                            int nThreads=1
                            );
 
 }}} // lsst::meas::algorithms::interp
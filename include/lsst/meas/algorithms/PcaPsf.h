@@ -51,6 +51,17 @@ public:
     /// PcaPsf always has a LinearCombinationKernel, so we can override getKernel to make it more useful.
     PTR(afw::math::LinearCombinationKernel const) getKernel() const;
 
+protected:
+
+    /**
+     *  Batch implementation of computeKernelImage: the eigen-images are computed once for all the points,
+     *  and combined with the spatial functions evaluated at each point, rather than being recomputed
+     *  for every point.
+     */
+    virtual std::vector<PTR(Image)> doComputeKernelImages(
+        std::vector<afw::geom::Point2D> const & points, afw::image::Color const & color
+    ) const;
+
 private:
 
     // Name used in table persistence; the rest of is implemented by KernelPsf.
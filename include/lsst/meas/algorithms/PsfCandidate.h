@@ -31,9 +31,13 @@
  *
  * @ingroup algorithms
  */
+#include <map>
+#include <string>
 #include <vector>
 
 #include "boost/make_shared.hpp"
+#include "boost/tuple/tuple.hpp"
+#include "boost/tuple/tuple_comparison.hpp"
 
 #include "lsst/pex/policy.h"
 
@@ -79,9 +83,9 @@ namespace algorithms {
         ) :
             afw::math::SpatialCellMaskedImageCandidate<PixelT>(source->getX(), source->getY()),
             _parentExposure(parentExposure),
-            _offsetImage(),
+            _images(), _offsetImages(),
             _source(source),
-            _haveImage(false),
+            _cacheVersion(_extractionVersion),
             _amplitude(0.0), _var(1.0)
         {}
         
@@ -96,9 +100,9 @@ namespace algorithms {
         ) :
             afw::math::SpatialCellMaskedImageCandidate<PixelT>(xCenter, yCenter),
             _parentExposure(parentExposure),
-            _offsetImage(),
+            _images(), _offsetImages(),
             _source(source),
-            _haveImage(false),
+            _cacheVersion(_extractionVersion),
             _amplitude(0.0), _var(1.0)
         {}
         
@@ -129,8 +133,9 @@ namespace algorithms {
     
         CONST_PTR(afw::image::MaskedImage<PixelT>) getMaskedImage() const;
         CONST_PTR(afw::image::MaskedImage<PixelT>) getMaskedImage(int width, int height) const;
-        PTR(afw::image::MaskedImage<PixelT>) getOffsetImage(std::string const algorithm,
-                                                            unsigned int buffer) const;
+        CONST_PTR(afw::image::MaskedImage<PixelT>) getOffsetImage(std::string const algorithm,
+                                                                  unsigned int buffer) const;
+        void clearImageCache() const;
 
         /// Return the number of pixels being ignored around the candidate image's edge
         static int getBorderWidth() { return _border; }
@@ -141,13 +146,23 @@ namespace algorithms {
         /// Set threshold for rejecting pixels unconnected with the central footprint
         ///
         /// A non-positive threshold means that no threshold will be applied.
-        static void setPixelThreshold(float threshold) { _pixelThreshold = threshold; }
+        static void setPixelThreshold(float threshold) {
+            if (threshold != _pixelThreshold) {
+                _pixelThreshold = threshold;
+                ++_extractionVersion;
+            }
+        }
 
         /// Get threshold for rejecting pixels unconnected with the central footprint
         static float getPixelThreshold() { return _pixelThreshold; }
 
         /// Set whether blends are masked
-        static void setMaskBlends(bool doMaskBlends) { _doMaskBlends = doMaskBlends; }
+        static void setMaskBlends(bool doMaskBlends) {
+            if (doMaskBlends != _doMaskBlends) {
+                _doMaskBlends = doMaskBlends;
+                ++_extractionVersion;
+            }
+        }
 
         /// Get whether blends are masked
         static bool getMaskBlends() { return _doMaskBlends; }
@@ -165,10 +180,17 @@ namespace algorithms {
         PTR(afw::image::MaskedImage<PixelT>)
         extractImage(unsigned int width, unsigned int height) const;
 
-        PTR(afw::image::MaskedImage<PixelT>) mutable _offsetImage; // %image offset to put center on a pixel
+        void validateImageCache() const;
+
+        typedef std::map<std::pair<int, int>, PTR(MaskedImageT)> ImageCache; // keyed by (width, height)
+        // keyed by (width, height, algorithm, buffer)
+        typedef std::map<boost::tuple<int, int, std::string, unsigned int>, PTR(MaskedImageT)> OffsetImageCache;
+
+        ImageCache mutable _images;                 // %images of the Source, as returned by getMaskedImage
+        OffsetImageCache mutable _offsetImages;     // %images offset to put center on a pixel
         PTR(afw::table::SourceRecord) _source; // the Source itself
 
-        bool mutable _haveImage;                    // do we have an Image to return?
+        int mutable _cacheVersion;                  // value of _extractionVersion when caches were filled
         double _amplitude;                          // best-fit amplitude of current PSF model
         double _var;                                // variance to use when fitting this candidate
         static int _border;                         // width of border of ignored pixels around _image
@@ -176,6 +198,7 @@ namespace algorithms {
         static int _defaultWidth;
         static float _pixelThreshold; ///< Threshold for masking pixels unconnected with central footprint
         static bool _doMaskBlends;    ///< Mask blends when extracting?
+        static int _extractionVersion; ///< Incremented whenever the way we extract images changes
     };
     
     /**
@@ -31,10 +31,12 @@
  *
  * @ingroup algorithms
  */
+#include <string>
 #include <utility>
 #include <vector>
 
 #include "boost/shared_ptr.hpp"
+#include "ndarray.h"
 
 #include "lsst/afw.h"
 #include "lsst/pex/policy.h"
@@ -69,7 +71,8 @@ fitSpatialKernelFromPsfCandidates(lsst::afw::math::Kernel *kernel,
                                   lsst::afw::math::SpatialCellSet const& psfCells,
                                   int const nStarPerCell = -1,
                                   double const tolerance = 1e-5,
-                                  double const lambda = 0.0);
+                                  double const lambda = 0.0,
+                                  int const nThreads = 1);
 template<typename PixelT>
 std::pair<bool, double>
 fitSpatialKernelFromPsfCandidates(lsst::afw::math::Kernel *kernel,
@@ -77,7 +80,18 @@ fitSpatialKernelFromPsfCandidates(lsst::afw::math::Kernel *kernel,
                                   bool const doNonLinearFit,
                                   int const nStarPerCell = -1,
                                   double const tolerance = 1e-5, 
-                                  double const lambda = 0.0);
+                                  double const lambda = 0.0,
+                                  int const nThreads = 1);
+template<typename PixelT>
+std::pair<bool, std::pair<double, std::string> >
+fitSpatialKernelFromPsfCandidates(lsst::afw::math::Kernel *kernel,
+                                  lsst::afw::math::SpatialCellSet const& psfCells,
+                                  bool const doNonLinearFit,
+                                  int const nStarPerCell,
+                                  double const tolerance,
+                                  double const lambda,
+                                  int const nThreads,
+                                  std::string const& solver);
    
 template<typename ImageT>
 double subtractPsf(lsst::afw::detection::Psf const& psf, ImageT *data, double x, double y,
@@ -93,6 +107,12 @@ std::pair<lsst::afw::math::Kernel::Ptr, std::pair<double, double> >
 fitKernelToImage(lsst::afw::math::LinearCombinationKernel const& kernel,
                  Image const& image, lsst::afw::geom::Point2D const& pos);
 
+template<typename PixelT>
+ndarray::Array<double,2,2>
+computeKernelParamResiduals(lsst::afw::math::LinearCombinationKernel const& kernel,
+                            lsst::afw::math::SpatialCellSet const& psfCells,
+                            int const nThreads = 1);
+
 }}}
 
 #endif
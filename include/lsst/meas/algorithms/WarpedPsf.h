@@ -77,6 +77,25 @@ public:
     /// Polymorphic deep copy.  Usually unnecessary, as Psfs are immutable.
     virtual PTR(afw::detection::Psf) clone() const;
 
+    /**
+     *  @brief Set the tolerance for skipping the warp when the local distortion is pixel-aligned.
+     *
+     *  If the linearized distortion at a point maps the pixel grid onto itself (the identity, or a
+     *  combination of axis flips and transposition) to within the tolerance, the undistorted kernel
+     *  image is copied pixel-by-pixel instead of being resampled with the warping kernel.
+     *
+     *  @param[in] tolerance  Maximum displacement, in pixels, anywhere in the kernel image between the
+     *                        linearized distortion and the pixel-aligned one; 0 (the default) disables
+     *                        the fast path.
+     */
+    void setFastPathTolerance(double tolerance);
+
+    /// Return the tolerance for the pixel-aligned fast path (0 if it is disabled)
+    double getFastPathTolerance() const { return _fastPathTolerance; }
+
+    /// Return the number of kernel images computed without warping
+    std::size_t getFastPathCount() const { return _fastPathCount; }
+
 protected:
 
     virtual PTR(afw::detection::Psf::Image) doComputeKernelImage(
@@ -90,6 +109,8 @@ protected:
 private:
     void _init();
     CONST_PTR(afw::math::WarpingControl) _warpingControl;
+    double _fastPathTolerance;
+    mutable std::size_t _fastPathCount;
 };
 
 }}} // namespace lsst::meas::algorithms
@@ -0,0 +1,69 @@
+// -*- LSST-C++ -*-
+
+/*
+ * LSST Data Management System
+ * Copyright 2008-2015 LSST Corporation.
+ *
+ * This product includes software developed by the
+ * LSST Project (http://www.lsst.org/).
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the LSST License Statement and
+ * the GNU General Public License along with this program.  If not,
+ * see <http://www.lsstcorp.org/LegalNotices/>.
+ */
+
+#ifndef LSST_MEAS_ALGORITHMS_DETAIL_GaussianPsfUtils_h_INCLUDED
+#define LSST_MEAS_ALGORITHMS_DETAIL_GaussianPsfUtils_h_INCLUDED
+
+/*
+ * Helpers shared by the analytic evaluation paths of SingleGaussianPsf and DoubleGaussianPsf;
+ * not part of the public interface.
+ */
+#include <cmath>
+#include <vector>
+#include "boost/math/special_functions/erf.hpp"
+#include "lsst/afw/math/Kernel.h"
+
+namespace lsst { namespace meas { namespace algorithms { namespace detail {
+
+/// The analytic shape and aperture flux of a Gaussian Psf are only used if the kernel's box truncates
+/// less than this fraction of the continuous profile's flux; otherwise they are measured from the
+/// kernel image.
+double const MAX_TRUNCATED_FRACTION = 1E-6;
+
+/// Return the fraction of a unit circular Gaussian's flux that falls outside the kernel's box
+inline double computeTruncatedFraction(afw::math::Kernel const & kernel, double sigma) {
+    double const c = 1.0/(std::sqrt(2.0)*sigma);
+    double const inX = 1.0 - 0.5*(boost::math::erfc((kernel.getCtrX() + 0.5)*c)
+                                  + boost::math::erfc((kernel.getWidth() - kernel.getCtrX() - 0.5)*c));
+    double const inY = 1.0 - 0.5*(boost::math::erfc((kernel.getCtrY() + 0.5)*c)
+                                  + boost::math::erfc((kernel.getHeight() - kernel.getCtrY() - 0.5)*c));
+    return 1.0 - inX*inY;
+}
+
+/// Fill a vector with exp(-x^2/(2 sigma^2)) at the pixel offsets x = i - ctr, returning its sum;
+/// this is the same 1-d function the Gaussian kernels evaluate.
+inline double fillGaussian(std::vector<double> & values, int ctr, double sigma) {
+    double const c = -0.5/(sigma*sigma);
+    double sum = 0.0;
+    for (std::size_t i = 0; i < values.size(); ++i) {
+        double const x = static_cast<int>(i) - ctr;
+        values[i] = std::exp(c*x*x);
+        sum += values[i];
+    }
+    return sum;
+}
+
+}}}} // namespace lsst::meas::algorithms::detail
+
+#endif // !LSST_MEAS_ALGORITHMS_DETAIL_GaussianPsfUtils_h_INCLUDED
@@ -25,6 +25,7 @@ from .defects import *
 from .psfDeterminerRegistry import *
 from .starSelectorRegistry import *
 from .findCosmicRaysConfig import *
+from .findCosmicRaysInTiles import *
 from .detection import *
 from .gaussianPsfFactory import *
 from .replaceWithNoise import *
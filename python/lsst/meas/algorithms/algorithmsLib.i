@@ -109,6 +109,7 @@ namespace lsst { namespace meas { namespace algorithms { namespace interp {} nam
 %shared_ptr(lsst::meas::algorithms::Defect);
 %shared_vec(lsst::meas::algorithms::Defect::Ptr);
 %shared_ptr(std::vector<lsst::meas::algorithms::Defect::Ptr>);
+%shared_ptr(lsst::meas::algorithms::DefectInterpolationPlan);
 
 %include "lsst/meas/algorithms/Interp.h"
 
@@ -144,6 +145,10 @@ namespace lsst { namespace meas { namespace algorithms { namespace interp {} nam
                                   lsst::afw::image::MaskedImage<PIXTYPE,
                                                                 lsst::afw::image::MaskPixel,
                                                                 lsst::afw::image::VariancePixel> >;
+    %template(removeCosmicRays) lsst::meas::algorithms::removeCosmicRays<
+                                    lsst::afw::image::MaskedImage<PIXTYPE,
+                                                                  lsst::afw::image::MaskPixel,
+                                                                  lsst::afw::image::VariancePixel> >;
     %template(interpolateOverDefects) lsst::meas::algorithms::interpolateOverDefects<
                                           lsst::afw::image::MaskedImage<PIXTYPE,
                                                                         lsst::afw::image::MaskPixel,
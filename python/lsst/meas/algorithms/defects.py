@@ -22,6 +22,8 @@
 
 """Support for image defects"""
 
+import collections
+
 import lsst.afw.image as afwImage
 import lsst.afw.geom as afwGeom
 import lsst.pex.policy as policy
@@ -55,3 +57,40 @@ def policyToBadRegionList(policyFile):
     del badPixelsPolicy
 
     return badPixels
+
+# The plans made by getDefectInterpolationPlan, least recently used first
+_defectInterpolationPlanCache = collections.OrderedDict()
+maxDefectInterpolationPlans = 20        # the most plans that getDefectInterpolationPlan will keep
+
+def getDefectInterpolationPlan(defectList, bbox, detector=None):
+    """Return a DefectInterpolationPlan for the images with the given bounding box, reusing the one made
+    by a previous call with the same detector, bbox and defects
+
+    The maxDefectInterpolationPlans most recently used plans are kept.  If detector is None the plan
+    isn't cached.
+
+    @param[in] defectList  list of Defects (e.g. from policyToBadRegionList)
+    @param[in] bbox        PARENT bounding box of the images to be patched
+    @param[in] detector    lsst.afw.cameraGeom.Detector that the defects belong to, or None
+    """
+    if detector is None:
+        return algorithmsLib.DefectInterpolationPlan(defectList, bbox)
+
+    defectBoxes = []
+    for defect in defectList:
+        dbox = defect.getBBox()
+        defectBoxes.append((dbox.getMinX(), dbox.getMinY(), dbox.getWidth(), dbox.getHeight()))
+    key = (detector.getName(), bbox.getMinX(), bbox.getMinY(), bbox.getWidth(), bbox.getHeight(),
+           tuple(defectBoxes))
+
+    plan = _defectInterpolationPlanCache.pop(key, None)
+    if plan is None:
+        plan = algorithmsLib.DefectInterpolationPlan(defectList, bbox)
+    _defectInterpolationPlanCache[key] = plan # (re)insert it as the most recently used
+    while len(_defectInterpolationPlanCache) > maxDefectInterpolationPlans:
+        _defectInterpolationPlanCache.popitem(last=False)
+    return plan
+
+def clearDefectInterpolationPlanCache():
+    """Forget all the plans made by getDefectInterpolationPlan"""
+    _defectInterpolationPlanCache.clear()
@@ -20,6 +20,7 @@
 # see <http://www.lsstcorp.org/LegalNotices/>.
 #
 import lsst.pex.config as pexConfig
+from . import algorithmsLib
 
 class FindCosmicRaysConfig(pexConfig.Config):
     """Config for the findCosmicRays function
@@ -59,3 +60,28 @@ class FindCosmicRaysConfig(pexConfig.Config):
         doc = "Don't interpolate over CR pixels",
         default = False,
     )
+    tileSize = pexConfig.Field(
+        dtype = int,
+        doc = "size of the tiles used by findCosmicRaysInTiles, each of which may have up to nCrPixelMax "
+        "contaminated pixels; if <= 0, use a single tile",
+        default = 2048,
+    )
+    useRowKernel = pexConfig.Field(
+        dtype = bool,
+        doc = "apply condition 2 for CRs a row at a time (faster, with identical results); see CR.cc code",
+        default = True,
+    )
+    nThreads = pexConfig.Field(
+        dtype = int,
+        doc = "number of threads to use when scanning for CR pixels; the results don't depend on it",
+        default = 1,
+    )
+
+    def makeThresholds(self, psf, position):
+        """Return the CrThresholds used by findCosmicRays for an image with PSF psf
+
+        @param[in] psf       PSF of the image
+        @param[in] position  lsst.afw.geom.Point2D at which to evaluate the PSF (findCosmicRays uses the
+                             centre of the image, in the image's local coordinates)
+        """
+        return algorithmsLib.CrThresholds(psf, position, self.cond3_fac2)
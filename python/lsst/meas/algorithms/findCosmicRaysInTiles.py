@@ -0,0 +1,198 @@
+#
+# LSST Data Management System
+# Copyright 2008-2014 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+"""Find cosmic rays in a MaskedImage a tile at a time"""
+import lsst.pex.config as pexConfig
+import lsst.pex.exceptions as pexExceptions
+import lsst.afw.detection as afwDetection
+import lsst.afw.geom as afwGeom
+import lsst.afw.image as afwImage
+import lsst.pipe.base as pipeBase
+from . import algorithmsLib
+
+__all__ = ["findCosmicRaysInTiles"]
+
+# Each tile is searched together with this many pixels of its neighbours, so that the pixels near its edges
+# are tested using the same neighbouring pixels as in the whole image; findCosmicRays doesn't look for CRs
+# in the outer two rows and columns of the image it's given, so this must be at least 2
+tileBorder = 8
+
+def findCosmicRaysInTiles(maskedImage, psf, bkgd, config, keepCRs=None, log=None, thresholds=None):
+    """Find (and by default remove) the cosmic rays in a MaskedImage, one tile at a time
+
+    The image is divided into tiles of config.tileSize pixels on a side, and findCosmicRays is run on
+    a copy of each grown by tileBorder pixels, using the same thresholds for all of them (by default
+    derived from the PSF at the centre of the whole image).  The CRs found in each copy (including
+    those in its border) are then trimmed to the tile, the pieces of CRs that cross the boundaries
+    between tiles are merged, and (unless keepCRs is true) they are all removed at once, so the result
+    doesn't depend on the order of the tiles.
+
+    This is almost, but not exactly, the same as searching the whole image.  The tests that
+    findCosmicRays applies to a whole CR (min_DN, and growing the CR into its neighbouring pixels) only
+    see the part of a CR that crosses a boundary that lies within the tile and its border, so a faint
+    CR crossing a boundary may be found in one tile but not the other, or not at all.
+
+    Each tile is allowed up to config.nCrPixelMax CR pixels (counting those in its border); a tile that
+    has more is left untouched and reported, rather than abandoning the entire image.
+
+    @param[in,out] maskedImage  MaskedImage to search
+    @param[in] psf     PSF of maskedImage
+    @param[in] bkgd    unsubtracted background of maskedImage, DN
+    @param[in] config  FindCosmicRaysConfig
+    @param[in] keepCRs  if True, don't remove the CRs; if None use config.keepCRs
+    @param[in] log     log for warnings about tiles with too many CR pixels (may be None)
+    @param[in] thresholds  CrThresholds to use (e.g. from config.makeThresholds, computed once for all
+                           the images sharing a PSF); if None they're computed from psf
+
+    @return a lsst.pipe.base.Struct with fields:
+     - crs: list of the Footprints of the CRs that were found
+     - overflowedTiles: list of the bounding boxes (lsst.afw.geom.Box2I) of tiles that had too many
+       CR pixels
+    """
+    if keepCRs is None:
+        keepCRs = config.keepCRs
+    policy = pexConfig.makePolicy(config)
+
+    bbox = maskedImage.getBBox(afwImage.PARENT)
+    tileSize = config.tileSize if config.tileSize > 0 else max(bbox.getWidth(), bbox.getHeight())
+
+    if thresholds is None:
+        thresholds = config.makeThresholds(psf, afwGeom.Point2D(bbox.getWidth()/2.0, bbox.getHeight()/2.0))
+
+    crs = []                            # the CRs found in each tile, trimmed to the tile
+    seamPixels = {}                     # the index in crs of the CR covering each pixel on a tile boundary
+    overflowedTiles = []
+    for y0 in range(bbox.getMinY(), bbox.getMaxY() + 1, tileSize):
+        for x0 in range(bbox.getMinX(), bbox.getMaxX() + 1, tileSize):
+            tileBBox = afwGeom.Box2I(afwGeom.Point2I(x0, y0), afwGeom.Extent2I(tileSize, tileSize))
+            tileBBox.clip(bbox)
+            readBBox = afwGeom.Box2I(tileBBox)
+            readBBox.grow(tileBorder)
+            readBBox.clip(bbox)
+            #
+            # Search a copy, so that every tile sees the original pixels of its neighbours
+            #
+            tile = maskedImage.Factory(maskedImage, readBBox, afwImage.PARENT, True)
+            try:
+                tileCrs = algorithmsLib.findCosmicRays(tile, thresholds, bkgd, policy, True)
+            except pexExceptions.LengthError:
+                if log:
+                    log.log(log.WARN, "Too many CR pixels (max %d) in tile %s" %
+                            (config.nCrPixelMax, tileBBox))
+                overflowedTiles.append(tileBBox)
+                continue
+
+            for cr in tileCrs:
+                cr = _clipFootprint(cr, tileBBox)
+                if cr is None:
+                    continue
+                for xy in _getSeamPixels(cr, tileBBox, bbox):
+                    seamPixels[xy] = len(crs)
+                crs.append(cr)
+
+    crs = _mergeAcrossSeams(crs, seamPixels)
+
+    crBit = maskedImage.getMask().getPlaneBitMask("CR")
+    if keepCRs:
+        afwDetection.setMaskFromFootprintList(maskedImage.getMask(), crs, crBit)
+    else:
+        algorithmsLib.removeCosmicRays(maskedImage, crs, bkgd)
+
+    return pipeBase.Struct(
+        crs = crs,
+        overflowedTiles = overflowedTiles,
+    )
+
+def _clipFootprint(footprint, bbox):
+    """Return the part of footprint that lies within bbox, or None if there isn't any"""
+    if bbox.contains(footprint.getBBox()):
+        return footprint
+
+    clipped = afwDetection.Footprint()
+    for span in footprint.getSpans():
+        y, x0, x1 = span.getY(), max(span.getX0(), bbox.getMinX()), min(span.getX1(), bbox.getMaxX())
+        if bbox.getMinY() <= y <= bbox.getMaxY() and x0 <= x1:
+            clipped.addSpan(y, x0, x1)
+    if clipped.getNpix() == 0:
+        return None
+    clipped.normalize()
+    return clipped
+
+def _getSeamPixels(footprint, tileBBox, bbox):
+    """Return the pixels of a Footprint in tileBBox that lie on the boundary with another tile in bbox"""
+    minX = tileBBox.getMinX() if tileBBox.getMinX() > bbox.getMinX() else None
+    maxX = tileBBox.getMaxX() if tileBBox.getMaxX() < bbox.getMaxX() else None
+    minY = tileBBox.getMinY() if tileBBox.getMinY() > bbox.getMinY() else None
+    maxY = tileBBox.getMaxY() if tileBBox.getMaxY() < bbox.getMaxY() else None
+
+    crBBox = footprint.getBBox()
+    if crBBox.getMinX() != minX and crBBox.getMaxX() != maxX and \
+            crBBox.getMinY() != minY and crBBox.getMaxY() != maxY:
+        return []
+
+    pixels = []
+    for span in footprint.getSpans():
+        y, x0, x1 = span.getY(), span.getX0(), span.getX1()
+        if y == minY or y == maxY:
+            pixels += [(x, y) for x in range(x0, x1 + 1)]
+        else:
+            if x0 == minX:
+                pixels.append((x0, y))
+            if x1 == maxX:
+                pixels.append((x1, y))
+    return pixels
+
+def _mergeAcrossSeams(footprints, seamPixels):
+    """Merge the Footprints that touch across the boundaries between tiles (i.e. the parts of CRs that
+    were found in different tiles), returning the new list of Footprints
+
+    seamPixels maps each pixel (x, y) on a tile boundary to the index of the Footprint containing it;
+    as the Footprints from one tile don't touch each other, two Footprints touch if and only if one of
+    these pixels is a neighbour of one of the other's.  The Footprints are modified in place.
+    """
+    parent = range(len(footprints))     # a disjoint-set forest over the footprints
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for (x, y), i in seamPixels.iteritems():
+        for xy in ((x - 1, y - 1), (x, y - 1), (x + 1, y - 1), (x - 1, y), (x + 1, y),
+                   (x - 1, y + 1), (x, y + 1), (x + 1, y + 1)):
+            j = seamPixels.get(xy)
+            if j is not None:
+                ri, rj = find(i), find(j)
+                if ri != rj:
+                    parent[max(ri, rj)] = min(ri, rj)
+
+    merged = []
+    for i, fp in enumerate(footprints):
+        r = find(i)                     # the smallest index in i's set, so we've already seen it
+        if r == i:
+            merged.append(fp)
+        else:
+            cr = footprints[r]
+            for span in fp.getSpans():
+                cr.addSpan(span.getY(), span.getX0(), span.getX1())
+            cr.normalize()
+
+    return merged
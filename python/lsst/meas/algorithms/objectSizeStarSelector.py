@@ -32,10 +32,9 @@ import lsst.pex.config as pexConfig
 import lsst.pex.logging as pexLogging
 import lsst.afw.display.ds9 as ds9
 import lsst.afw.math as afwMath
-import lsst.afw.geom as afwGeom
-import lsst.afw.geom.ellipses as geomEllip
 import lsst.afw.cameraGeom as cameraGeom
 from . import algorithmsLib
+from .utils import getSourceMoments
 from lsst.meas.algorithms.starSelectorRegistry import starSelectorRegistry
 
 class ObjectSizeStarSelectorConfig(pexConfig.Config):
@@ -128,24 +127,46 @@ class EventHandler(object):
 #-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 
 def _assignClusters(yvec, centers):
-    """Return a vector of centerIds based on their distance to the centers"""
+    """Return a vector of centerIds based on their distance to the centers
+
+    Ties go to the lowest-numbered center, and centers that are NaN (e.g. those of empty clusters)
+    are never chosen; if the first center is NaN all points are assigned to it.
+    """
     assert len(centers) > 0
 
-    minDist = numpy.nan*numpy.ones_like(yvec)
-    clusterId = numpy.empty_like(yvec)
-    clusterId.dtype = int               # zeros_like(..., dtype=int) isn't in numpy 1.5
+    centers = numpy.asarray(centers, dtype=float)
+    if numpy.isnan(centers[0]):
+        return numpy.zeros(len(yvec), dtype=int)
 
-    for i, mean in enumerate(centers):
-        dist = abs(yvec - mean)
-        if i == 0:
-            update = dist == dist       # True for all points
-        else:
-            update = dist < minDist
+    dist = numpy.abs(numpy.subtract.outer(centers, yvec)) # shape (nCluster, len(yvec))
+    dist[numpy.isnan(dist)] = numpy.inf
+    return numpy.argmin(dist, axis=0)
 
-        minDist[update] = dist[update]
-        clusterId[update] = i
+def _clusterCenters(ysorted, clusterId, nCluster, useMedian):
+    """Return the mean or median of each cluster; empty clusters have a NaN center
 
-    return clusterId
+    \param[in] ysorted   the points, in ascending order
+    \param[in] clusterId the cluster ID for each point in ysorted (all in [0, nCluster))
+
+    Stably sorting the points by clusterId leaves each cluster's members contiguous and still in
+    ascending order, so all the medians can be read off directly.
+    """
+    counts = numpy.bincount(clusterId, minlength=nCluster)
+    centers = numpy.empty(nCluster)
+    centers[:] = numpy.nan
+    nonEmpty = counts > 0
+
+    if useMedian:
+        grouped = ysorted[numpy.argsort(clusterId, kind="mergesort")]
+        starts = numpy.cumsum(counts) - counts
+        lo = (starts + (counts - 1)//2)[nonEmpty]
+        hi = (starts + counts//2)[nonEmpty]
+        centers[nonEmpty] = 0.5*(grouped[lo] + grouped[hi])
+    else:
+        sums = numpy.bincount(clusterId, weights=ysorted, minlength=nCluster)
+        centers[nonEmpty] = sums[nonEmpty]/counts[nonEmpty]
+
+    return centers
 
 def _kcenters(yvec, nCluster,  useMedian=False):
     """A classic k-means algorithm, clustering yvec into nCluster clusters
@@ -159,33 +180,40 @@ def _kcenters(yvec, nCluster,  useMedian=False):
        "e.g. why not use the Forgy or random partition initialization methods"
     however, the approach adopted here seems to work well for the particular sorts of things
     we're clustering in this application
+
+    The points are sorted once up front, so each iteration costs one assignment and one stable
+    sort of the cluster IDs rather than a median per cluster.
     """
 
     assert nCluster > 0
 
-    mean0 = sorted(yvec)[len(yvec)//10] # guess
+    yvec = numpy.asarray(yvec, dtype=float)
+    order = numpy.argsort(yvec, kind="mergesort")
+    ysorted = yvec[order]
+
+    mean0 = ysorted[len(yvec)//10] # guess
     centers = mean0*numpy.arange(1, nCluster + 1)
-        
-    func = numpy.median if useMedian else numpy.mean
 
-    clusterId = numpy.zeros_like(yvec) - 1            # which cluster the points are assigned to
-    clusterId.dtype = int                             # zeros_like(..., dtype=int) isn't in numpy 1.5
+    clusterId = numpy.empty(len(yvec), dtype=int) # which cluster the points are assigned to
+    clusterId[:] = -1
     while True:
         oclusterId = clusterId
-        clusterId = _assignClusters(yvec, centers)
+        clusterId = _assignClusters(ysorted, centers)
 
         if numpy.all(clusterId == oclusterId):
             break
 
-        for i in range(nCluster):
-            centers[i] = func(yvec[clusterId == i])
+        centers = _clusterCenters(ysorted, clusterId, nCluster, useMedian)
+
+    result = numpy.empty_like(clusterId)
+    result[order] = clusterId
 
-    return centers, clusterId
+    return centers, result
 
 def _improveCluster(yvec, centers, clusterId, nsigma=2.0, nIteration=10, clusterNum=0):
     """Improve our estimate of one of the clusters (clusterNum) by sigma-clipping around its median"""
 
-    nMember = sum(clusterId == clusterNum)
+    nMember = numpy.count_nonzero(clusterId == clusterNum)
     if nMember < 5:  # can't compute meaningful interquartile range, so no chance of improvement
         return clusterId
     for iter in range(nIteration):
@@ -197,18 +225,18 @@ def _improveCluster(yvec, centers, clusterId, nsigma=2.0, nIteration=10, cluster
         centers[clusterNum] = numpy.median(yv)
         stdev = numpy.std(yv)
 
-        syv = sorted(yv)
-        stdev_iqr = 0.741*(syv[int(0.75*nMember)] - syv[int(0.25*nMember)])
+        i25, i75 = int(0.25*nMember), int(0.75*nMember)
+        syv = numpy.partition(yv, [i25, i75])
+        stdev_iqr = 0.741*(syv[i75] - syv[i25])
 
         sd = stdev if stdev < stdev_iqr else stdev_iqr
 
         if False:
             print "sigma(iqr) = %.3f, sigma = %.3f" % (stdev_iqr, numpy.std(yv))
         newCluster0 = abs(yvec - centers[clusterNum]) < nsigma*sd
-        clusterId[numpy.logical_and(inCluster0, newCluster0)] = clusterNum
         clusterId[numpy.logical_and(inCluster0, numpy.logical_not(newCluster0))] = -1
         
-        nMember = sum(clusterId == clusterNum)
+        nMember = numpy.count_nonzero(clusterId == clusterNum)
         if nMember == old_nMember:
             break
 
@@ -307,20 +335,7 @@ class ObjectSizeStarSelector(object):
         #
         flux = catalog.get(self._sourceFluxField)
 
-        xx = numpy.empty(len(catalog))
-        xy = numpy.empty_like(xx)
-        yy = numpy.empty_like(xx)
-        for i, source in enumerate(catalog):
-            Ixx, Ixy, Iyy = source.getIxx(), source.getIxy(), source.getIyy()
-            if pixToTanXYTransform:
-                p = afwGeom.Point2D(source.getX(), source.getY())
-                linTransform = pixToTanXYTransform.linearizeForwardTransform(p).getLinear()
-                m = geomEllip.Quadrupole(Ixx, Iyy, Ixy)
-                m.transform(linTransform)
-                Ixx, Iyy, Ixy = m.getIxx(), m.getIyy(), m.getIxy()
-
-            xx[i], xy[i], yy[i] = Ixx, Ixy, Iyy
-            
+        xx, xy, yy = getSourceMoments(catalog, pixToTanXYTransform)
         width = numpy.sqrt(xx + yy)
 
         badFlags = self._badFlags
@@ -428,10 +443,8 @@ class ObjectSizeStarSelector(object):
         #
         with ds9.Buffering():
             psfCandidateList = []
-            for isStellar, source in zip(stellar, [s for g, s in zip(good, catalog) if g]):
-                if not isStellar:
-                    continue
-                
+            for i in numpy.flatnonzero(good)[stellar]:
+                source = catalog[int(i)]
                 try:
                     psfCandidate = algorithmsLib.makePsfCandidate(source, exposure)
                     # The setXXX methods are class static, but it's convenient to call them on
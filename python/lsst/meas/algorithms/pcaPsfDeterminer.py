@@ -139,6 +139,21 @@ class PcaPsfDeterminerConfig(pexConfig.Config):
         dtype = bool,
         default = True,
     )
+    nThreads = pexConfig.Field(
+        doc = "Number of threads to use when fitting and clipping the PSF's spatial model "
+              "(if OpenMP is available)",
+        dtype = int,
+        default = 1,
+    )
+    spatialSolver = pexConfig.ChoiceField(
+        doc = "Solver for the linear spatial fit's normal equations (ignored if nonLinearSpatialFit)",
+        dtype = str,
+        default = "ldlt",
+        allowed = {
+            "ldlt" : "LDL^T decomposition, falling back to SVD if the equations are poorly conditioned",
+            "svd" : "Singular value decomposition",
+        },
+    )
 
 class PcaPsfDeterminer(object):
     """!
@@ -187,13 +202,14 @@ class PcaPsfDeterminer(object):
                        for l in eigenValues]
 
         # Fit spatial model
-        status, chi2 = algorithmsLib.fitSpatialKernelFromPsfCandidates(
+        status, (chi2, solver) = algorithmsLib.fitSpatialKernelFromPsfCandidates(
             kernel, psfCellSet, bool(self.config.nonLinearSpatialFit),
-            self.config.nStarPerCellSpatialFit, self.config.tolerance, self.config.lam)
+            self.config.nStarPerCellSpatialFit, self.config.tolerance, self.config.lam,
+            self.config.nThreads, self.config.spatialSolver)
 
         psf = algorithmsLib.PcaPsf(kernel)
 
-        return psf, eigenValues, nEigen, chi2
+        return psf, eigenValues, nEigen, chi2, solver
 
 
     def determinePsf(self, exposure, psfCandidateList, metadata=None, flagKey=None):
@@ -346,7 +362,7 @@ class PcaPsfDeterminer(object):
                 #
                 # First, estimate the PSF
                 #
-                psf, eigenValues, nEigenComponents, fitChi2 = \
+                psf, eigenValues, nEigenComponents, fitChi2, fitSolver = \
                     self._fitPsf(exposure, psfCellSet, actualKernelSize, nEigenComponents)
                 #
                 # In clipping, allow all candidates to be innocent until proven guilty on this iteration.
@@ -402,35 +418,21 @@ class PcaPsfDeterminer(object):
             # downweights the component.
             #
 
-            residuals = list()
-            candidates = list()
             kernel = psf.getKernel()
             noSpatialKernel = afwMath.cast_LinearCombinationKernel(psf.getKernel())
-            for cell in psfCellSet.getCellList():
-                for cand in cell.begin(False):
-                    cand = algorithmsLib.cast_PsfCandidateF(cand)
-                    candCenter = afwGeom.PointD(cand.getXCenter(), cand.getYCenter())
-                    try:
-                        im = cand.getMaskedImage(kernel.getWidth(), kernel.getHeight())
-                    except Exception, e:
-                        continue
-
-                    fit = algorithmsLib.fitKernelParamsToImage(noSpatialKernel, im, candCenter)
-                    params = fit[0]
-                    kernels = fit[1]
-                    amp = 0.0
-                    for p, k in zip(params, kernels):
-                        amp += p * afwMath.cast_FixedKernel(k).getSum()
-
-                    predict = [kernel.getSpatialFunction(k)(candCenter.getX(), candCenter.getY()) for
-                               k in range(kernel.getNKernelParameters())]
-
-                    #print cand.getSource().getId(), [a / amp for a in params], predict
-
-                    residuals.append([a / amp - p for a, p in zip(params, predict)])
-                    candidates.append(cand)
+            #
+            # The residuals are in the same order as we iterate over the candidates, with rows of NaNs
+            # for those that we couldn't fit
+            #
+            residuals = algorithmsLib.computeKernelParamResiduals(noSpatialKernel, psfCellSet,
+                                                                  self.config.nThreads)
+            candidates = [algorithmsLib.cast_PsfCandidateF(cand)
+                          for cell in psfCellSet.getCellList() for cand in cell.begin(False)]
+            assert len(candidates) == residuals.shape[0]
 
-            residuals = numpy.array(residuals)
+            good = numpy.isfinite(residuals).all(axis=1)
+            residuals = residuals[good]
+            candidates = [cand for cand, isGood in zip(candidates, good) if isGood]
 
             for k in range(kernel.getNKernelParameters()):
                 if False:
@@ -453,12 +455,10 @@ class PcaPsfDeterminer(object):
                 if display:
                     print "Mean for component %d is %f" % (k, mean)
                     print "RMS for component %d is %f" % (k, rms)
-                badCandidates = list()
-                for i, cand in enumerate(candidates):
-                    if numpy.fabs(residuals[i,k] - mean) > self.config.spatialReject * rms:
-                        badCandidates.append(i)
-
-                badCandidates.sort(key=lambda x: numpy.fabs(residuals[x,k] - mean), reverse=True)
+                deviation = numpy.fabs(residuals[:,k] - mean)
+                badCandidates = numpy.where(deviation > self.config.spatialReject * rms)[0]
+                # worst first; a stable sort keeps ties in candidate order
+                badCandidates = badCandidates[numpy.argsort(-deviation[badCandidates], kind="mergesort")]
 
                 numBad = int(len(badCandidates) * (iter + 1) / self.config.nIterForPsf + 0.5)
 
@@ -552,7 +552,7 @@ class PcaPsfDeterminer(object):
                         break
 
         # One last time, to take advantage of the last iteration
-        psf, eigenValues, nEigenComponents, fitChi2 = \
+        psf, eigenValues, nEigenComponents, fitChi2, fitSolver = \
             self._fitPsf(exposure, psfCellSet, actualKernelSize, nEigenComponents)
 
         #
@@ -610,6 +610,7 @@ class PcaPsfDeterminer(object):
 
         if metadata != None:
             metadata.set("spatialFitChi2", fitChi2)
+            metadata.set("spatialFitSolver", fitSolver)
             metadata.set("numGoodStars", numGoodStars)
             metadata.set("numAvailStars", numAvailStars)
             metadata.set("avgX", avgX)
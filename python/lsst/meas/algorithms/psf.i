@@ -65,6 +65,8 @@ lsst::afw::image::MaskedImage<PIXTYPE, lsst::afw::image::MaskPixel, lsst::afw::i
 
 %ignore PsfFactoryBase;
 
+%declareNumPyConverters(ndarray::Array<double,2,2>)
+
 %include "lsst/meas/algorithms/PSF.h"
 %include "lsst/meas/algorithms/PsfCandidate.h"
 %include "lsst/meas/algorithms/SpatialModelPsf.h"
@@ -81,11 +83,13 @@ lsst::afw::image::MaskedImage<PIXTYPE, lsst::afw::image::MaskPixel, lsst::afw::i
 %template(pair_Psf_vector_double) std::pair<lsst::afw::math::LinearCombinationKernel::Ptr, std::vector<double> >;
 %template(pair_vector_double_KernelList) std::pair<std::vector<double>, lsst::afw::math::KernelList>;
 %template(pair_bool_double) std::pair<bool, double>;
+%template(pair_bool_pair_double_string) std::pair<bool, std::pair<double, std::string> >;
 %template(pair_Kernel_double_double) std::pair<lsst::afw::math::Kernel::Ptr, std::pair<double, double> >;
 
 %template(createKernelFromPsfCandidates) lsst::meas::algorithms::createKernelFromPsfCandidates<float>;
 %template(fitSpatialKernelFromPsfCandidates) lsst::meas::algorithms::fitSpatialKernelFromPsfCandidates<float>;
 %template(countPsfCandidates) lsst::meas::algorithms::countPsfCandidates<float>;
+%template(computeKernelParamResiduals) lsst::meas::algorithms::computeKernelParamResiduals<float>;
 %template(subtractPsf) lsst::meas::algorithms::subtractPsf<%MASKEDIMAGE(float)>;
 %template(fitKernelParamsToImage) lsst::meas::algorithms::fitKernelParamsToImage<%MASKEDIMAGE(float)>;
 %template(fitKernelToImage) lsst::meas::algorithms::fitKernelToImage<%MASKEDIMAGE(float)>;
@@ -98,6 +102,9 @@ lsst::afw::image::MaskedImage<PIXTYPE, lsst::afw::image::MaskPixel, lsst::afw::i
 
 %import "lsst/afw/table/io/ioLib.i"
 
+%declareNumPyConverters(ndarray::Array<double const,2,1>)
+%declareNumPyConverters(ndarray::Array<double,3,3>)
+
 %declareTablePersistable(ImagePsf, lsst::meas::algorithms::ImagePsf);
 %declareTablePersistable(KernelPsf, lsst::meas::algorithms::KernelPsf);
 %declareTablePersistable(SingleGaussianPsf, lsst::meas::algorithms::SingleGaussianPsf);
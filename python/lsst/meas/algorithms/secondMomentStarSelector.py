@@ -25,16 +25,14 @@ import math
 import numpy
 
 import lsst.pex.config as pexConfig
-import lsst.afw.detection as afwDetection
 import lsst.afw.display.ds9 as ds9
 import lsst.afw.image as afwImage
 import lsst.afw.math as afwMath
-import lsst.afw.table as afwTable
 import lsst.afw.geom as afwGeom
 import lsst.afw.geom.ellipses as geomEllip
 import lsst.afw.cameraGeom as cameraGeom
 from . import algorithmsLib
-from lsst.meas.base.sfm import SingleFrameMeasurementTask, SingleFrameMeasurementConfig
+from .utils import getSourceMoments
 
 class SecondMomentStarSelectorConfig(pexConfig.Config):
     fluxLim = pexConfig.Field(
@@ -126,6 +124,20 @@ class CheckSource(object):
             return False
         return True
 
+    def mask(self, catalog):
+        """Return a boolean array saying which sources in catalog pass; equivalent to calling self on each"""
+        if not catalog.isContiguous():
+            catalog = catalog.copy(deep=True)
+        good = numpy.ones(len(catalog), dtype=bool)
+        for k in self.keys:
+            good &= numpy.logical_not(catalog.get(k))
+        psfFlux = catalog.getPsfFlux()
+        if self.fluxLim != None:
+            good &= numpy.logical_not(psfFlux < self.fluxLim) # ignore faint objects
+        if self.fluxMax != 0.0:
+            good &= numpy.logical_not(psfFlux > self.fluxMax) # ignore bright objects
+        return good
+
 class SecondMomentStarSelector(object):
     ConfigClass = SecondMomentStarSelectorConfig
 
@@ -164,16 +176,24 @@ class SecondMomentStarSelector(object):
         # Create an Image of Ixx v. Iyy, i.e. a 2-D histogram
         #
 
+        # Everything we need is computed once, as columns: which sources are good, and their moments
+        # both as measured and undistorted
+        #
+        pixToTanXYTransform = None
+        if detector is not None:
+            tanSys = detector.makeCameraSys(cameraGeom.TAN_PIXELS)
+            pixToTanXYTransform = detector.getTransformMap().get(tanSys)
+
+        isGood = isGoodSource.mask(catalog)
+        ixx, ixy, iyy = getSourceMoments(catalog)
+        tanIxx, tanIxy, tanIyy = getSourceMoments(catalog, pixToTanXYTransform)
+
         # Use stats on our Ixx/yy values to determine the xMax/yMax range for clump image
-        iqqList = []
-        for s in catalog:
-            ixx, iyy = s.getIxx(), s.getIyy()
-            # ignore NaN and unrealistically large values
-            if (ixx == ixx and ixx < self.config.histMomentMax and
-                iyy == iyy and iyy < self.config.histMomentMax and
-                isGoodSource(s)):
-                iqqList.append(s.getIxx())
-                iqqList.append(s.getIyy())
+        # ignoring NaN and unrealistically large values
+        with numpy.errstate(invalid="ignore"):
+            useForStats = numpy.logical_and(isGood, numpy.logical_and(ixx < self.config.histMomentMax,
+                                                                      iyy < self.config.histMomentMax))
+        iqqList = numpy.column_stack((ixx[useForStats], iyy[useForStats])).ravel().tolist()
         stat = afwMath.makeStatistics(iqqList, afwMath.MEANCLIP | afwMath.STDEVCLIP | afwMath.MAX)
         iqqMean = stat.getValue(afwMath.MEANCLIP)
         iqqStd = stat.getValue(afwMath.STDEVCLIP)
@@ -188,21 +208,20 @@ class SecondMomentStarSelector(object):
         psfHist = _PsfShapeHistogram(detector=detector, xSize=self.config.histSize, ySize=self.config.histSize,
                                      ixxMax=iqqLimit, iyyMax=iqqLimit)
 
+        inserted = numpy.zeros(len(catalog), dtype=bool)
+        inserted[isGood] = psfHist.insertMoments(tanIxx[isGood], tanIyy[isGood])
+
         if display and displayExposure:
             frame = 0
             ds9.mtv(mi, frame=frame, title="PSF candidates")
     
-        with ds9.Buffering():
-            for source in catalog:
-                if isGoodSource(source):
-                    if psfHist.insert(source): # n.b. this call has the side effect of inserting
-                         ctype = ds9.GREEN # good
+            with ds9.Buffering():
+                for source, good, ins in zip(catalog, isGood, inserted):
+                    if good:
+                        ctype = ds9.GREEN if ins else ds9.MAGENTA # good, rejected
                     else:
-                         ctype = ds9.MAGENTA # rejected
-                else:
-                    ctype = ds9.RED         # bad
+                        ctype = ds9.RED         # bad
 
-                if display and displayExposure:
                     ds9.dot("o", source.getX() - mi.getX0(),
                             source.getY() - mi.getY0(), frame=frame, ctype=ctype)
 
@@ -216,54 +235,41 @@ class SecondMomentStarSelector(object):
         #
         psfCandidateList = []
 
-        pixToTanXYTransform = None
-        if detector is not None:
-            tanSys = detector.makeCameraSys(cameraGeom.TAN_PIXELS)
-            pixToTanXYTransform = detector.getTransformMap().get(tanSys)
-    
         # psf candidate shapes must lie within this many RMS of the average shape
         # N.b. if Ixx == Iyy, Ixy = 0 the criterion is
         # dx^2 + dy^2 < self.config.clumpNSigma*(Ixx + Iyy) == 2*self.config.clumpNSigma*Ixx
-        for source in catalog:
-            if not isGoodSource(source): continue
-            Ixx, Ixy, Iyy = source.getIxx(), source.getIxy(), source.getIyy()
-            if pixToTanXYTransform:
-                p = afwGeom.Point2D(source.getX(), source.getY())
-                linTransform = pixToTanXYTransform.linearizeForwardTransform(p).getLinear()
-                m = geomEllip.Quadrupole(Ixx, Iyy, Ixy)
-                m.transform(linTransform)
-                Ixx, Iyy, Ixy = m.getIxx(), m.getIyy(), m.getIxy()
-            
-            x, y = psfHist.momentsToPixel(Ixx, Iyy)
+        x, y = psfHist.momentsToPixel(tanIxx, tanIyy)
+        inClump = numpy.zeros(len(catalog), dtype=bool)
+        with numpy.errstate(invalid="ignore"):
             for clump in clumps:
                 dx, dy = (x - clump.x), (y - clump.y)
+                # A test for > would be confused by NaN
+                inClump |= numpy.sqrt(clump.a*dx*dx + 2*clump.b*dx*dy + clump.c*dy*dy) < \
+                    2*self.config.clumpNSigma
+
+        for i in numpy.flatnonzero(numpy.logical_and(isGood, inClump)):
+            source = catalog[int(i)]
+            try:
+                psfCandidate = algorithmsLib.makePsfCandidate(source, exposure)
+
+                # The setXXX methods are class static, but it's convenient to call them on
+                # an instance as we don't know Exposure's pixel type
+                # (and hence psfCandidate's exact type)
+                if psfCandidate.getWidth() == 0:
+                    psfCandidate.setBorderWidth(self.config.borderWidth)
+                    psfCandidate.setWidth(self.config.kernelSize + 2*self.config.borderWidth)
+                    psfCandidate.setHeight(self.config.kernelSize + 2*self.config.borderWidth)
 
-                if math.sqrt(clump.a*dx*dx + 2*clump.b*dx*dy + clump.c*dy*dy) < 2*self.config.clumpNSigma:
-                    # A test for > would be confused by NaN
-                    if not isGoodSource(source):
-                        continue
-                    try:
-                        psfCandidate = algorithmsLib.makePsfCandidate(source, exposure)
-                        
-                        # The setXXX methods are class static, but it's convenient to call them on
-                        # an instance as we don't know Exposure's pixel type
-                        # (and hence psfCandidate's exact type)
-                        if psfCandidate.getWidth() == 0:
-                            psfCandidate.setBorderWidth(self.config.borderWidth)
-                            psfCandidate.setWidth(self.config.kernelSize + 2*self.config.borderWidth)
-                            psfCandidate.setHeight(self.config.kernelSize + 2*self.config.borderWidth)
-
-                        im = psfCandidate.getMaskedImage().getImage()
-                        if not numpy.isfinite(afwMath.makeStatistics(im, afwMath.MAX).getValue()):
-                            continue
-                        psfCandidateList.append(psfCandidate)
-
-                        if display and displayExposure:
-                            ds9.dot("o", source.getX() - mi.getX0(), source.getY() - mi.getY0(),
-                                    size=4, frame=frame, ctype=ds9.CYAN)
-                    except Exception as err:
-                        pass # FIXME: should log this!
-                    break
+                im = psfCandidate.getMaskedImage().getImage()
+                if not numpy.isfinite(afwMath.makeStatistics(im, afwMath.MAX).getValue()):
+                    continue
+                psfCandidateList.append(psfCandidate)
+
+                if display and displayExposure:
+                    ds9.dot("o", source.getX() - mi.getX0(), source.getY() - mi.getY0(),
+                            size=4, frame=frame, ctype=ds9.CYAN)
+            except Exception as err:
+                pass # FIXME: should log this!
 
         return psfCandidateList
 
@@ -285,13 +291,15 @@ class _PsfShapeHistogram(object):
         """
         self._xSize, self._ySize = xSize, ySize 
         self._xMax, self._yMax = ixxMax, iyyMax
-        self._psfImage = afwImage.ImageF(afwGeom.ExtentI(xSize, ySize), 0)
+        self._hist = numpy.zeros((ySize, xSize))  # indexed [iyy bin, ixx bin], like an Image's array
         self._num = 0
         self.detector = detector
         self.xy0 = xy0
 
     def getImage(self):
-        return self._psfImage
+        image = afwImage.ImageF(afwGeom.ExtentI(self._xSize, self._ySize), 0)
+        image.getArray()[:] = self._hist
+        return image
 
     def insert(self, source):
         """Insert source into the histogram."""
@@ -306,21 +314,29 @@ class _PsfShapeHistogram(object):
                 m = geomEllip.Quadrupole(ixx, iyy, ixy)
                 m.transform(linTransform)
                 ixx, iyy, ixy = m.getIxx(), m.getIyy(), m.getIxy()
-            
-        try:
-            pixel = self.momentsToPixel(ixx, iyy)
-            i = int(pixel[0])
-            j = int(pixel[1])
-        except:
-            return 0
 
-        if i in range(0, self._xSize) and j in range(0, self._ySize):
-            if i != 0 or j != 0:
-                self._psfImage.set(i, j, self._psfImage.get(i, j) + 1)
-                self._num += 1
-                return 1                # success
+        return int(self.insertMoments(numpy.array([ixx]), numpy.array([iyy]))[0])
+
+    def insertMoments(self, ixx, iyy):
+        """Insert arrays of (already undistorted) moments into the histogram
 
-        return 0                        # failure
+        Return a boolean array saying which of them were inserted: a point lands in bin
+        (int(x), int(y)) of momentsToPixel(ixx, iyy) if that is in range and not (0, 0).
+        """
+        with numpy.errstate(invalid="ignore"):
+            x, y = self.momentsToPixel(numpy.asarray(ixx, dtype=float), numpy.asarray(iyy, dtype=float))
+            # int() truncates towards zero, so -1 < x < xSize is the same as 0 <= int(x) < xSize
+            inserted = (x > -1) & (x < self._xSize) & (y > -1) & (y < self._ySize)
+        i = numpy.trunc(x[inserted]).astype(int)
+        j = numpy.trunc(y[inserted]).astype(int)
+        notOrigin = (i != 0) | (j != 0)
+        inserted[inserted] = notOrigin
+        i, j = i[notOrigin], j[notOrigin]
+
+        self._hist += numpy.bincount(j*self._xSize + i,
+                                     minlength=self._xSize*self._ySize).reshape(self._ySize, self._xSize)
+        self._num += len(i)
+        return inserted
 
     def momentsToPixel(self, ixx, iyy):
         #x = math.sqrt(ixx) * self._xSize / self._xMax
@@ -339,80 +355,32 @@ class _PsfShapeHistogram(object):
         return ixx, iyy
 
     def getClumps(self, sigma=1.0, display=False):
+        """Find the clumps in the histogram
+
+        Each connected group of bins within sigma*sqrt(peak) of the histogram's peak value is a
+        clump; it's characterised by its adaptive (Gaussian-weighted) centroid and second moments,
+        and ranked by the counts within 3 bins of its centre.  This replaces running FootprintSet,
+        SdssCentroid, SdssShape and CircularApertureFlux on the histogram; the clumps agree with
+        theirs to within a small fraction of a bin (see psfSelectTest.py), but not bit for bit.
+        """
         if self._num <= 0:
             raise RuntimeError("No candidate PSF sources")
 
-        psfImage = self.getImage()
-        #
-        # Embed psfImage into a larger image so we can smooth when measuring it
-        #
-        width, height = psfImage.getWidth(), psfImage.getHeight()
-        largeImg = psfImage.Factory(afwGeom.ExtentI(2*width, 2*height))
-        largeImg.set(0)
-
-        bbox = afwGeom.BoxI(afwGeom.PointI(width, height), afwGeom.ExtentI(width, height))
-        subLargeImg = psfImage.Factory(largeImg, bbox, afwImage.LOCAL)
-        subLargeImg <<= psfImage
-        del subLargeImg
-        #
-        # Now measure that image, looking for the highest peak.  Start by building an Exposure
-        #
-        msk = afwImage.MaskU(largeImg.getDimensions())
-        msk.set(0)
-        var = afwImage.ImageF(largeImg.getDimensions())
-        var.set(1)
-        mpsfImage = afwImage.MaskedImageF(largeImg, msk, var)
-        mpsfImage.setXY0(afwGeom.PointI(-width, -height))
-        del msk
-        del var
-        exposure = afwImage.makeExposure(mpsfImage)
-        
-        #
-        # Next run an object detector
-        #
-        maxVal = afwMath.makeStatistics(psfImage, afwMath.MAX).getValue()
+        hist = self._hist
+        height, width = hist.shape
+
+        maxVal = hist.max()
         threshold = maxVal - sigma*math.sqrt(maxVal)
         if threshold <= 0.0:
             threshold = maxVal
 
-        threshold = afwDetection.Threshold(threshold)
-            
-        ds = afwDetection.FootprintSet(mpsfImage, threshold, "DETECTED")
-        #
-        # And measure it.  This policy isn't the one we use to measure
-        # Sources, it's only used to characterize this PSF histogram
-        #
-        schema = afwTable.SourceTable.makeMinimalSchema()
-        psfImageConfig = SingleFrameMeasurementConfig()
-        psfImageConfig.slots.centroid = "base_SdssCentroid"
-        psfImageConfig.slots.psfFlux = None #"base_PsfFlux"
-        psfImageConfig.slots.apFlux = "base_CircularApertureFlux_0"
-        psfImageConfig.slots.modelFlux = None
-        psfImageConfig.slots.instFlux = None
-        psfImageConfig.slots.shape = "base_SdssShape"
-        #   Formerly, this code had centroid.sdss, flux.psf, flux.naive,
-        #   flags.pixel, and shape.sdss
-        psfImageConfig.algorithms.names = ["base_SdssCentroid", "base_CircularApertureFlux", "base_SdssShape"]
-        psfImageConfig.algorithms["base_CircularApertureFlux"].radii = [3.0]
-        psfImageConfig.validate()
-        task = SingleFrameMeasurementTask(schema, config=psfImageConfig)
-
-        catalog = afwTable.SourceCatalog(schema)
-
-        gaussianWidth = 1.5                       # Gaussian sigma for detection convolution
-        exposure.setPsf(algorithmsLib.DoubleGaussianPsf(11, 11, gaussianWidth))
-
-        ds.makeSources(catalog)
+        labels, nLabel = _labelFootprints(hist >= threshold)
         #
         # Show us the Histogram
         #
         if display:
             frame = 1
-            dispImage = mpsfImage.Factory(mpsfImage, afwGeom.BoxI(afwGeom.PointI(width, height),
-                                                                  afwGeom.ExtentI(width, height)),
-                                                                  afwImage.LOCAL)
-            ds9.mtv(dispImage,title="PSF Selection Image", frame=frame)
-
+            ds9.mtv(self.getImage(), title="PSF Selection Image", frame=frame)
 
         clumps = list()                 # List of clumps, to return
         e = None                        # thrown exception
@@ -420,22 +388,18 @@ class _PsfShapeHistogram(object):
         IzzMax = (self._xSize/8.0)**2   # Max value ... clump r < clumpImgSize/8
                                         # diameter should be < 1/4 clumpImgSize
         apFluxes = []
-        task.run(exposure, catalog)   # notes that this is backwards for the new framework
-        for i, source in enumerate(catalog):
-            if source.getCentroidFlag():
-                continue
-            x, y = source.getX(), source.getY()
+        yIndex, xIndex = numpy.indices(hist.shape)
+        for label in range(1, nLabel + 1):
+            inFootprint = labels == label
+            x, y, psfClumpIxx, psfClumpIxy, psfClumpIyy = _measureClump(hist, inFootprint)
 
-            apFluxes.append(source.getApFlux())
-            
-            val = mpsfImage.getImage().get(int(x) + width, int(y) + height)
+            apFluxes.append(hist[(xIndex - x)**2 + (yIndex - y)**2 <= 3.0**2].sum())
 
-            psfClumpIxx = source.getIxx()
-            psfClumpIxy = source.getIxy()
-            psfClumpIyy = source.getIyy()
+            i, j = int(x), int(y)
+            val = hist[j, i] if (0 <= i < width and 0 <= j < height) else 0.0
 
             if display:
-                if i == 0:
+                if label == 1:
                     ds9.pan(x, y, frame=frame)
 
                 ds9.dot("+", x, y, ctype=ds9.YELLOW, frame=frame)
@@ -487,3 +451,82 @@ class _PsfShapeHistogram(object):
         iBestClump = numpy.argsort(apFluxes)[0]
         clumps = [clumps[iBestClump]]
         return clumps
+
+def _labelFootprints(mask):
+    """Label the 8-connected groups of True pixels in a 2-d boolean array (the Footprints that
+    FootprintSet would find)
+
+    Return (labels, nLabel), where labels is an integer array of the same shape as mask, with 0 for
+    False pixels and 1..nLabel for the groups (numbered in the order their first pixels are found
+    when scanning row by row, as FootprintSet does).
+    """
+    height, width = mask.shape
+    labels = numpy.zeros(mask.shape, dtype=int)
+    nLabel = 0
+    for y0, x0 in zip(*numpy.nonzero(mask)):
+        if labels[y0, x0]:
+            continue
+        nLabel += 1
+        labels[y0, x0] = nLabel
+        stack = [(y0, x0)]
+        while stack:
+            y, x = stack.pop()
+            for yy in (y - 1, y, y + 1):
+                for xx in (x - 1, x, x + 1):
+                    if 0 <= yy < height and 0 <= xx < width and mask[yy, xx] and not labels[yy, xx]:
+                        labels[yy, xx] = nLabel
+                        stack.append((yy, xx))
+    return labels, nLabel
+
+def _measureClump(image, inFootprint, maxIter=100, tol=1E-6):
+    """Measure the adaptive centroid and second moments of a clump in a (small) image
+
+    Starting at the footprint's peak, iterate a Gaussian weight function to match the clump's
+    centroid and second moments, as SdssShape does.  If that fails (e.g. the clump is a single
+    bin) fall back to the unweighted moments of the pixels in the footprint.
+
+    @return (x, y, ixx, ixy, iyy)
+    """
+    yIndex, xIndex = numpy.indices(image.shape)
+
+    peak = numpy.argmax(numpy.where(inFootprint, image, -numpy.inf))
+    x, y = float(xIndex.flat[peak]), float(yIndex.flat[peak])
+    weightMoments = numpy.array([[1.5**2, 0.0], [0.0, 1.5**2]]) # initial weight function
+
+    converged = False
+    for iteration in range(maxIter):
+        dx, dy = xIndex - x, yIndex - y
+        wInv = numpy.linalg.inv(weightMoments)
+        w = image*numpy.exp(-0.5*(wInv[0, 0]*dx*dx + 2*wInv[0, 1]*dx*dy + wInv[1, 1]*dy*dy))
+        wSum = w.sum()
+        if not wSum > 0:
+            break
+        mx, my = (w*dx).sum()/wSum, (w*dy).sum()/wSum
+        mxx = (w*dx*dx).sum()/wSum - mx*mx
+        mxy = (w*dx*dy).sum()/wSum - mx*my
+        myy = (w*dy*dy).sum()/wSum - my*my
+        weighted = numpy.array([[mxx, mxy], [mxy, myy]])
+        if not numpy.linalg.det(weighted) > 0:
+            break
+        # For a Gaussian clump of moments S, weighted = (S^-1 + W^-1)^-1 and the weighted centroid
+        # is displaced from the clump's towards the weight's by a factor weighted.S^-1
+        sInv = numpy.linalg.inv(weighted) - wInv
+        if not (numpy.linalg.det(sInv) > 0 and sInv[0, 0] > 0):
+            break
+        moments = numpy.linalg.inv(sInv)
+        shift = numpy.dot(moments, numpy.dot(numpy.linalg.inv(weighted), [mx, my]))
+        x, y = x + shift[0], y + shift[1]
+
+        converged = (numpy.abs(moments - weightMoments).max() < tol and numpy.abs(shift).max() < tol)
+        weightMoments = moments
+        if converged:
+            break
+
+    if converged:
+        return x, y, weightMoments[0, 0], weightMoments[0, 1], weightMoments[1, 1]
+
+    w = numpy.where(inFootprint, image, 0.0)
+    wSum = w.sum()
+    x, y = (w*xIndex).sum()/wSum, (w*yIndex).sum()/wSum
+    dx, dy = xIndex - x, yIndex - y
+    return x, y, (w*dx*dx).sum()/wSum, (w*dx*dy).sum()/wSum, (w*dy*dy).sum()/wSum
@@ -63,6 +63,79 @@ def showSourceSet(sSet, xy0=(0, 0), frame=0, ctype=ds9.GREEN, symb="+", size=2):
             else:
                 ds9.dot(symb, xc, yc, frame=frame, ctype=ctype, size=size)
 
+#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+
+def _linearizeOnGrid(x, y, xyTransform, nGrid):
+    """Return the 2x2 matrices of the linearized xyTransform at each (x, y), as an array of shape (N, 2, 2)
+
+    If there are no more than nGrid*nGrid points, the transform is linearized at each of them;
+    otherwise it is linearized on an nGrid x nGrid grid spanning the points and interpolated bilinearly.
+    Points with non-finite positions get NaN matrices.
+    """
+    matrices = numpy.empty((len(x), 2, 2))
+    matrices[:] = numpy.nan
+    finite = numpy.logical_and(numpy.isfinite(x), numpy.isfinite(y))
+    if not numpy.any(finite):
+        return matrices
+    xf, yf = x[finite], y[finite]
+
+    def linearize(px, py):
+        return xyTransform.linearizeForwardTransform(afwGeom.Point2D(px, py)).getLinear().getMatrix()
+
+    if len(xf) <= nGrid*nGrid:
+        matrices[finite] = [linearize(px, py) for px, py in zip(xf, yf)]
+        return matrices
+
+    xGrid = numpy.linspace(xf.min(), xf.max(), nGrid)
+    yGrid = numpy.linspace(yf.min(), yf.max(), nGrid)
+    nodes = numpy.array([[linearize(px, py) for px in xGrid] for py in yGrid]) # (nGrid, nGrid, 2, 2)
+
+    def locate(values, grid):
+        step = grid[1] - grid[0]
+        if step <= 0:
+            return numpy.zeros(len(values), dtype=int), numpy.zeros(len(values))
+        t = (values - grid[0])/step
+        i = numpy.clip(numpy.floor(t).astype(int), 0, len(grid) - 2)
+        return i, (t - i)
+
+    ix, tx = locate(xf, xGrid)
+    iy, ty = locate(yf, yGrid)
+    tx = tx[:, numpy.newaxis, numpy.newaxis]
+    ty = ty[:, numpy.newaxis, numpy.newaxis]
+    matrices[finite] = ((1 - ty)*((1 - tx)*nodes[iy, ix] + tx*nodes[iy, ix + 1]) +
+                        ty*((1 - tx)*nodes[iy + 1, ix] + tx*nodes[iy + 1, ix + 1]))
+    return matrices
+
+def getSourceMoments(catalog, pixToTanXYTransform=None, nGrid=32):
+    """!Return the second moments (Ixx, Ixy, Iyy) of all the sources in a catalog, as numpy arrays
+
+    \param[in] catalog   a SourceCatalog; the moments and positions are read from its slots
+    \param[in] pixToTanXYTransform  an XYTransform from pixels to tangent-plane pixels (e.g. the
+                         detector's TAN_PIXELS transform), or None to return the moments unchanged
+    \param[in] nGrid     the transform is linearized on an nGrid x nGrid grid spanning the sources and
+                         interpolated, rather than at every source (the distortion varies slowly enough
+                         that the two are indistinguishable); small catalogs are linearized exactly
+
+    The moments are transformed by the local linearization of pixToTanXYTransform, just as
+    Quadrupole.transform would do one source at a time.
+    """
+    if not catalog.isContiguous():
+        catalog = catalog.copy(deep=True)
+
+    xx = numpy.array(catalog.getIxx(), dtype=float)
+    xy = numpy.array(catalog.getIxy(), dtype=float)
+    yy = numpy.array(catalog.getIyy(), dtype=float)
+    if pixToTanXYTransform is None:
+        return xx, xy, yy
+
+    m = _linearizeOnGrid(numpy.array(catalog.getX(), dtype=float), numpy.array(catalog.getY(), dtype=float),
+                         pixToTanXYTransform, nGrid)
+    a, b, c, d = m[:, 0, 0], m[:, 0, 1], m[:, 1, 0], m[:, 1, 1]
+    # Q' = M Q M^T
+    return (a*a*xx + 2*a*b*xy + b*b*yy,
+            a*c*xx + (a*d + b*c)*xy + b*d*yy,
+            c*c*xx + 2*c*d*xy + d*d*yy)
+
 #-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 #
 # PSF display utilities
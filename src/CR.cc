@@ -34,6 +34,7 @@
 #include <cassert>
 #include <string>
 #include <typeinfo>
+#include <vector>
 
 #include <iostream>
 
@@ -52,55 +53,6 @@
 #include "lsst/meas/algorithms/CR.h"
 #include "lsst/meas/algorithms/Interp.h"
 
-/**
- * @todo These should go into afw --- actually, there're already there, but
- * in an anon namespace
- */
-namespace lsst {
-namespace afw {
-namespace detection {
-/**
- * run-length code for part of object
- */
-class IdSpan {
-public:
-    typedef boost::shared_ptr<IdSpan> Ptr;
-    typedef boost::shared_ptr<const IdSpan> ConstPtr;
-    
-    explicit IdSpan(int id, int y, int x0, int x1) : id(id), y(y), x0(x0), x1(x1) {}
-    int id;                         /* ID for object */
-    int y;                          /* Row wherein IdSpan dwells */
-    int x0, x1;                     /* inclusive range of columns */
-};
-/**
- * comparison functor; sort by ID then row
- */
-struct IdSpanCompar : public std::binary_function<const IdSpan::ConstPtr, const IdSpan::ConstPtr, bool> {
-    bool operator()(const IdSpan::ConstPtr a, const IdSpan::ConstPtr b) {
-        if (a->id < b->id) {
-            return true;
-        } else if(a->id > b->id) {
-            return false;
-        } else {
-            return (a->y < b->y) ? true : false;
-        }
-    }
-};
-/**
- * Follow a chain of aliases, returning the final resolved value.
- */
-int resolve_alias(const std::vector<int>& aliases, /* list of aliases */
-                  int id) {         /* alias to look up */
-    int resolved = id;              /* resolved alias */
-    
-    while (id != aliases[id]) {
-        resolved = id = aliases[id];
-    }
-    
-    return(resolved);
-}
-}}}
-
 namespace lsst {
 namespace meas {
 namespace algorithms {
@@ -129,42 +81,83 @@ bool condition_3(ImageT *estimate, double const peak,
 
 /************************************************************************************************************/
 //
-// A class to hold a detected pixel
+// The pixels detected as CRs, stored as parallel arrays in the order in which they were found
+//
 template<typename ImageT>
-struct CRPixel {
-    typedef typename boost::shared_ptr<CRPixel> Ptr;
-    
-    CRPixel(int _col, int _row, ImageT _val, int _id = -1) :
-        id(_id), col(_col), row(_row), val(_val) {
-        _i = ++i;
+struct CrPixelList {
+    void reserve(std::size_t n) {
+        col.reserve(n);
+        row.reserve(n);
+        val.reserve(n);
     }
-    ~CRPixel() {}
 
-    bool operator< (const CRPixel& a) const {
-        return _i < a._i;
-    }
-    
-    int get_i() const {
-        return _i;
+    void push_back(int col_, int row_, ImageT val_) {
+        col.push_back(col_);
+        row.push_back(row_);
+        val.push_back(val_);
     }
 
-    int id;                             // Unique ID for cosmic ray (not cosmic ray pixel)
-    int col;                            // position
-    int row;                            //    of pixel
-    ImageT val;                         // initial value of pixel
-private:
-    static int i;                       // current value of running index
-    int mutable _i;                     // running index 
+    std::size_t size() const { return col.size(); }
+    bool empty() const { return col.empty(); }
+
+    std::vector<int> col;               // position
+    std::vector<int> row;               //    of pixel
+    std::vector<ImageT> val;            // initial value of pixel
 };
-    
-template<typename ImageT>
-int CRPixel<ImageT>::i = 0;
 
-template<typename ImageT>
-struct Sort_CRPixel_by_id {
-    bool operator() (CRPixel<ImageT> const & a, CRPixel<ImageT> const & b) const {
-        return a.id < b.id;
+//
+// A run of CR pixels in a row
+//
+struct CrSpan {
+    CrSpan(int y_, int x0_, int x1_) : y(y_), x0(x0_), x1(x1_) {}
+
+    int y;                              // Row wherein CrSpan dwells
+    int x0, x1;                         // inclusive range of columns
+};
+
+//
+// A disjoint-set forest (with union by rank and path compression) used to merge touching spans into CRs
+//
+class DisjointSets {
+public:
+    explicit DisjointSets(int n) : _parent(n), _rank(n, 0) {
+        for (int i = 0; i != n; ++i) {
+            _parent[i] = i;
+        }
+    }
+
+    /// Return the representative of i's set
+    int find(int i) {
+        int root = i;
+        while (_parent[root] != root) {
+            root = _parent[root];
+        }
+        while (_parent[i] != root) {    // compress the path
+            int const next = _parent[i];
+            _parent[i] = root;
+            i = next;
+        }
+        return root;
+    }
+
+    /// Merge the sets with representatives ri and rj, returning the new representative
+    int merge(int const ri, int const rj) {
+        if (ri == rj) {
+            return ri;
+        }
+        if (_rank[ri] < _rank[rj]) {
+            _parent[ri] = rj;
+            return rj;
+        }
+        _parent[rj] = ri;
+        if (_rank[ri] == _rank[rj]) {
+            ++_rank[ri];
+        }
+        return ri;
     }
+private:
+    std::vector<int> _parent;
+    std::vector<int> _rank;
 };
 
 /*****************************************************************************/
@@ -250,7 +243,7 @@ bool is_cr_pixel(typename MaskedImageT::Image::Pixel *corr,      // corrected va
 //
 template <typename MaskedImageT>
 void checkSpanForCRs(detection::Footprint *extras, // Extra spans get added to this Footprint
-                     std::vector<CRPixel<typename MaskedImageT::Image::Pixel> >& crpixels,
+                     CrPixelList<typename MaskedImageT::Image::Pixel> & crpixels,
                                         // a list of pixels containing CRs
                      int const y,   // the row to process
                      int const x0, int const x1, // range of pixels in the span (inclusive)
@@ -273,7 +266,7 @@ void checkSpanForCRs(detection::Footprint *extras, // Extra spans get added to t
         if (is_cr_pixel<MaskedImageT>(&corr, loc, minSigma, thresH, thresV, thresD,
                                      bkgd, cond3Fac)) {
             if (keep) {
-                crpixels.push_back(CRPixel<MImagePixel>(x + imageX0, y + imageY0, loc.image()));
+                crpixels.push_back(x + imageX0, y + imageY0, loc.image());
             }
             loc.image() = corr;
             
@@ -312,6 +305,268 @@ private:
     double const _bkgd;                  // the Image's background level
     typename ImageT::Pixel _sum;         // the sum of all DN in the Footprint, corrected for bkgd
 };
+
+/************************************************************************************************************/
+//
+// A pixel found by the initial scan for CRs: its position (in the image's local coordinates), its
+// original value, and the preliminary estimate that replaced it
+//
+template<typename PixelT>
+struct ScanPixel {
+    ScanPixel(int col_, int row_, PixelT val_, PixelT corr_) : col(col_), row(row_), val(val_), corr(corr_) {}
+
+    int col;
+    int row;
+    PixelT val;
+    PixelT corr;
+};
+
+//
+// The parameters of the initial scan for CRs
+//
+template<typename MaskPixel>
+struct CrScanParams {
+    double minSigma;                    // minSigma, or -threshold if negative
+    double thresH, thresV, thresD;      // thresholds for condition #3
+    double bkgd;                        // unsubtracted background level
+    double cond3Fac;                    // fiddle factor for condition #3
+    MaskPixel badMask;                  // pixels that can't be CRs
+    MaskPixel interpBit;                // pixels that can't be next to CRs
+    bool useRowKernel;                  // prefilter pixels with CrRowKernel
+};
+
+/*
+ * Evaluate the sky-level test (v_00 >= 0) and condition #2 for all the interior pixels of a row at once.
+ *
+ * The image and variance are read directly from the three rows involved and the loop has no
+ * data-dependent branches, so it can be vectorised by the compiler.  The arithmetic is exactly that of
+ * is_cr_pixel, so a pixel that fails here would also fail there; the few that pass still need
+ * is_cr_pixel to apply condition #3 and provide the estimate.  The results are only valid as long as
+ * none of the pixels involved has been changed; in particular a pixel must be rechecked if its
+ * left-hand neighbour has been replaced by its preliminary estimate.
+ */
+template <typename MaskedImageT>
+class CrRowKernel {
+public:
+    typedef typename MaskedImageT::Image::Pixel ImagePixel;
+    typedef typename MaskedImageT::Variance::Pixel VariancePixel;
+
+    CrRowKernel(MaskedImageT & mimage) :
+        _image(mimage.getImage()->getArray()), _variance(mimage.getVariance()->getArray()),
+        _ncol(mimage.getWidth()), _isCandidate(_ncol), _thres(_ncol) {}
+
+    /// Evaluate the conditions for the interior pixels of row y
+    template<typename MaskPixel>
+    void apply(int const y, CrScanParams<MaskPixel> const & par);
+
+    /// Could pixel x be a CR, i.e. did it pass condition #2?
+    bool isCandidate(int const x) const { return _isCandidate[x]; }
+private:
+    typename MaskedImageT::Image::Array _image;
+    typename MaskedImageT::Variance::Array _variance;
+    int _ncol;
+    std::vector<int> _isCandidate;      // not char, which could alias the image
+    std::vector<double> _thres;         // minSigma*sqrt(variance)
+};
+
+template <typename MaskedImageT>
+template <typename MaskPixel>
+void CrRowKernel<MaskedImageT>::apply(int const y, CrScanParams<MaskPixel> const & par)
+{
+    ImagePixel const *im0 = &_image[y][0];        // this row
+    ImagePixel const *imS = &_image[y - 1][0];    // the row below
+    ImagePixel const *imN = &_image[y + 1][0];    // the row above
+    double const minSigma = par.minSigma;
+
+    if (minSigma < 0) {                 /* |thres_sky_sigma| is threshold */
+        int *isCandidate = &_isCandidate[0];
+        for (int x = 1; x < _ncol - 1; ++x) {
+            ImagePixel const v_00 = im0[x];
+            isCandidate[x] = !(v_00 < 0) & !(v_00 < -minSigma);
+        }
+        return;
+    }
+
+    VariancePixel const *var0 = &_variance[y][0];
+    double *thres = &_thres[0];
+    for (int x = 1; x < _ncol - 1; ++x) {  // sqrt sets errno, so keep it out of the main loop
+        thres[x] = minSigma*sqrt(var0[x]);
+    }
+
+    int *isCandidate = &_isCandidate[0];
+    for (int x = 1; x < _ncol - 1; ++x) {
+        ImagePixel const v_00 = im0[x];
+        ImagePixel const mean_we =   (im0[x - 1] + im0[x + 1])/2; // avgs of surrounding 8 pixels
+        ImagePixel const mean_ns =   (imN[x] + imS[x])/2;
+        ImagePixel const mean_swne = (imS[x - 1] + imN[x + 1])/2;
+        ImagePixel const mean_nwse = (imN[x - 1] + imS[x + 1])/2;
+
+        double const thres_sky_sigma = thres[x];
+
+        isCandidate[x] = !(v_00 < 0) &
+            !((v_00 < mean_ns   + thres_sky_sigma) & (v_00 < mean_we   + thres_sky_sigma) &
+              (v_00 < mean_swne + thres_sky_sigma) & (v_00 < mean_nwse + thres_sky_sigma));
+    }
+}
+
+/*
+ * Look for CR pixels in (interior) row y, applying conditions #2--#4.  Each one that's found is
+ * appended to found, and replaced in the image by its preliminary estimate, which increases the
+ * detection rate further along the row and in the rows above.
+ */
+template <typename MaskedImageT>
+void scanRowForCRs(std::vector<ScanPixel<typename MaskedImageT::Image::Pixel> > & found,
+                   MaskedImageT & mimage,
+                   int const y,
+                   CrScanParams<typename MaskedImageT::Mask::Pixel> const & par,
+                   CrRowKernel<MaskedImageT> & kernel // workspace for applying condition #2
+                  )
+{
+    typedef typename MaskedImageT::Image::Pixel ImagePixel;
+
+    int const ncol = mimage.getWidth();
+    typename MaskedImageT::xy_locator loc = mimage.xy_at(1, y); // locator for data
+
+    if (par.useRowKernel) {
+        kernel.apply(y, par);
+    }
+
+    bool replaced = false;              // was the previous pixel replaced by its estimate?
+    for (int x = 1; x < ncol - 1; ++x, ++loc.x()) {
+        if (par.useRowKernel && !replaced && !kernel.isCandidate(x)) {
+            continue;
+        }
+        replaced = false;
+
+        ImagePixel corr = 0;
+        if (!is_cr_pixel<MaskedImageT>(&corr, loc, par.minSigma,
+                                       par.thresH, par.thresV, par.thresD, par.bkgd, par.cond3Fac)) {
+            continue;
+        }
+/*
+ * condition #4
+ */
+        if (loc.mask() & par.badMask) {
+            continue;
+        }
+        if ((loc.mask(-1,  1) | loc.mask(0,  1) | loc.mask(1,  1) |
+             loc.mask(-1,  0) |                   loc.mask(1,  0) |
+             loc.mask(-1, -1) | loc.mask(0, -1) | loc.mask(1, -1)) & par.interpBit) {
+            continue;
+        }
+/*
+ * OK, it's a CR
+ *
+ * replace CR-contaminated pixels with reasonable values as we go through
+ * image, which increases the detection rate
+ */
+        found.push_back(ScanPixel<ImagePixel>(x, y, loc.image(), corr));
+        loc.image() = corr;         /* just a preliminary estimate */
+        replaced = true;
+    }
+}
+
+/*
+ * Set the pixels [begin, end) to their original values (if original) or preliminary estimates
+ */
+template <typename ImageT>
+void setScanPixels(ImageT & image,
+                   typename std::vector<ScanPixel<typename ImageT::Pixel> >::const_iterator begin,
+                   typename std::vector<ScanPixel<typename ImageT::Pixel> >::const_iterator end,
+                   bool const original
+                  )
+{
+    for (; begin != end; ++begin) {
+        image(begin->col, begin->row) = original ? begin->val : begin->corr;
+    }
+}
+
+/*
+ * Scan the interior rows of an image for CRs in nBand bands of rows, using up to nThreads threads,
+ * with exactly the same result as scanning them in order with scanRowForCRs.
+ *
+ * The serial scan replaces each CR pixel by its preliminary estimate as soon as it's found, which
+ * affects the tests on the pixels to its right and in the row above.  So:
+ *  - Each band but the last holds back its top row, so no band reads a row that another is writing,
+ *    and the bands are scanned in parallel, each seeing the unmodified row below it.
+ *  - Working up the image, each held-back row is scanned (with the row above it temporarily restored
+ *    to its original values), then the band above it is re-scanned row by row until a row comes out
+ *    exactly as it did in the parallel pass; nothing further up can have changed.
+ * The reconciliation is usually only a row or two per band.
+ */
+template <typename MaskedImageT>
+void scanForCRsInBands(std::vector<ScanPixel<typename MaskedImageT::Image::Pixel> > & found,
+                       MaskedImageT & mimage,
+                       CrScanParams<typename MaskedImageT::Mask::Pixel> const & par,
+                       int const nBand,
+                       int const nThreads
+                      )
+{
+    typedef ScanPixel<typename MaskedImageT::Image::Pixel> Pixel;
+    typedef typename std::vector<Pixel>::const_iterator PixelIter;
+
+    typename MaskedImageT::Image & image = *mimage.getImage();
+    int const nrow = mimage.getHeight();
+
+    std::vector<int> start(nBand + 1);  // first row of each band
+    for (int k = 0; k <= nBand; ++k) {
+        start[k] = 1 + (k*(nrow - 2))/nBand;
+    }
+    std::vector<int> end(nBand);        // end of the rows scanned in parallel
+    for (int k = 0; k < nBand; ++k) {
+        end[k] = (k == nBand - 1) ? start[k + 1] : start[k + 1] - 1;
+    }
+
+    std::vector<std::vector<Pixel> > bands(nBand);
+#ifdef _OPENMP
+#pragma omp parallel for num_threads(nThreads) schedule(static, 1)
+#endif
+    for (int k = 0; k < nBand; ++k) {
+        CrRowKernel<MaskedImageT> kernel(mimage);
+        for (int y = start[k]; y < end[k]; ++y) {
+            scanRowForCRs(bands[k], mimage, y, par, kernel);
+        }
+    }
+
+    CrRowKernel<MaskedImageT> kernel(mimage);
+
+    for (int k = 1; k < nBand; ++k) {
+        std::vector<Pixel> const & parallel = bands[k]; // band k, as found in parallel
+        std::vector<Pixel> rescanned;                   // band k, rescanned
+        PixelIter pos = parallel.begin();               // first pixel of the first row not rescanned
+        PixelIter next = pos;                           // first pixel of the row after
+        for (; next != parallel.end() && next->row == start[k]; ++next) {}
+
+        setScanPixels(image, pos, next, true);
+        scanRowForCRs(bands[k - 1], mimage, start[k] - 1, par, kernel);
+
+        for (int y = start[k]; y < end[k]; ++y) {
+            PixelIter nextNext = next;
+            for (; nextNext != parallel.end() && nextNext->row == y + 1; ++nextNext) {}
+            setScanPixels(image, next, nextNext, true);
+
+            std::size_t const nRescanned = rescanned.size();
+            scanRowForCRs(rescanned, mimage, y, par, kernel);
+
+            bool same = (rescanned.size() - nRescanned == static_cast<std::size_t>(next - pos));
+            for (PixelIter a = rescanned.begin() + nRescanned, b = pos; same && b != next; ++a, ++b) {
+                same = (a->col == b->col && a->corr == b->corr);
+            }
+            pos = next;
+            next = nextNext;
+            if (same) {                 // the rest of the band is as it was in the parallel pass
+                setScanPixels(image, pos, next, false);
+                break;
+            }
+        }
+        rescanned.insert(rescanned.end(), pos, parallel.end());
+        bands[k].swap(rescanned);
+    }
+
+    for (int k = 0; k < nBand; ++k) {
+        found.insert(found.end(), bands[k].begin(), bands[k].end());
+    }
+}
 }
 
 /*
@@ -319,21 +574,48 @@ private:
  */
 template <typename ImageT>
 static void reinstateCrPixels(
-        ImageT *image,                                                // the image in question
-        std::vector<CRPixel<typename ImageT::Pixel> > const& crpixels // a list of pixels with CRs
+        ImageT *image,                                         // the image in question
+        CrPixelList<typename ImageT::Pixel> const& crpixels    // a list of pixels with CRs
                              )
 {
-    if (crpixels.empty()) return;
+    for (std::size_t i = 0, n = crpixels.size(); i != n; ++i) {
+        *image->at(crpixels.col[i] - image->getX0(), crpixels.row[i] - image->getY0()) = crpixels.val[i];
+    }
+}
 
-    typedef typename std::vector<CRPixel<typename ImageT::Pixel> >::const_iterator crpixel_iter;
-    for (crpixel_iter crp = crpixels.begin(), end = crpixels.end(); crp < end - 1 ; ++crp) {
-        *image->at(crp->col - image->getX0(), crp->row - image->getY0()) = crp->val;
+/*!
+ * @brief Compute the thresholds for condition #3 from the PSF at a point
+ */
+CrThresholds::CrThresholds(detection::Psf const & psf,
+                           geom::Point2D const & position,
+                           double cond3Fac2
+                          )
+{
+/*
+ * Realise PSF at position
+ */
+    lsst::afw::math::Kernel::ConstPtr kernel = psf.getLocalKernel(position);
+    if (!kernel) {
+        throw LSST_EXCEPT(pexExcept::NotFoundError, "Psf is unable to return a kernel");
     }
+    detection::Psf::Image psfImage = detection::Psf::Image(geom::ExtentI(kernel->getWidth(), kernel->getHeight()));
+    kernel->computeImage(psfImage, true);
+
+    int const xc = kernel->getCtrX();   // center of PSF
+    int const yc = kernel->getCtrY();
+
+    double const I0 = psfImage(xc, yc);
+    _thresH = cond3Fac2*(0.5*(psfImage(xc - 1, yc) + psfImage(xc + 1, yc)))/I0; // horizontal
+    _thresV = cond3Fac2*(0.5*(psfImage(xc, yc - 1) + psfImage(xc, yc + 1)))/I0; // vertical
+    _thresD = cond3Fac2*(0.25*(psfImage(xc - 1, yc - 1) + psfImage(xc + 1, yc + 1) +
+                               psfImage(xc - 1, yc + 1) + psfImage(xc + 1, yc - 1)))/I0; // diag
 }
 
 /*!
  * @brief Find cosmic rays in an Image, and mask and remove them
  *
+ * The thresholds for condition #3 are computed from the PSF at the center of the image
+ *
  * @return vector of CR's Footprints
  */
 template <typename MaskedImageT>
@@ -344,6 +626,25 @@ findCosmicRays(MaskedImageT &mimage,      ///< Image to search
                lsst::pex::policy::Policy const &policy, ///< Policy directing the behavior
                bool const keep                          ///< if true, don't remove the CRs
               ) {
+    CrThresholds const thresholds(psf,
+                                  afw::geom::Point2D(mimage.getWidth() / 2.0, mimage.getHeight() / 2.0),
+                                  policy.getDouble("cond3_fac2"));
+    return findCosmicRays(mimage, thresholds, bkgd, policy, keep);
+}
+
+/*!
+ * @brief Find cosmic rays in an Image, and mask and remove them
+ *
+ * @return vector of CR's Footprints
+ */
+template <typename MaskedImageT>
+std::vector<detection::Footprint::Ptr>
+findCosmicRays(MaskedImageT &mimage,      ///< Image to search
+               CrThresholds const &thresholds, ///< thresholds for condition #3, derived from the PSF
+               double const bkgd,         ///< unsubtracted background of frame, DN
+               lsst::pex::policy::Policy const &policy, ///< Policy directing the behavior
+               bool const keep                          ///< if true, don't remove the CRs
+              ) {
     typedef typename MaskedImageT::Image ImageT;
     typedef typename ImageT::Pixel ImagePixel;
     typedef typename MaskedImageT::Mask::Pixel MaskPixel;
@@ -352,32 +653,18 @@ findCosmicRays(MaskedImageT &mimage,      ///< Image to search
     double const minSigma = policy.getDouble("minSigma");    // min sigma over sky in pixel for CR candidate
     double const minDn = policy.getDouble("min_DN");         // min number of DN in an CRs
     double const cond3Fac = policy.getDouble("cond3_fac");   // fiddle factor for condition #3
-    double const cond3Fac2 = policy.getDouble("cond3_fac2"); // 2nd fiddle factor for condition #3
     int const niteration = policy.getInt("niteration");      // Number of times to look for contaminated
                                                              // pixels near CRs
     int const nCrPixelMax = policy.getInt("nCrPixelMax");    // maximum number of contaminated pixels
+    int const nThreads = policy.exists("nThreads") ? policy.getInt("nThreads") : 1; // threads for the scan
+    bool const useRowKernel =                                // apply condition #2 a row at a time
+        policy.exists("useRowKernel") ? policy.getBool("useRowKernel") : true;
 /*
  * thresholds for 3rd condition
- *
- * Realise PSF at center of image
  */
-    lsst::afw::math::Kernel::ConstPtr kernel = psf.getLocalKernel(
-        afw::geom::Point2D(mimage.getWidth() / 2.0, mimage.getHeight() / 2.0)
-    );
-    if (!kernel) {
-        throw LSST_EXCEPT(pexExcept::NotFoundError, "Psf is unable to return a kernel");
-    }
-    detection::Psf::Image psfImage = detection::Psf::Image(geom::ExtentI(kernel->getWidth(), kernel->getHeight()));
-    kernel->computeImage(psfImage, true);
-
-    int const xc = kernel->getCtrX();   // center of PSF
-    int const yc = kernel->getCtrY();
-
-    double const I0 = psfImage(xc, yc);
-    double const thresH = cond3Fac2*(0.5*(psfImage(xc - 1, yc) + psfImage(xc + 1, yc)))/I0; // horizontal
-    double const thresV = cond3Fac2*(0.5*(psfImage(xc, yc - 1) + psfImage(xc, yc + 1)))/I0; // vertical
-    double const thresD = cond3Fac2*(0.25*(psfImage(xc - 1, yc - 1) + psfImage(xc + 1, yc + 1) +
-                                           psfImage(xc - 1, yc + 1) + psfImage(xc + 1, yc - 1)))/I0; // diag
+    double const thresH = thresholds.getThresH(); // horizontal
+    double const thresV = thresholds.getThresV(); // vertical
+    double const thresD = thresholds.getThresD(); // diagonal
 /*
  * Setup desired mask planes
  */
@@ -393,195 +680,131 @@ findCosmicRays(MaskedImageT &mimage,      ///< Image to search
     int const ncol = mimage.getWidth();
     int const nrow = mimage.getHeight();
 
-    std::vector<CRPixel<ImagePixel> > crpixels; // storage for detected CR-contaminated pixels
-    typedef typename std::vector<CRPixel<ImagePixel> >::iterator crpixel_iter;
-    typedef typename std::vector<CRPixel<ImagePixel> >::reverse_iterator crpixel_riter;
+    CrScanParams<MaskPixel> scanParams;
+    scanParams.minSigma = minSigma;
+    scanParams.thresH = thresH;
+    scanParams.thresV = thresV;
+    scanParams.thresD = thresD;
+    scanParams.bkgd = bkgd;
+    scanParams.cond3Fac = cond3Fac;
+    scanParams.badMask = badMask;
+    scanParams.interpBit = interpBit;
+    scanParams.useRowKernel = useRowKernel;
+
+    std::vector<ScanPixel<ImagePixel> > found; // CR-contaminated pixels found by the scan
+    if (nThreads > 1 && nrow - 2 >= 2*nThreads) {
+        scanForCRsInBands(found, mimage, scanParams, nThreads, nThreads);
+    } else {
+        CrRowKernel<MaskedImageT> kernel(mimage);
+        for (int j = 1; j < nrow - 1 && static_cast<int>(found.size()) <= nCrPixelMax; ++j) {
+            scanRowForCRs(found, mimage, j, scanParams, kernel);
+        }
+    }
 
-    for (int j = 1; j < nrow - 1; ++j) {
-        typename MaskedImageT::xy_locator loc = mimage.xy_at(1, j); // locator for data
+    if (static_cast<int>(found.size()) > nCrPixelMax) {
+        setScanPixels(*mimage.getImage(), found.begin(), found.end(), true);
 
-        for (int i = 1; i < ncol - 1; ++i, ++loc.x()) {
-            ImagePixel corr = 0;
-            if (!is_cr_pixel<MaskedImageT>(&corr, loc, minSigma,
-                                           thresH, thresV, thresD, bkgd, cond3Fac)) {
-                continue;
-            }
-/*
- * condition #4
- */
-            if (loc.mask() & badMask) {
-                continue;
-            }
-            if ((loc.mask(-1,  1) | loc.mask(0,  1) | loc.mask(1,  1) |
-                 loc.mask(-1,  0) |                   loc.mask(1,  0) |
-                 loc.mask(-1, -1) | loc.mask(0, -1) | loc.mask(1, -1)) & interpBit) {
-                continue;
-            }
-/*
- * OK, it's a CR
- *
- * replace CR-contaminated pixels with reasonable values as we go through
- * image, which increases the detection rate
- */
-            crpixels.push_back(CRPixel<ImagePixel>(i + mimage.getX0(), j + mimage.getY0(), loc.image()));
-            loc.image() = corr;         /* just a preliminary estimate */
+        throw LSST_EXCEPT(lsst::pex::exceptions::LengthError,
+                          (boost::format("Too many CR pixels (max %d)") % nCrPixelMax).str());
+    }
 
-            if (static_cast<int>(crpixels.size()) > nCrPixelMax) {
-                reinstateCrPixels(mimage.getImage().get(), crpixels);
+    CrPixelList<ImagePixel> crpixels;   // storage for detected CR-contaminated pixels
 
-                throw LSST_EXCEPT(lsst::pex::exceptions::LengthError,
-                                  (boost::format("Too many CR pixels (max %d)") % nCrPixelMax).str());
-            }
-        }
+    crpixels.reserve(found.size());
+    for (typename std::vector<ScanPixel<ImagePixel> >::const_iterator pix = found.begin(), end = found.end();
+         pix != end; ++pix) {
+        crpixels.push_back(pix->col + mimage.getX0(), pix->row + mimage.getY0(), pix->val);
     }
 /*
  * We've found them on a pixel-by-pixel basis, now merge those pixels
  * into cosmic rays
+ *
+ * First look for strings of CR pixels on the same row and adjoining columns;
+ * each of these becomes a span.  The pixels were found in row-major order, so
+ * the spans are too.
  */
-    std::vector<int> aliases;           // aliases for initially disjoint parts of CRs
-    aliases.reserve(1 + crpixels.size()/2); // initial size of aliases
-    
-    std::vector<detection::IdSpan::Ptr> spans; // y:x0,x1 for objects
-    spans.reserve(aliases.capacity());  // initial size of spans
-    
-    aliases.push_back(0);               // 0 --> 0
+    std::vector<CrSpan> spans;          // y:x0,x1 for objects
+    spans.reserve(1 + crpixels.size()/2); // initial size of spans
 
-    /**
-     In this loop, we look for strings of CRpixels on the same row and adjoining columns;
-     each of these becomes a Span with a unique ID.
-     */
-    
-    int ncr = 0;                        // number of detected cosmic rays
-    if (!crpixels.empty()) {
-        int id;                         // id number for a CR
-        int x0 = -1, x1 = -1, y = -1;   // the beginning and end column, and row of this span in a CR
-
-        // I am dummy
-        CRPixel<ImagePixel> dummy(0, -1, 0, -1);
-        crpixels.push_back(dummy);
-        //printf("Created dummy CR: i %i, id %i, col %i, row %i, val %g\n", dummy.get_i(), dummy.id, dummy.col, dummy.row, (double)dummy.val);
-        for (crpixel_iter crp = crpixels.begin(); crp < crpixels.end() - 1 ; ++crp) {
-            //printf("Looking at CR: i %i, id %i, col %i, row %i, val %g\n", crp->get_i(), crp->id, crp->col, crp->row, (double)crp->val);
-
-            if (crp->id < 0) {           // not already assigned
-                crp->id = ++ncr;        // a new CR
-                aliases.push_back(crp->id);
-                y = crp->row;
-                x0 = x1 = crp->col;
-                //printf("  Assigned ID %i; looking at row %i, start col %i\n", crp->id, crp->row, crp->col);
-            }
-            id = crp->id;
-            //printf("  Next CRpix has i=%i, id=%i, row %i, col %i\n", crp[1].get_i(), crp[1].id, crp[1].row, crp[1].col);
-
-            if (crp[1].row == crp[0].row && crp[1].col == crp[0].col + 1) {
-                //printf("  Adjoining!  Set next CRpix id = %i; x1=%i\n", crp[1].id, x1);
-                crp[1].id = id;
-                ++x1;
-            } else {
-                assert (y >= 0 && x0 >= 0 && x1 >= 0);
-                spans.push_back(detection::IdSpan::Ptr(new detection::IdSpan(id, y, x0, x1)));
-                //printf("  Not adjoining; adding span id=%i, y=%i, x = [%i, %i]\n", id, y, x0, x1);
-            }
-        }
-    }
-
-    // At the end of this loop, all crpixel entries have been assigned an ID,
-    // except for the "dummy" entry at the end of the array.
-    if (crpixels.size() > 0) {
-        for (crpixel_iter cp = crpixels.begin(); cp != crpixels.end() - 1; cp++) {
-            assert(cp->id >= 0);
-            assert(cp->col >= 0);
-            assert(cp->row >= 0);
+    for (std::size_t i = 0, n = crpixels.size(); i < n; ) {
+        std::size_t j = i + 1;
+        while (j < n && crpixels.row[j] == crpixels.row[i] && crpixels.col[j] == crpixels.col[j - 1] + 1) {
+            ++j;
         }
-        // dummy:
-        assert(crpixels[crpixels.size()-1].id == -1);
-        assert(crpixels[crpixels.size()-1].col == 0);
-        assert(crpixels[crpixels.size()-1].row == -1);
+        spans.push_back(CrSpan(crpixels.row[i], crpixels.col[i], crpixels.col[j - 1]));
+        i = j;
     }
+    int const nspan = spans.size();
 
-    for (std::vector<detection::IdSpan::Ptr>::iterator sp = spans.begin(), end = spans.end(); sp != end; sp++) {
-        assert((*sp)->id >= 0);
-        assert((*sp)->y >= 0);
-        assert((*sp)->x0 >= 0);
-        assert((*sp)->x1 >= (*sp)->x0);
-        for (std::vector<detection::IdSpan::Ptr>::iterator sp2 = sp + 1; sp2 != end; sp2++) {
-            assert((*sp2)->y >= (*sp)->y);
-            if ((*sp2)->y == (*sp)->y) {
-                assert((*sp2)->x0 > (*sp)->x1);
-            }
-        }
+    for (int i = 1; i < nspan; ++i) {
+        assert(spans[i].y > spans[i - 1].y ||
+               (spans[i].y == spans[i - 1].y && spans[i].x0 > spans[i - 1].x1 + 1));
     }
-
 /*
- * See if spans touch each other
+ * See if spans touch each other, merging the ones that do into CRs.
+ *
+ * Each CR is labelled by one of its spans, and the CRs are returned in order of that label;
+ * when two CRs are merged the result takes the label of the one containing the later span.
  */
-    for (std::vector<detection::IdSpan::Ptr>::iterator sp = spans.begin(), end = spans.end();
-         sp != end; ++sp) {
-        int const y = (*sp)->y;
-        int const x0 = (*sp)->x0;
-        int const x1 = (*sp)->x1;
-
-        // this loop will probably run for only a few steps
-        for (std::vector<detection::IdSpan::Ptr>::iterator sp2 = sp + 1; sp2 != end; ++sp2) {
-            if ((*sp2)->y == y) {
-                // on this row (but not adjoining columns, since it would have been merged into this span);
-                // keep looking.
-                continue;
-            } else if ((*sp2)->y != (y + 1)) {
-                // sp2 is more than one row below; can't be connected.
-                break;
-            } else if ((*sp2)->x0 > (x1 + 1)) {
-                // sp2 is more than one column away to the right; can't be connected
-                break;
-            } else if ((*sp2)->x1 >= (x0 - 1)) {
-                // touches
-                int r1 = detection::resolve_alias(aliases, (*sp)->id);
-                int r2 = detection::resolve_alias(aliases, (*sp2)->id);
-                aliases[r1] = r2;
-            }
-        }
+    DisjointSets crs(nspan);            // the CRs that the spans belong to
+    std::vector<int> label(nspan);      // the label for each CR, indexed by its representative span
+    for (int i = 0; i != nspan; ++i) {
+        label[i] = i;
     }
 
+    int next = 0;                       // the first span in the next row that could touch this one
+    for (int i = 0; i != nspan; ++i) {
+        int const y = spans[i].y;
+        int const x0 = spans[i].x0;
+        int const x1 = spans[i].x1;
 
-
-
-
-/*
- * Resolve aliases; first alias chains, then the IDs in the spans
- */
-    for (unsigned int i = 0; i != spans.size(); ++i) {
-        spans[i]->id = detection::resolve_alias(aliases, spans[i]->id);
+        if (next <= i) {
+            next = i + 1;
+        }
+        // spans are sorted by x0 within a row, so anything we skip can't touch later spans in this row either
+        while (next < nspan && (spans[next].y == y || (spans[next].y == y + 1 && spans[next].x1 < x0 - 1))) {
+            ++next;
+        }
+        for (int j = next; j < nspan && spans[j].y == y + 1 && spans[j].x0 <= x1 + 1; ++j) { // touches
+            int const ri = crs.find(i);
+            int const rj = crs.find(j);
+            if (ri != rj) {
+                int const newLabel = label[rj];
+                label[crs.merge(ri, rj)] = newLabel;
+            }
+        }
     }
-
 /*
- * Sort spans by ID, so we can sweep through them once
+ * Build Footprints from spans, sweeping through them once in order of label
  */
-    if (spans.size() > 0) {
-        std::sort(spans.begin(), spans.end(), detection::IdSpanCompar());
+    std::vector<int> first(nspan + 1, 0); // index of the first span with each label in order
+    std::vector<int> spanLabel(nspan);
+    for (int i = 0; i != nspan; ++i) {
+        spanLabel[i] = label[crs.find(i)];
+        ++first[spanLabel[i] + 1];
+    }
+    for (int i = 0; i != nspan; ++i) {
+        first[i + 1] += first[i];
+    }
+    std::vector<int> order(nspan);      // the spans, sorted by label (and in row-major order within a label)
+    {
+        std::vector<int> pos(first.begin(), first.end() - 1);
+        for (int i = 0; i != nspan; ++i) {
+            order[pos[spanLabel[i]]++] = i;
+        }
     }
 
-/*
- * Build Footprints from spans
- */
     std::vector<detection::Footprint::Ptr> CRs; // our cosmic rays
-
-    if (spans.size() > 0) {
-        int id = spans[0]->id;
-        unsigned int i0 = 0;            // initial value of i
-        for (unsigned int i = i0; i <= spans.size(); ++i) { // <= size to catch the last object
-            if (i == spans.size() || spans[i]->id != id) {
-                detection::Footprint::Ptr cr(new detection::Footprint(i - i0));
-                
-                for (; i0 < i; ++i0) {
-                    cr->addSpan(spans[i0]->y, spans[i0]->x0, spans[i0]->x1);
-                }
-                CRs.push_back(cr);
-            }
-            
-            if (i < spans.size()) {
-                id = spans[i]->id;
-            }
+    for (int l = 0; l != nspan; ++l) {
+        if (first[l + 1] == first[l]) { // no CR has this label
+            continue;
         }
+        detection::Footprint::Ptr cr(new detection::Footprint(first[l + 1] - first[l]));
+        for (int i = first[l]; i != first[l + 1]; ++i) {
+            CrSpan const & span = spans[order[i]];
+            cr->addSpan(span.y, span.x0, span.x1);
+        }
+        CRs.push_back(cr);
     }
 
     reinstateCrPixels(mimage.getImage().get(), crpixels);
@@ -589,21 +812,23 @@ findCosmicRays(MaskedImageT &mimage,      ///< Image to search
  * apply condition #1
  */
     CountsInCR<ImageT> CountDN(*mimage.getImage(), bkgd);
-    for (std::vector<detection::Footprint::Ptr>::iterator cr = CRs.begin(), end = CRs.end();
-         cr != end; ++cr) {
-        CountDN.apply(**cr);            // find the sum of pixel values within the CR
-                
-        pexLogging::TTrace<10>("algorithms.CR", "CR at (%d, %d) has %g DN",
-                               (*cr)->getBBox().getMinX(), (*cr)->getBBox().getMinY(), CountDN.getCounts());
-        if (CountDN.getCounts() < minDn) { /* not bright enough */
-            pexLogging::TTrace<11>("algorithms.CR", "Erasing CR");
-
-            cr = CRs.erase(cr);
-            --cr;                       // back up to previous CR (we're going to increment it)
-            --end;
+    {
+        std::vector<detection::Footprint::Ptr>::iterator good = CRs.begin(); // end of the CRs we're keeping
+        for (std::vector<detection::Footprint::Ptr>::iterator cr = CRs.begin(), end = CRs.end();
+             cr != end; ++cr) {
+            CountDN.apply(**cr);            // find the sum of pixel values within the CR
+
+            pexLogging::TTrace<10>("algorithms.CR", "CR at (%d, %d) has %g DN",
+                                   (*cr)->getBBox().getMinX(), (*cr)->getBBox().getMinY(),
+                                   CountDN.getCounts());
+            if (CountDN.getCounts() < minDn) { /* not bright enough */
+                pexLogging::TTrace<11>("algorithms.CR", "Erasing CR");
+                continue;
+            }
+            *good++ = *cr;
         }
+        CRs.erase(good, CRs.end());
     }
-    ncr = CRs.size();           /* some may have been too faint */
 /*
  * We've found them all, time to kill them all
  */
@@ -706,19 +931,9 @@ findCosmicRays(MaskedImageT &mimage,      ///< Image to search
  * for example those which lie next to saturated pixels
  */
     if (keep || too_many_crs) {
-        if (crpixels.size() > 0) {
-            int const imageX0 = mimage.getX0();
-            int const imageY0 = mimage.getY0();
-
-            std::sort(crpixels.begin(), crpixels.end()); // sort into birth order
-        
-            crpixel_riter rend = crpixels.rend();
-            for (crpixel_riter crp = crpixels.rbegin(); crp != rend; ++crp) {
-                if (crp->row == -1)
-                    // dummy; skip it.
-                    continue;
-                mimage.at(crp->col - imageX0, crp->row - imageY0).image() = crp->val;
-            }
+        for (int i = static_cast<int>(crpixels.size()) - 1; i >= 0; --i) { // reverse order of discovery
+            mimage.at(crpixels.col[i] - mimage.getX0(), crpixels.row[i] - mimage.getY0()).image() =
+                crpixels.val[i];
         }
     } else {
         if (true || nextra > 0) {
@@ -741,6 +956,35 @@ findCosmicRays(MaskedImageT &mimage,      ///< Image to search
     return CRs;
 }
 
+/*!
+ * @brief Interpolate over cosmic rays that were found with findCosmicRays(..., keep=true)
+ *
+ * The CRs are removed, and their pixels masked as CR and INTRP, just as findCosmicRays(..., keep=false)
+ * would have done with them
+ */
+template <typename MaskedImageT>
+void removeCosmicRays(MaskedImageT &mimage,  ///< Image containing the CRs
+                      std::vector<detection::Footprint::Ptr> const &crs, ///< the CRs to remove
+                      double const bkgd      ///< unsubtracted background of frame, DN
+                     ) {
+    typedef typename MaskedImageT::Mask::Pixel MaskPixel;
+
+    MaskPixel const badBit = mimage.getMask()->getPlaneBitMask("BAD"); // Generic bad pixels
+    MaskPixel const crBit = mimage.getMask()->getPlaneBitMask("CR"); // CR-contaminated pixels
+    MaskPixel const interpBit = mimage.getMask()->getPlaneBitMask("INTRP"); // Interpolated pixels
+    MaskPixel const saturBit = mimage.getMask()->getPlaneBitMask("SAT"); // Saturated pixels
+
+    MaskPixel const badMask = (badBit | interpBit | saturBit); // naughty pixels
+
+    std::vector<detection::Footprint::Ptr> CRs(crs.begin(), crs.end());
+    bool const debias_values = true;
+    bool const grow = true;
+    pexLogging::TTrace<2>("algorithms.CR", "Removing list of %d CRs", static_cast<int>(CRs.size()));
+    removeCR(mimage, CRs, bkgd, crBit, saturBit, badMask, debias_values, grow);
+
+    (void)setMaskFromFootprintList(mimage.getMask().get(), CRs, static_cast<MaskPixel>(crBit | interpBit));
+}
+
 /*****************************************************************************/
 namespace {
 /*
@@ -1029,7 +1273,20 @@ void removeCR(image::MaskedImage<ImageT, MaskT> & mi,  // image to search
                    double const bkgd,                           \
                    lsst::pex::policy::Policy const& policy,     \
                    bool const keep                              \
-                  )
+                  ); \
+    template \
+    std::vector<detection::Footprint::Ptr> \
+    findCosmicRays(lsst::afw::image::MaskedImage<TYPE> &image,  \
+                   CrThresholds const &thresholds,              \
+                   double const bkgd,                           \
+                   lsst::pex::policy::Policy const& policy,     \
+                   bool const keep                              \
+                  ); \
+    template \
+    void removeCosmicRays(lsst::afw::image::MaskedImage<TYPE> &image, \
+                          std::vector<detection::Footprint::Ptr> const &crs, \
+                          double const bkgd                     \
+                         )
 
 INSTANTIATE(float);
 INSTANTIATE(double);                    // Why do we need double images?
@@ -26,15 +26,22 @@
  * Represent a PSF as for a Coadd based on the James Jee stacking
  * algorithm which was extracted from Stackfit.
  */
+#include <algorithm>
 #include <cmath>
 #include <sstream>
 #include <iostream>
 #include <numeric>
+#include <list>
+#include <map>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
 #include "boost/iterator/iterator_adaptor.hpp"
 #include "boost/iterator/transform_iterator.hpp"
 #include "ndarray/eigen.h"
 #include "lsst/base.h"
 #include "lsst/pex/exceptions.h"
+#include "lsst/afw/coord/Coord.h"
 #include "lsst/afw/image/ImageUtils.h"
 #include "lsst/afw/math/Statistics.h"
 #include "lsst/meas/algorithms/CoaddPsf.h"
@@ -47,8 +54,319 @@ namespace lsst {
 namespace meas {
 namespace algorithms {
 
+/*
+ * Spatial index of the CoaddPsf inputs.
+ *
+ * The bounding box of each input is projected into coadd pixel coordinates (by sampling points along
+ * its perimeter, with some padding to allow for curvature between the samples), and a regular grid
+ * over the union of these boxes records which inputs overlap each cell.  Containment lookups then only
+ * need to test the inputs registered in a single cell, using the same exact test as
+ * ExposureCatalog::subsetContaining, so the selected inputs (and their order) are identical.
+ *
+ * Inputs whose bounding box cannot be projected (e.g. because the Wcs transform fails) are tested
+ * for every lookup.
+ */
+class CoaddPsfInputIndex {
+public:
+
+    CoaddPsfInputIndex(afw::table::ExposureCatalog const & catalog, CONST_PTR(afw::image::Wcs) coaddWcs);
+
+    /// Return the indices of the inputs whose bounding box contains the given coadd position, in order
+    std::vector<std::size_t> getContaining(afw::geom::Point2D const & position) const;
+
+    /**
+     *  Return the (padded) bounding box of the given input in coadd pixel coordinates; this is empty
+     *  if the input's bounding box could not be projected.
+     */
+    afw::geom::Box2D const & getInputBBox(std::size_t index) const { return _inputBoxes[index]; }
+
+    /// Return the union of all input bounding boxes in coadd pixel coordinates
+    afw::geom::Box2D const & getBounds() const { return _bounds; }
+
+private:
+
+    // Number of points sampled along each edge of an input bounding box
+    static int const N_EDGE_SAMPLES = 8;
+
+    // Maximum number of grid cells in each dimension
+    static int const MAX_GRID_CELLS = 64;
+
+    afw::geom::Box2D projectBBox(afw::table::ExposureRecord const & record) const;
+
+    afw::table::ExposureCatalog _catalog;
+    CONST_PTR(afw::image::Wcs) _coaddWcs;
+    std::vector<afw::geom::Box2D> _inputBoxes;
+    std::vector<std::size_t> _unindexed;              // inputs that must always be tested
+    afw::geom::Box2D _bounds;
+    int _nx;
+    int _ny;
+    double _cellWidth;
+    double _cellHeight;
+    std::vector< std::vector<std::size_t> > _cells;   // row-major, _nx*_ny
+};
+
+CoaddPsfInputIndex::CoaddPsfInputIndex(
+    afw::table::ExposureCatalog const & catalog,
+    CONST_PTR(afw::image::Wcs) coaddWcs
+) : _catalog(catalog), _coaddWcs(coaddWcs), _nx(0), _ny(0), _cellWidth(0.0), _cellHeight(0.0)
+{
+    _inputBoxes.reserve(_catalog.size());
+    std::vector<double> sizes;
+    for (std::size_t n = 0; n < _catalog.size(); ++n) {
+        afw::geom::Box2D box = projectBBox(_catalog[n]);
+        _inputBoxes.push_back(box);
+        if (box.isEmpty()) {
+            _unindexed.push_back(n);
+        } else {
+            _bounds.include(box);
+            sizes.push_back(std::min(box.getWidth(), box.getHeight()));
+        }
+    }
+    if (sizes.empty()) {
+        return;
+    }
+    // Use cells about half the size of a typical input, so each input overlaps only a few cells.
+    std::nth_element(sizes.begin(), sizes.begin() + sizes.size()/2, sizes.end());
+    double const cellSize = std::max(0.5*sizes[sizes.size()/2], 1.0);
+    _nx = std::min(std::max(int(std::ceil(_bounds.getWidth()/cellSize)), 1), int(MAX_GRID_CELLS));
+    _ny = std::min(std::max(int(std::ceil(_bounds.getHeight()/cellSize)), 1), int(MAX_GRID_CELLS));
+    _cellWidth = _bounds.getWidth()/_nx;
+    _cellHeight = _bounds.getHeight()/_ny;
+    _cells.resize(_nx*_ny);
+    for (std::size_t n = 0; n < _inputBoxes.size(); ++n) {
+        afw::geom::Box2D const & box = _inputBoxes[n];
+        if (box.isEmpty()) {
+            continue;
+        }
+        int const ix0 = std::max(int((box.getMinX() - _bounds.getMinX())/_cellWidth), 0);
+        int const ix1 = std::min(int((box.getMaxX() - _bounds.getMinX())/_cellWidth), _nx - 1);
+        int const iy0 = std::max(int((box.getMinY() - _bounds.getMinY())/_cellHeight), 0);
+        int const iy1 = std::min(int((box.getMaxY() - _bounds.getMinY())/_cellHeight), _ny - 1);
+        for (int iy = iy0; iy <= iy1; ++iy) {
+            for (int ix = ix0; ix <= ix1; ++ix) {
+                _cells[iy*_nx + ix].push_back(n);   // n increases, so each cell stays sorted
+            }
+        }
+    }
+}
+
+afw::geom::Box2D CoaddPsfInputIndex::projectBBox(afw::table::ExposureRecord const & record) const {
+    afw::geom::Box2D result;
+    if (!record.getWcs()) {
+        return result;
+    }
+    afw::geom::Box2D const inputBBox(record.getBBox());
+    try {
+        for (int i = 0; i <= N_EDGE_SAMPLES; ++i) {
+            double const f = double(i)/N_EDGE_SAMPLES;
+            double const x = inputBBox.getMinX() + f*inputBBox.getWidth();
+            double const y = inputBBox.getMinY() + f*inputBBox.getHeight();
+            afw::geom::Point2D const edgePoints[4] = {
+                afw::geom::Point2D(x, inputBBox.getMinY()),
+                afw::geom::Point2D(x, inputBBox.getMaxY()),
+                afw::geom::Point2D(inputBBox.getMinX(), y),
+                afw::geom::Point2D(inputBBox.getMaxX(), y)
+            };
+            for (int j = 0; j < 4; ++j) {
+                result.include(_coaddWcs->skyToPixel(*record.getWcs()->pixelToSky(edgePoints[j])));
+            }
+        }
+    } catch (pex::exceptions::Exception &) {
+        return afw::geom::Box2D();
+    }
+    // Pad generously: a false positive only costs an extra exact test, while a false negative
+    // would drop an input.
+    double const pad = 0.05*std::max(result.getWidth(), result.getHeight()) + 2.0;
+    result.grow(pad);
+    return result;
+}
+
+std::vector<std::size_t> CoaddPsfInputIndex::getContaining(afw::geom::Point2D const & position) const {
+    std::vector<std::size_t> candidates(_unindexed);
+    if (!_cells.empty() && _bounds.contains(position)) {
+        int const ix = std::min(int((position.getX() - _bounds.getMinX())/_cellWidth), _nx - 1);
+        int const iy = std::min(int((position.getY() - _bounds.getMinY())/_cellHeight), _ny - 1);
+        std::vector<std::size_t> const & cell = _cells[iy*_nx + ix];
+        if (candidates.empty()) {
+            candidates = cell;
+        } else {
+            candidates.insert(candidates.end(), cell.begin(), cell.end());
+            std::sort(candidates.begin(), candidates.end());
+        }
+    }
+    std::vector<std::size_t> result;
+    if (candidates.empty()) {
+        return result;
+    }
+    PTR(afw::coord::Coord) coord = _coaddWcs->pixelToSky(position);
+    for (std::vector<std::size_t>::const_iterator i = candidates.begin(); i != candidates.end(); ++i) {
+        if (_catalog[*i].contains(*coord)) {
+            result.push_back(*i);
+        }
+    }
+    return result;
+}
+
 namespace {
 
+/*
+ * XYTransform that replaces the reverse linearization of another transform with bilinear interpolation
+ * over a precomputed grid of local affine approximations.
+ *
+ * At each grid node we store the exact reverse-transformed position r_k and the linear part L_k of
+ * the exact reverse linearization.  At a point p, each of the four surrounding nodes predicts
+ * r_k + L_k (p - p_k); the predictions and the L_k are blended with bilinear weights.  The grid is
+ * refined (by halving its spacing) until the interpolated position and linear part agree with the
+ * exact ones to within the given tolerance at every cell centre; if that cannot be achieved within
+ * MAX_GRID_NODES nodes in each dimension, isValid() returns false and the exact transform should be
+ * used instead.
+ *
+ * Points outside the grid, as well as forwardTransform and reverseTransform, are delegated to the
+ * exact transform.
+ */
+class AffineGridXYTransform : public afw::geom::XYTransform {
+public:
+
+    AffineGridXYTransform(
+        CONST_PTR(afw::geom::XYTransform) exact,
+        afw::geom::Box2D const & bbox,
+        double tolerance
+    );
+
+    bool isValid() const { return _valid; }
+
+    virtual PTR(afw::geom::XYTransform) clone() const {
+        return boost::make_shared<AffineGridXYTransform>(*this);
+    }
+
+    virtual afw::geom::Point2D forwardTransform(afw::geom::Point2D const & point) const {
+        return _exact->forwardTransform(point);
+    }
+
+    virtual afw::geom::Point2D reverseTransform(afw::geom::Point2D const & point) const {
+        return _exact->reverseTransform(point);
+    }
+
+    virtual afw::geom::AffineTransform linearizeReverseTransform(afw::geom::Point2D const & point) const;
+
+private:
+
+    // Maximum number of grid nodes in each dimension
+    static int const MAX_GRID_NODES = 65;
+
+    // Unaligned Eigen types, so Nodes can be stored in a std::vector
+    struct Node {
+        Eigen::Matrix<double,2,1,Eigen::DontAlign> reverse;
+        Eigen::Matrix<double,2,2,Eigen::DontAlign> linear;
+    };
+
+    void _fill(int nx, int ny);
+    afw::geom::AffineTransform _interpolate(afw::geom::Point2D const & point) const;
+    double _error(afw::geom::Point2D const & point) const;
+
+    CONST_PTR(afw::geom::XYTransform) _exact;
+    afw::geom::Box2D _bbox;
+    bool _valid;
+    int _nx;
+    int _ny;
+    double _dx;
+    double _dy;
+    std::vector<Node> _nodes;   // row-major, _nx*_ny
+};
+
+AffineGridXYTransform::AffineGridXYTransform(
+    CONST_PTR(afw::geom::XYTransform) exact,
+    afw::geom::Box2D const & bbox,
+    double tolerance
+) : _exact(exact), _bbox(bbox), _valid(false), _nx(0), _ny(0), _dx(0.0), _dy(0.0)
+{
+    if (_bbox.isEmpty()) {
+        return;
+    }
+    for (int n = 2; n <= MAX_GRID_NODES && !_valid; n = 2*n - 1) {
+        _fill(n, n);
+        _valid = true;
+        for (int iy = 0; iy < _ny - 1 && _valid; ++iy) {
+            for (int ix = 0; ix < _nx - 1 && _valid; ++ix) {
+                afw::geom::Point2D const center(
+                    _bbox.getMinX() + (ix + 0.5)*_dx,
+                    _bbox.getMinY() + (iy + 0.5)*_dy
+                );
+                _valid = (_error(center) <= tolerance);
+            }
+        }
+    }
+    if (!_valid) {
+        _nodes.clear();
+    }
+}
+
+void AffineGridXYTransform::_fill(int nx, int ny) {
+    _nx = nx;
+    _ny = ny;
+    _dx = _bbox.getWidth()/(_nx - 1);
+    _dy = _bbox.getHeight()/(_ny - 1);
+    _nodes.resize(_nx*_ny);
+    for (int iy = 0; iy < _ny; ++iy) {
+        for (int ix = 0; ix < _nx; ++ix) {
+            afw::geom::Point2D const p(_bbox.getMinX() + ix*_dx, _bbox.getMinY() + iy*_dy);
+            afw::geom::AffineTransform const t = _exact->linearizeReverseTransform(p);
+            Node & node = _nodes[iy*_nx + ix];
+            node.reverse = t(p).asEigen();
+            node.linear = t.getLinear().getMatrix();
+        }
+    }
+}
+
+afw::geom::AffineTransform AffineGridXYTransform::_interpolate(afw::geom::Point2D const & point) const {
+    double const fx = (point.getX() - _bbox.getMinX())/_dx;
+    double const fy = (point.getY() - _bbox.getMinY())/_dy;
+    int const ix = std::min(std::max(int(fx), 0), _nx - 2);
+    int const iy = std::min(std::max(int(fy), 0), _ny - 2);
+    double const wx = fx - ix;
+    double const wy = fy - iy;
+    double const weights[4] = { (1.0 - wx)*(1.0 - wy), wx*(1.0 - wy), (1.0 - wx)*wy, wx*wy };
+    Node const * nodes[4] = {
+        &_nodes[iy*_nx + ix], &_nodes[iy*_nx + ix + 1],
+        &_nodes[(iy + 1)*_nx + ix], &_nodes[(iy + 1)*_nx + ix + 1]
+    };
+    Eigen::Matrix2d linear = Eigen::Matrix2d::Zero();
+    Eigen::Vector2d reverse = Eigen::Vector2d::Zero();
+    for (int k = 0; k < 4; ++k) {
+        afw::geom::Point2D const nodePoint(
+            _bbox.getMinX() + (ix + (k & 1))*_dx,
+            _bbox.getMinY() + (iy + (k >> 1))*_dy
+        );
+        linear += weights[k]*nodes[k]->linear;
+        reverse += weights[k]*(
+            nodes[k]->reverse + nodes[k]->linear*(point - nodePoint).asEigen()
+        );
+    }
+    // T(x) = L (x - p) + r(p)
+    return afw::geom::AffineTransform(
+        afw::geom::LinearTransform(linear),
+        afw::geom::Extent2D(reverse - linear*point.asEigen())
+    );
+}
+
+double AffineGridXYTransform::_error(afw::geom::Point2D const & point) const {
+    afw::geom::AffineTransform const exact = _exact->linearizeReverseTransform(point);
+    afw::geom::AffineTransform const approx = _interpolate(point);
+    double const positionError = (exact(point) - approx(point)).asEigen().lpNorm<Eigen::Infinity>();
+    double const linearError
+        = (exact.getLinear().getMatrix() - approx.getLinear().getMatrix()).lpNorm<Eigen::Infinity>();
+    return std::max(positionError, linearError);
+}
+
+afw::geom::AffineTransform AffineGridXYTransform::linearizeReverseTransform(
+    afw::geom::Point2D const & point
+) const {
+    if (!_valid || !_bbox.contains(point)) {
+        return _exact->linearizeReverseTransform(point);
+    }
+    return _interpolate(point);
+}
+
 // Struct used to simplify calculations in computeAveragePosition; lets us use
 // std::accumulate instead of explicit for loop.
 struct AvgPosItem {
@@ -88,7 +406,8 @@ struct AvgPosItem {
 afw::geom::Point2D computeAveragePosition(
     afw::table::ExposureCatalog const & catalog,
     afw::image::Wcs const & coaddWcs,
-    afw::table::Key<double> weightKey
+    afw::table::Key<double> weightKey,
+    CoaddPsfInputIndex const & index
 ) {
     afw::table::Key<int> goodPixKey;
     try {
@@ -120,7 +439,7 @@ afw::geom::Point2D computeAveragePosition(
     // from the average until it does.
     for (
         std::vector<AvgPosItem>::iterator iter = items.begin();
-        catalog.subsetContaining(result.getPoint(), coaddWcs).empty();
+        index.getContaining(result.getPoint()).empty();
         ++iter
     ) {
         if (iter == items.end()) {
@@ -139,6 +458,106 @@ afw::geom::Point2D computeAveragePosition(
 
 } // anonymous
 
+/*
+ * Least-recently-used cache of CoaddPsf kernel images.
+ *
+ * Entries are looked up by (position, input ids), and store the color they were computed with; as
+ * afw::image::Color has no ordering, a lookup with a different color is simply a miss, and the
+ * subsequent insert replaces the entry.
+ */
+class CoaddPsf::KernelImageCache {
+public:
+
+    struct Key {
+        double x;
+        double y;
+        std::vector<afw::table::RecordId> ids;
+
+        bool operator<(Key const & other) const {
+            if (x != other.x) return x < other.x;
+            if (y != other.y) return y < other.y;
+            return ids < other.ids;
+        }
+    };
+
+    KernelImageCache(std::size_t capacity, double positionQuantum) :
+        _capacity(capacity), _positionQuantum(positionQuantum), _hits(0), _misses(0)
+    {}
+
+    std::size_t getCapacity() const { return _capacity; }
+    double getPositionQuantum() const { return _positionQuantum; }
+    std::size_t getHits() const { return _hits; }
+    std::size_t getMisses() const { return _misses; }
+
+    // Return the position at which the Psf is actually computed for the cell containing position
+    afw::geom::Point2D snap(afw::geom::Point2D const & position) const {
+        if (_positionQuantum <= 0.0) {
+            return position;
+        }
+        return afw::geom::Point2D(
+            (std::floor(position.getX() / _positionQuantum) + 0.5) * _positionQuantum,
+            (std::floor(position.getY() / _positionQuantum) + 0.5) * _positionQuantum
+        );
+    }
+
+    // Return the cached image, or an empty pointer if there is none
+    PTR(afw::detection::Psf::Image) get(Key const & key, afw::image::Color const & color) {
+        Map::iterator i = _map.find(key);
+        if (i == _map.end() || !(i->second->color == color)) {
+            ++_misses;
+            return PTR(afw::detection::Psf::Image)();
+        }
+        _entries.splice(_entries.begin(), _entries, i->second);
+        ++_hits;
+        return i->second->image;
+    }
+
+    void put(Key const & key, afw::image::Color const & color, PTR(afw::detection::Psf::Image) image) {
+        Map::iterator i = _map.find(key);
+        if (i != _map.end()) {
+            i->second->color = color;
+            i->second->image = image;
+            _entries.splice(_entries.begin(), _entries, i->second);
+            return;
+        }
+        _entries.push_front(Entry(key, color, image));
+        _map[key] = _entries.begin();
+        if (_entries.size() > _capacity) {
+            _map.erase(_entries.back().key);
+            _entries.pop_back();
+        }
+    }
+
+    void clear() {
+        _map.clear();
+        _entries.clear();
+        _hits = 0;
+        _misses = 0;
+    }
+
+private:
+
+    struct Entry {
+        Key key;
+        afw::image::Color color;
+        PTR(afw::detection::Psf::Image) image;
+
+        Entry(Key const & key_, afw::image::Color const & color_, PTR(afw::detection::Psf::Image) image_) :
+            key(key_), color(color_), image(image_)
+        {}
+    };
+
+    typedef std::list<Entry> EntryList;
+    typedef std::map<Key, EntryList::iterator> Map;
+
+    std::size_t _capacity;
+    double _positionQuantum;
+    std::size_t _hits;
+    std::size_t _misses;
+    EntryList _entries;    // most recently used first
+    Map _map;
+};
+
 CoaddPsf::CoaddPsf(
     afw::table::ExposureCatalog const & catalog,
     afw::image::Wcs const & coaddWcs,
@@ -148,7 +567,9 @@ CoaddPsf::CoaddPsf(
 ) :
     _coaddWcs(coaddWcs.clone()),
     _warpingKernelName(warpingKernelName),
-    _warpingControl(boost::make_shared<afw::math::WarpingControl>(warpingKernelName, "", cacheSize))
+    _warpingControl(boost::make_shared<afw::math::WarpingControl>(warpingKernelName, "", cacheSize)),
+    _warpFastPathTolerance(0.0),
+    _warpFastPathCount(0)
 {
     afw::table::SchemaMapper mapper(catalog.getSchema());
     mapper.addMinimalSchema(afw::table::ExposureTable::makeMinimalSchema(), true);
@@ -161,97 +582,353 @@ CoaddPsf::CoaddPsf(
          record->assign(*i, mapper);
          _catalog.push_back(record);
     }
-    _averagePosition = computeAveragePosition(_catalog, *_coaddWcs, _weightKey);
+    _warpingControls.push_back(_warpingControl);
+    _inputIndex = boost::make_shared<CoaddPsfInputIndex>(_catalog, _coaddWcs);
+    _initInputTransforms();
+    _averagePosition = computeAveragePosition(_catalog, *_coaddWcs, _weightKey, *_inputIndex);
 }
 
 PTR(afw::detection::Psf) CoaddPsf::clone() const {
-    return boost::make_shared<CoaddPsf>(*this);
+    PTR(CoaddPsf) result = boost::make_shared<CoaddPsf>(*this);
+    // clones get their own (empty) kernel image cache rather than sharing ours
+    result->setKernelImageCacheSize(getKernelImageCacheSize(), getKernelImageCachePositionQuantum());
+    return result;
 }
 
+void CoaddPsf::setKernelImageCacheSize(std::size_t capacity, double positionQuantum) {
+    if (positionQuantum < 0.0) {
+        throw LSST_EXCEPT(
+            pex::exceptions::InvalidParameterError,
+            (boost::format("CoaddPsf kernel image cache position quantum must be >= 0; got %g")
+             % positionQuantum).str()
+        );
+    }
+    if (capacity == 0u) {
+        _kernelImageCache.reset();
+    } else {
+        _kernelImageCache = boost::make_shared<KernelImageCache>(capacity, positionQuantum);
+    }
+}
 
-// Read all the images from the Image Vector and return the BBox in xy0 offset coordinates
+void CoaddPsf::_initInputTransforms() {
+    _affineTransformGridTolerance = 0.0;
+    _inputTransforms.clear();
+    _inputTransforms.reserve(_catalog.size());
+    for (afw::table::ExposureCatalog::const_iterator i = _catalog.begin(); i != _catalog.end(); ++i) {
+        _inputTransforms.push_back(
+            boost::make_shared<afw::image::XYTransformFromWcsPair>(_coaddWcs, i->getWcs())
+        );
+    }
+}
 
-afw::geom::Box2I getOverallBBox(std::vector<PTR(afw::image::Image<double>)> const & imgVector) {
+void CoaddPsf::setAffineTransformGridTolerance(double tolerance) {
+    if (tolerance < 0.0) {
+        throw LSST_EXCEPT(
+            pex::exceptions::InvalidParameterError,
+            (boost::format("CoaddPsf affine transform grid tolerance must be >= 0; got %g")
+             % tolerance).str()
+        );
+    }
+    _initInputTransforms();
+    if (tolerance > 0.0) {
+        for (std::size_t n = 0; n < _inputTransforms.size(); ++n) {
+            PTR(AffineGridXYTransform) grid = boost::make_shared<AffineGridXYTransform>(
+                _inputTransforms[n], _inputIndex->getInputBBox(n), tolerance
+            );
+            if (grid->isValid()) {
+                _inputTransforms[n] = grid;
+            }
+        }
+        _affineTransformGridTolerance = tolerance;
+    }
+    clearKernelImageCache();
+}
 
-    afw::geom::Box2I bbox;
-    // Calculate the box which will contain them all
-    for (unsigned int i = 0; i < imgVector.size(); i ++) {
-        PTR(afw::image::Image<double>) componentImg = imgVector[i];
-        afw::geom::Box2I cBBox = componentImg->getBBox();
-        bbox.include(cBBox); // JFB: this works even on empty bboxes
+void CoaddPsf::setThreadCount(int threadCount) {
+    if (threadCount < 1) {
+        throw LSST_EXCEPT(
+            pex::exceptions::InvalidParameterError,
+            (boost::format("CoaddPsf thread count must be >= 1; got %d") % threadCount).str()
+        );
     }
-    return bbox;
+    // The warping kernels are modified while warping, so each thread needs its own.
+    _warpingControls.resize(1);
+    for (int i = 1; i < threadCount; ++i) {
+        _warpingControls.push_back(
+            boost::make_shared<afw::math::WarpingControl>(
+                _warpingKernelName, "", _warpingControl->getCacheSize()
+            )
+        );
+    }
+}
+
+void CoaddPsf::setWarpFastPathTolerance(double tolerance) {
+    if (tolerance < 0.0) {
+        throw LSST_EXCEPT(
+            pex::exceptions::InvalidParameterError,
+            (boost::format("CoaddPsf warp fast path tolerance must be >= 0; got %g") % tolerance).str()
+        );
+    }
+    _warpFastPathTolerance = tolerance;
+    clearKernelImageCache();
+}
+
+std::size_t CoaddPsf::getKernelImageCacheSize() const {
+    return _kernelImageCache ? _kernelImageCache->getCapacity() : 0u;
+}
+
+double CoaddPsf::getKernelImageCachePositionQuantum() const {
+    return _kernelImageCache ? _kernelImageCache->getPositionQuantum() : 0.0;
 }
 
+std::size_t CoaddPsf::getKernelImageCacheHits() const {
+    return _kernelImageCache ? _kernelImageCache->getHits() : 0u;
+}
 
-// Read all the images from the Image Vector and add them to image
+std::size_t CoaddPsf::getKernelImageCacheMisses() const {
+    return _kernelImageCache ? _kernelImageCache->getMisses() : 0u;
+}
 
+void CoaddPsf::clearKernelImageCache() const {
+    if (_kernelImageCache) {
+        _kernelImageCache->clear();
+    }
+}
+
+
+namespace {
+
+// Add a component image, normalized to sum to weight, to image.  If image is empty or doesn't contain
+// the component's bounding box, it is replaced by a larger one with the same contents, so the result
+// always covers the union of the components' bounding boxes.
 void addToImage(
-    PTR(afw::image::Image<double>) image,
-    std::vector<PTR(afw::image::Image<double>)> const & imgVector,
-    std::vector<double> const & weightVector
+    PTR(afw::image::Image<double>) & image,
+    afw::image::Image<double> const & componentImg,
+    double weight
 ) {
-    assert(imgVector.size() == weightVector.size());
-    for (unsigned int i = 0; i < imgVector.size(); i ++) {
-        PTR(afw::image::Image<double>) componentImg = imgVector[i];
-        double weight = weightVector[i];
-        double sum = componentImg->getArray().asEigen().sum();
+    afw::geom::Box2I cBBox = componentImg.getBBox();
+    if (!image) {
+        image = boost::make_shared< afw::image::Image<double> >(cBBox);
+        *image = 0.0;
+    } else if (!image->getBBox().contains(cBBox)) {
+        afw::geom::Box2I bbox = image->getBBox();
+        bbox.include(cBBox);
+        PTR(afw::image::Image<double>) larger = boost::make_shared< afw::image::Image<double> >(bbox);
+        *larger = 0.0;
+        afw::image::Image<double> oldSubImage(*larger, image->getBBox());
+        oldSubImage <<= *image;
+        image = larger;
+    }
+    double sum = componentImg.getArray().asEigen().sum();
+    // JFB: A subimage view of the image we want to add to, containing only the component's region.
+    afw::image::Image<double> targetSubImage(*image, cBBox);
+    targetSubImage.scaledPlus(weight/sum, componentImg);
+}
+
+} // anonymous
+
+std::vector<CONST_PTR(WarpedPsf)> CoaddPsf::_makeComponents(std::vector<std::size_t> const & inputs) const {
+    std::vector<CONST_PTR(WarpedPsf)> components;
+    components.reserve(inputs.size());
+    for (std::size_t k = 0; k < inputs.size(); ++k) {
+        PTR(WarpedPsf) component = boost::make_shared<WarpedPsf>(
+            _catalog[inputs[k]].getPsf(),
+            _inputTransforms[inputs[k]],
+            _warpingControls[k % _warpingControls.size()]
+        );
+        component->setFastPathTolerance(_warpFastPathTolerance);
+        components.push_back(component);
+    }
+    return components;
+}
 
-        // Now get the portion of the component image which is appropriate to add
-        // If the default image size is used, the component is guaranteed to fit,
-        // but not if a size has been specified.
-        afw::geom::Box2I cBBox = componentImg->getBBox();
-        afw::geom::Box2I overlap(cBBox);
-        overlap.clip(image->getBBox());
-        // JFB: A subimage view of the image we want to add to, containing only the overlap region.
-        afw::image::Image<double> targetSubImage(*image, overlap);
-        // JFB: A subimage view of the image we want to add from, containing only the overlap region.
-        afw::image::Image<double> cSubImage(*componentImg, overlap);
-        targetSubImage.scaledPlus(weight/sum, cSubImage);
+void CoaddPsf::_countFastPaths(std::vector<CONST_PTR(WarpedPsf)> const & components) const {
+    typedef std::vector<CONST_PTR(WarpedPsf)>::const_iterator Iter;
+    for (Iter i = components.begin(); i != components.end(); ++i) {
+        _warpFastPathCount += (**i).getFastPathCount();
+    }
+}
+
+bool CoaddPsf::_canWarpInParallel(std::vector<std::size_t> const & inputs) const {
+    if (_warpingControls.size() < 2u || inputs.size() < 2u) {
+        return false;
+    }
+    // Psfs cache their last image, so one that is shared between inputs can't be used by two threads.
+    std::vector<afw::detection::Psf const *> psfs;
+    psfs.reserve(inputs.size());
+    for (std::vector<std::size_t>::const_iterator n = inputs.begin(); n != inputs.end(); ++n) {
+        psfs.push_back(_catalog[*n].getPsf().get());
     }
+    std::sort(psfs.begin(), psfs.end());
+    return std::adjacent_find(psfs.begin(), psfs.end()) == psfs.end();
 }
 
+std::vector<PTR(afw::detection::Psf::Image)> CoaddPsf::_warpComponents(
+    afw::geom::Point2D const & position,
+    afw::image::Color const & color,
+    std::vector<CONST_PTR(WarpedPsf)> const & components,
+    int begin,
+    int end,
+    bool parallel
+) const {
+    std::vector<PTR(afw::detection::Psf::Image)> images(end - begin);
+    if (!parallel) {
+        for (int k = begin; k < end; ++k) {
+            images[k - begin] = components[k]->computeKernelImage(position, color);
+        }
+        return images;
+    }
+
+    // Component k was made with warping control k % nThreads, so it must only be warped by thread
+    // k % nThreads; we choose the components by thread number rather than relying on the schedule, as
+    // OpenMP may give us fewer threads than we asked for.  Exceptions may not propagate out of the
+    // parallel region; components that fail (or that no thread was there to warp) are warped serially
+    // below, so the original exception is thrown.
+#ifdef _OPENMP
+    int const nThreads = _warpingControls.size();
+#pragma omp parallel num_threads(nThreads)
+    {
+        int const thread = omp_get_thread_num();
+        for (int k = begin + (thread - begin%nThreads + nThreads)%nThreads; k < end; k += nThreads) {
+            try {
+                images[k - begin] = components[k]->computeKernelImage(position, color);
+            } catch (...) {
+                images[k - begin].reset();
+            }
+        }
+    }
+#endif
+    for (int k = begin; k < end; ++k) {
+        if (!images[k - begin]) {
+            images[k - begin] = components[k]->computeKernelImage(position, color);
+        }
+    }
+    return images;
+}
+
+std::vector<std::size_t> CoaddPsf::_getInputs(
+    afw::geom::Point2D const & ccdXY,
+    afw::geom::Point2D & position,
+    bool & cacheable
+) const {
+    // With the cache enabled, the Psf is computed at the centre of the cache cell containing ccdXY,
+    // from the inputs that contain that centre.  If the centre isn't covered by any input we fall back
+    // to computing the Psf at ccdXY itself, bypassing the cache.
+    if (_kernelImageCache) {
+        position = _kernelImageCache->snap(ccdXY);
+        std::vector<std::size_t> inputs = _inputIndex->getContaining(position);
+        if (!inputs.empty()) {
+            cacheable = true;
+            return inputs;
+        }
+    }
+    position = ccdXY;
+    cacheable = false;
+    return _inputIndex->getContaining(ccdXY);
+}
+
+PTR(afw::detection::Psf::Image) CoaddPsf::_computeKernelImage(
+    afw::geom::Point2D const & position,
+    afw::image::Color const & color,
+    std::vector<std::size_t> const & inputs,
+    std::vector<CONST_PTR(WarpedPsf)> const & components,
+    bool cacheable
+) const {
+    KernelImageCache::Key cacheKey;
+    if (cacheable) {
+        cacheKey.x = position.getX();
+        cacheKey.y = position.getY();
+        cacheKey.ids.reserve(inputs.size());
+        for (std::vector<std::size_t>::const_iterator n = inputs.begin(); n != inputs.end(); ++n) {
+            cacheKey.ids.push_back(_catalog[*n].getId());
+        }
+        PTR(afw::detection::Psf::Image) cached = _kernelImageCache->get(cacheKey, color);
+        if (cached) {
+            return boost::make_shared<afw::detection::Psf::Image>(*cached, true);
+        }
+    }
+
+    // Warp the components in chunks (of one component at a time, or of one per thread) and add each
+    // chunk into the output image before warping the next, so only a chunk of warped images is ever
+    // held in memory.  The components are always added in the same order, whatever the chunk size.
+    bool const parallel = _canWarpInParallel(inputs);
+    int const nComponents = components.size();
+    int const chunkSize = parallel ? int(_warpingControls.size()) : 1;
+    double weightSum = 0.0;
+    PTR(afw::detection::Psf::Image) image;
+    for (int begin = 0; begin < nComponents; begin += chunkSize) {
+        int const end = std::min(begin + chunkSize, nComponents);
+        std::vector<PTR(afw::detection::Psf::Image)> chunk
+            = _warpComponents(position, color, components, begin, end, parallel);
+        for (int k = begin; k < end; ++k) {
+            double const weight = _catalog[inputs[k]].get(_weightKey);
+            addToImage(image, *chunk[k - begin], weight);
+            weightSum += weight;
+        }
+    }
+    *image /= weightSum;
+    if (cacheable) {
+        _kernelImageCache->put(cacheKey, color, image);
+        return boost::make_shared<afw::detection::Psf::Image>(*image, true);
+    }
+    return image;
+}
 
 PTR(afw::detection::Psf::Image) CoaddPsf::doComputeKernelImage(
     afw::geom::Point2D const & ccdXY,
     afw::image::Color const & color
 ) const {
-    // get the subset of exposures which contain our coordinate
-    afw::table::ExposureCatalog subcat = _catalog.subsetContaining(ccdXY, *_coaddWcs);
-    if (subcat.empty()) {
+    // get the subset of exposures which contain the point the Psf is computed at
+    afw::geom::Point2D position;
+    bool cacheable = false;
+    std::vector<std::size_t> inputs = _getInputs(ccdXY, position, cacheable);
+    if (inputs.empty()) {
         throw LSST_EXCEPT(
             pex::exceptions::InvalidParameterError,
             (boost::format("Cannot compute CoaddPsf at point %s; no input images at that point.")
              % ccdXY).str()
         );
     }
-    double weightSum = 0.0;
-
-    // Read all the Psf images into a vector.  The code is set up so that this can be done in chunks,
-    // with the image modified to accomodate
-    // However, we currently read all of the images.
-    std::vector<PTR(afw::image::Image<double>)> imgVector;
-    std::vector<double> weightVector;
+    std::vector<CONST_PTR(WarpedPsf)> components = _makeComponents(inputs);
+    PTR(afw::detection::Psf::Image) result = _computeKernelImage(position, color, inputs, components,
+                                                                 cacheable);
+    _countFastPaths(components);
+    return result;
+}
 
-    for (afw::table::ExposureCatalog::const_iterator i = subcat.begin(); i != subcat.end(); ++i) {
-        PTR(afw::geom::XYTransform) xytransform(
-            new afw::image::XYTransformFromWcsPair(_coaddWcs, i->getWcs())
-        );
-        WarpedPsf warpedPsf = WarpedPsf(i->getPsf(), xytransform, _warpingControl);
-        PTR(afw::image::Image<double>) componentImg = warpedPsf.computeKernelImage(ccdXY, color);
-        imgVector.push_back(componentImg);
-        weightSum += i->get(_weightKey);
-        weightVector.push_back(i->get(_weightKey));
+std::vector<PTR(afw::detection::Psf::Image)> CoaddPsf::doComputeKernelImages(
+    std::vector<afw::geom::Point2D> const & points,
+    afw::image::Color const & color
+) const {
+    // Group the points by the inputs that contain them, so all the points in each input-overlap
+    // region share a single set of component WarpedPsfs.
+    typedef std::map< std::vector<std::size_t>, std::vector<std::size_t> > GroupMap;
+    GroupMap groups;
+    std::vector<afw::geom::Point2D> positions(points.size());
+    std::vector<char> cacheable(points.size(), false);
+    for (std::size_t k = 0; k < points.size(); ++k) {
+        bool isCacheable = false;
+        groups[_getInputs(points[k], positions[k], isCacheable)].push_back(k);
+        cacheable[k] = isCacheable;
     }
-
-    afw::geom::Box2I bbox = getOverallBBox(imgVector);
-
-    // create a zero image of the right size to sum into
-    PTR(afw::detection::Psf::Image) image = boost::make_shared<afw::detection::Psf::Image>(bbox);
-    *image = 0.0;
-    addToImage(image, imgVector, weightVector);
-    *image /= weightSum;
-    return image;
+    std::vector<PTR(Image)> result(points.size());
+    for (GroupMap::const_iterator group = groups.begin(); group != groups.end(); ++group) {
+        std::vector<std::size_t> const & inputs = group->first;
+        if (inputs.empty()) {
+            throw LSST_EXCEPT(
+                pex::exceptions::InvalidParameterError,
+                (boost::format("Cannot compute CoaddPsf at point %s; no input images at that point.")
+                 % points[group->second.front()]).str()
+            );
+        }
+        std::vector<CONST_PTR(WarpedPsf)> components = _makeComponents(inputs);
+        std::vector<std::size_t> const & members = group->second;
+        for (std::vector<std::size_t>::const_iterator k = members.begin(); k != members.end(); ++k) {
+            result[*k] = _computeKernelImage(positions[*k], color, inputs, components, cacheable[*k]);
+        }
+        _countFastPaths(components);
+    }
+    return result;
 }
 
 /**
@@ -403,8 +1080,14 @@ CoaddPsf::CoaddPsf(
 ) :
     _catalog(catalog), _coaddWcs(coaddWcs), _weightKey(_catalog.getSchema()["weight"]),
     _averagePosition(averagePosition), _warpingKernelName(warpingKernelName),
-    _warpingControl(new afw::math::WarpingControl(warpingKernelName, "", cacheSize))
-{}
+    _warpingControl(new afw::math::WarpingControl(warpingKernelName, "", cacheSize)),
+    _warpingControls(1, _warpingControl),
+    _inputIndex(boost::make_shared<CoaddPsfInputIndex>(_catalog, _coaddWcs)),
+    _warpFastPathTolerance(0.0),
+    _warpFastPathCount(0)
+{
+    _initInputTransforms();
+}
 
 }}} // namespace lsst::meas::algorithms
 
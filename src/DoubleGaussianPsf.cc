@@ -22,6 +22,7 @@
  */
 
 #include <cmath>
+#include <vector>
 
 #include "lsst/pex/exceptions.h"
 #include "lsst/afw/math/FunctionLibrary.h"
@@ -31,6 +32,7 @@
 #include "lsst/afw/table/io/CatalogVector.h"
 #include "lsst/afw/detection/PsfFormatter.h"
 #include "lsst/meas/algorithms/DoubleGaussianPsf.h"
+#include "lsst/meas/algorithms/detail/GaussianPsfUtils.h"
 
 BOOST_CLASS_EXPORT(lsst::meas::algorithms::DoubleGaussianPsf)
 
@@ -105,6 +107,27 @@ PTR(afw::math::Kernel) makeDoubleGaussianKernel(
     return kernel;
 }
 
+// Return the adaptive (Gaussian-weighted) second moment of the circular profile
+// sum_k a_k G(r; s_k), where the a_k are the integrals of the components and the s_k their
+// variances.  Adaptive moments measure a weight function of variance m for which the weighted
+// second moment of the profile is m/2; for a single Gaussian this gives m = s.  We iterate with
+// the same update SdssShape uses, m -> 1/(1/weighted - 1/m).
+double computeAdaptiveMoment(double a1, double s1, double a2, double s2) {
+    double m = (a1*s1 + a2*s2)/(a1 + a2);
+    for (int iter = 0; iter < 100; ++iter) {
+        double const c1 = a1*m/(s1 + m);
+        double const c2 = a2*m/(s2 + m);
+        double const weighted = (c1*s1*m/(s1 + m) + c2*s2*m/(s2 + m))/(c1 + c2);
+        double const next = 1.0/(1.0/weighted - 1.0/m);
+        bool const converged = std::fabs(next - m) <= 1E-12*m;
+        m = next;
+        if (converged) {
+            break;
+        }
+    }
+    return m;
+}
+
 std::string getDoubleGaussianPsfPersistenceName() { return "DoubleGaussianPsf"; }
 
 DoubleGaussianPsfFactory registration(getDoubleGaussianPsfPersistenceName());
@@ -124,6 +147,73 @@ PTR(afw::detection::Psf) DoubleGaussianPsf::clone() const {
     );
 }
 
+PTR(afw::detection::Psf::Image) DoubleGaussianPsf::doComputeKernelImage(
+    afw::geom::Point2D const &, afw::image::Color const &
+) const {
+    afw::math::Kernel const & kernel = *getKernel();
+    PTR(Image) im = boost::make_shared<Image>(kernel.getDimensions());
+    im->setXY0(-kernel.getCtrX(), -kernel.getCtrY());
+    std::vector<double> gx1(kernel.getWidth()), gy1(kernel.getHeight());
+    std::vector<double> gx2(kernel.getWidth()), gy2(kernel.getHeight());
+    double const sum1 = detail::fillGaussian(gx1, kernel.getCtrX(), _sigma1)
+        * detail::fillGaussian(gy1, kernel.getCtrY(), _sigma1);
+    double const sum2 = detail::fillGaussian(gx2, kernel.getCtrX(), _sigma2)
+        * detail::fillGaussian(gy2, kernel.getCtrY(), _sigma2);
+    double const norm = 1.0/(sum1 + _b*sum2);
+    for (int y = 0; y < im->getHeight(); ++y) {
+        double const a1 = norm*gy1[y];
+        double const a2 = norm*_b*gy2[y];
+        Image::x_iterator pix = im->row_begin(y);
+        for (int x = 0; x < im->getWidth(); ++x, ++pix) {
+            *pix = a1*gx1[x] + a2*gx2[x];
+        }
+    }
+    return im;
+}
+
+bool DoubleGaussianPsf::isAnalytic() const {
+    afw::math::Kernel const & kernel = *getKernel();
+    return detail::computeTruncatedFraction(kernel, _sigma1) <= detail::MAX_TRUNCATED_FRACTION &&
+        (_b == 0.0 || detail::computeTruncatedFraction(kernel, _sigma2) <= detail::MAX_TRUNCATED_FRACTION);
+}
+
+double DoubleGaussianPsf::doComputeApertureFlux(
+    double radius, afw::geom::Point2D const & position, afw::image::Color const & color
+) const {
+    if (!isAnalytic()) {
+        return KernelPsf::doComputeApertureFlux(radius, position, color);
+    }
+    // The integrals of the two components are in the ratio sigma1^2 : b*sigma2^2
+    double const a1 = _sigma1*_sigma1;
+    double const a2 = _b*_sigma2*_sigma2;
+    double const r2 = radius*radius;
+    return (a1*(1.0 - std::exp(-0.5*r2/(_sigma1*_sigma1))) + a2*(1.0 - std::exp(-0.5*r2/(_sigma2*_sigma2))))
+        / (a1 + a2);
+}
+
+afw::geom::ellipses::Quadrupole DoubleGaussianPsf::doComputeShape(
+    afw::geom::Point2D const & position, afw::image::Color const & color
+) const {
+    if (!isAnalytic()) {
+        return KernelPsf::doComputeShape(position, color);
+    }
+    double const s1 = _sigma1*_sigma1;
+    double const s2 = _sigma2*_sigma2;
+    double const m = computeAdaptiveMoment(s1, s1, _b*s2, s2);
+    return afw::geom::ellipses::Quadrupole(m, m, 0.0);
+}
+
+std::vector<afw::geom::ellipses::Quadrupole> DoubleGaussianPsf::doComputeShapes(
+    std::vector<afw::geom::Point2D> const & points, afw::image::Color const & color
+) const {
+    if (!isAnalytic()) {
+        return KernelPsf::doComputeShapes(points, color);
+    }
+    return std::vector<afw::geom::ellipses::Quadrupole>(
+        points.size(), doComputeShape(afw::geom::Point2D(), color)
+    );
+}
+
 std::string DoubleGaussianPsf::getPersistenceName() const { return getDoubleGaussianPsfPersistenceName(); }
 
 void DoubleGaussianPsf::write(OutputArchiveHandle & handle) const {
@@ -21,6 +21,11 @@
  * see <http://www.lsstcorp.org/LegalNotices/>.
  */
 
+#include <algorithm>
+
+#include "boost/format.hpp"
+#include "lsst/utils/ieee.h"
+#include "lsst/pex/exceptions.h"
 #include "lsst/afw/image/MaskedImage.h"
 #include "lsst/meas/algorithms/ImagePsf.h"
 #include "lsst/meas/base/detail/SdssShapeImpl.h"
@@ -28,6 +33,47 @@
 
 namespace lsst { namespace meas { namespace algorithms {
 
+namespace {
+
+afw::geom::ellipses::Quadrupole computeImageShape(afw::detection::Psf::Image const & image) {
+    base::detail::SdssShapeImpl shape;
+    // n.b. getAdaptiveMoments doesn't account for xy0, so we have to do it manually
+    base::detail::getAdaptiveMoments(
+        image,
+        0.0, -image.getX0(), -image.getY0(), 1.0,   // background, x, y, shiftmax
+        &shape
+    );
+    return afw::geom::ellipses::Quadrupole(shape.getIxx(), shape.getIyy(), shape.getIxy());
+}
+
+// Unpack an (N, 2) array of positions, replacing NaNs with the average position
+std::vector<afw::geom::Point2D> makePoints(
+    ndarray::Array<double const,2,1> const & points,
+    afw::detection::Psf const & psf
+) {
+    if (points.getSize<0>() > 0 && points.getSize<1>() != 2) {
+        throw LSST_EXCEPT(
+            pex::exceptions::LengthError,
+            (boost::format("Positions must be an array of shape (N, 2); got (%d, %d)")
+             % points.getSize<0>() % points.getSize<1>()).str()
+        );
+    }
+    std::vector<afw::geom::Point2D> result;
+    result.reserve(points.getSize<0>());
+    for (int i = 0; i < points.getSize<0>(); ++i) {
+        double const x = points[i][0];
+        double const y = points[i][1];
+        if (utils::isnan(x) || utils::isnan(y)) {
+            result.push_back(psf.getAveragePosition());
+        } else {
+            result.push_back(afw::geom::Point2D(x, y));
+        }
+    }
+    return result;
+}
+
+} // anonymous
+
 double ImagePsf::doComputeApertureFlux(
     double radius, afw::geom::Point2D const & position, afw::image::Color const & color
 ) const {
@@ -46,15 +92,71 @@ double ImagePsf::doComputeApertureFlux(
 afw::geom::ellipses::Quadrupole ImagePsf::doComputeShape(
     afw::geom::Point2D const & position, afw::image::Color const & color
 ) const {
-    base::detail::SdssShapeImpl shape;
-    PTR(Image) image = computeKernelImage(position, color, INTERNAL);
-    // n.b. getAdaptiveMoments doesn't account for xy0, so we have to do it manually
-    base::detail::getAdaptiveMoments(
-        *image,
-        0.0, -image->getX0(), -image->getY0(), 1.0,   // background, x, y, shiftmax
-        &shape
+    return computeImageShape(*computeKernelImage(position, color, INTERNAL));
+}
+
+std::vector<PTR(afw::detection::Psf::Image)> ImagePsf::doComputeKernelImages(
+    std::vector<afw::geom::Point2D> const & points, afw::image::Color const & color
+) const {
+    std::vector<PTR(Image)> result;
+    result.reserve(points.size());
+    for (std::vector<afw::geom::Point2D>::const_iterator i = points.begin(); i != points.end(); ++i) {
+        result.push_back(computeKernelImage(*i, color, INTERNAL));
+    }
+    return result;
+}
+
+std::vector<afw::geom::ellipses::Quadrupole> ImagePsf::doComputeShapes(
+    std::vector<afw::geom::Point2D> const & points, afw::image::Color const & color
+) const {
+    std::vector<PTR(Image)> images = doComputeKernelImages(points, color);
+    std::vector<afw::geom::ellipses::Quadrupole> result;
+    result.reserve(images.size());
+    for (std::vector<PTR(Image)>::const_iterator i = images.begin(); i != images.end(); ++i) {
+        result.push_back(computeImageShape(**i));
+    }
+    return result;
+}
+
+ndarray::Array<double,3,3> ImagePsf::computeKernelImages(
+    ndarray::Array<double const,2,1> const & points,
+    afw::image::Color const & color
+) const {
+    std::vector<PTR(Image)> images = doComputeKernelImages(makePoints(points, *this), color);
+    // Find the smallest odd-sized box centered on the origin that contains all the images.
+    int xHalfWidth = 0;
+    int yHalfWidth = 0;
+    for (std::vector<PTR(Image)>::const_iterator i = images.begin(); i != images.end(); ++i) {
+        xHalfWidth = std::max(xHalfWidth, std::max(-(*i)->getX0(), (*i)->getX0() + (*i)->getWidth() - 1));
+        yHalfWidth = std::max(yHalfWidth, std::max(-(*i)->getY0(), (*i)->getY0() + (*i)->getHeight() - 1));
+    }
+    ndarray::Array<double,3,3> result = ndarray::allocate(
+        ndarray::makeVector(int(images.size()), 2*yHalfWidth + 1, 2*xHalfWidth + 1)
     );
-    return afw::geom::ellipses::Quadrupole(shape.getIxx(), shape.getIyy(), shape.getIxy());
+    result.deep() = 0.0;
+    for (std::size_t n = 0; n < images.size(); ++n) {
+        Image const & image = *images[n];
+        int const x0 = image.getX0() + xHalfWidth;
+        int const y0 = image.getY0() + yHalfWidth;
+        for (int y = 0; y < image.getHeight(); ++y) {
+            std::copy(image.row_begin(y), image.row_end(y), result[n][y + y0].begin() + x0);
+        }
+    }
+    return result;
+}
+
+ndarray::Array<double,2,2> ImagePsf::computeShapes(
+    ndarray::Array<double const,2,1> const & points,
+    afw::image::Color const & color
+) const {
+    std::vector<afw::geom::ellipses::Quadrupole> shapes = doComputeShapes(makePoints(points, *this), color);
+    ndarray::Array<double,2,2> result = ndarray::allocate(ndarray::makeVector(int(shapes.size()), 3));
+    for (std::size_t n = 0; n < shapes.size(); ++n) {
+        result[n][0] = shapes[n].getIxx();
+        result[n][1] = shapes[n].getIyy();
+        result[n][2] = shapes[n].getIxy();
+    }
+    return result;
 }
 
 }}} // namespace lsst::meas::algorithms
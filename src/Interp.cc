@@ -35,6 +35,8 @@
 #include <string>
 #include <typeinfo>
 #include <limits>
+#include <set>
+#include <vector>
 #include "boost/format.hpp"
 
 #include "lsst/afw/geom.h"
@@ -52,16 +54,105 @@ namespace geom = lsst::afw::geom;
 
 typedef std::vector<Defect::Ptr>::const_iterator DefectCIter;
 
+namespace {
+    template<typename T>
+    struct Sort_ByX0 : public std::binary_function<typename T::Ptr const, typename T::Ptr const, bool> {
+        bool operator() (typename T::Ptr const a, typename T::Ptr const b) const {
+            return a->getX0() < b->getX0();
+        }
+    };
+
+    /*
+     * Compare the indices of two Defects in a list by their first or last rows
+     */
+    class DefectRowCompar {
+    public:
+        DefectRowCompar(std::vector<Defect::Ptr> const & badList, bool const useY0) :
+            _badList(badList), _useY0(useY0) {}
+
+        bool operator()(int const a, int const b) const {
+            return _useY0 ? (_badList[a]->getY0() < _badList[b]->getY0()) :
+                            (_badList[a]->getY1() < _badList[b]->getY1());
+        }
+    private:
+        std::vector<Defect::Ptr> const & _badList;
+        bool _useY0;
+    };
+
+    /*
+     * An index of a list of Defects sorted by x0, giving the order in which the Defects start and end
+     * as we sweep up the image; built once per list.
+     */
+    class DefectRowIndex {
+    public:
+        explicit DefectRowIndex(std::vector<Defect::Ptr> const & badList) :
+            _badList(badList), _byY0(badList.size()), _byY1(badList.size()) {
+            for (std::size_t i = 0; i != badList.size(); ++i) {
+                _byY0[i] = _byY1[i] = i;
+            }
+            std::sort(_byY0.begin(), _byY0.end(), DefectRowCompar(badList, true));
+            std::sort(_byY1.begin(), _byY1.end(), DefectRowCompar(badList, false));
+        }
+
+        std::vector<Defect::Ptr> const & getDefects() const { return _badList; }
+        std::vector<int> const & getByY0() const { return _byY0; } ///< indices of Defects in order of y0
+        std::vector<int> const & getByY1() const { return _byY1; } ///< indices of Defects in order of y1
+    private:
+        std::vector<Defect::Ptr> const & _badList;
+        std::vector<int> _byY0;
+        std::vector<int> _byY1;
+    };
+
+    /*
+     * The Defects from a DefectRowIndex that touch a row, as that row moves up the image.
+     *
+     * The Defects are identified by their indices in the (x0-sorted) list, so iterating over
+     * them visits them in order of x0.  Moving to a new row costs only the number of Defects
+     * that start or end, plus the first move to wherever we begin.
+     */
+    class ActiveDefects {
+    public:
+        typedef std::set<int>::const_iterator const_iterator;
+
+        explicit ActiveDefects(DefectRowIndex const & index) :
+            _index(index), _nextStart(0), _nextEnd(0) {}
+
+        /// Move to row y, which may not be below the previous row
+        void setRow(int const y) {
+            std::vector<Defect::Ptr> const & badList = _index.getDefects();
+            std::vector<int> const & byY0 = _index.getByY0();
+            std::vector<int> const & byY1 = _index.getByY1();
+            int const n = byY0.size();
+
+            for (; _nextStart != n && badList[byY0[_nextStart]]->getY0() <= y; ++_nextStart) {
+                _active.insert(byY0[_nextStart]);
+            }
+            for (; _nextEnd != n && badList[byY1[_nextEnd]]->getY1() < y; ++_nextEnd) {
+                _active.erase(byY1[_nextEnd]);
+            }
+        }
+
+        const_iterator begin() const { return _active.begin(); }
+        const_iterator end() const { return _active.end(); }
+    private:
+        DefectRowIndex const & _index;
+        int _nextStart;                 // next Defect to start, in _index.getByY0()
+        int _nextEnd;                   // next Defect to end, in _index.getByY1()
+        std::set<int> _active;          // the Defects touching the current row
+    };
+}
+
 /************************************************************************************************************/
 /*
- * Classify an vector of Defect::Ptr for the given row, returning a vector of 1-D
+ * Classify the Defects that touch the given row, returning a vector of 1-D
  * Defects (i.e. y0 == y1).  In general we can merge in saturated pixels at
  * this step, although we don't currently do so.
  *
  * See comment above do_defects for a description of how to interpret DefectType
  */
 static std::vector<Defect::Ptr>
-classify_defects(std::vector<Defect::Ptr> const & badList, // list of bad things
+classify_defects(std::vector<Defect::Ptr> const & badList, // list of bad things, sorted by x0
+                 ActiveDefects const & active, // the members of badList that touch this row
                  int const y,           // the row to process
                  int const ncol,        // number of columns in image
                  int = 0                // number of rows in image
@@ -69,10 +160,11 @@ classify_defects(std::vector<Defect::Ptr> const & badList, // list of bad things
 
     std::vector<Defect::Ptr> badList1D;
 
-    for (DefectCIter begin = badList.begin(), end = badList.end(), bri = begin; bri != end; ++bri) {
-        Defect::Ptr defect = *bri;
+    for (ActiveDefects::const_iterator end = active.end(), bri = active.begin(); bri != end; ++bri) {
+        Defect::Ptr defect = badList[*bri];
+        assert(y >= defect->getY0() && y <= defect->getY1());
 
-        if (y < defect->getY0() || y > defect->getY1() || ncol < defect->getX0()) {
+        if (ncol < defect->getX0()) {
             continue;
         }
 
@@ -82,11 +174,8 @@ classify_defects(std::vector<Defect::Ptr> const & badList, // list of bad things
         // Look for other defects that touch this one, and push them onto badList1d
         //
         for (++bri; bri != end; ++bri) {
-            defect = *bri;
+            defect = badList[*bri];
 
-            if (y < defect->getY0() || y > defect->getY1()) { // this defect doesn't concern this row
-                continue;
-            }
             if (x1 < defect->getX0() - 1) { // no further defects can touch this one
                 --bri;
                 break;
@@ -2042,36 +2131,31 @@ static void do_defects(std::vector<Defect::Ptr> const & badList, // list of bad
 
 /************************************************************************************************************/
 
-namespace {
-    template<typename T>
-    struct Sort_ByX0 : public std::binary_function<typename T::Ptr const, typename T::Ptr const, bool> {
-        bool operator() (typename T::Ptr const a, typename T::Ptr const b) const {
-            return a->getX0() < b->getX0();
-        }
-    };
-}
-
 /*!
- * @brief Process a set of known bad pixels in an image
+ * @brief Prepare to interpolate over a set of known bad pixels in images with a given bounding box
+ *
+ * The Defects are clipped to the bbox, sorted, and classified row by row; all that's left for
+ * interpolateOverDefects to do is the pixel work, so a plan may be applied to every image from a detector.
  */
-template<typename MaskedImageT>
-void interpolateOverDefects(MaskedImageT& mimage, ///< Image to patch
-                            lsst::afw::detection::Psf const &, ///< the Image's PSF
-                            std::vector<Defect::Ptr> &_badList, ///< List of Defects to patch
-                            double fallbackValue,                ///< Value to fallback to if all else fails
-                            bool useFallbackValueAtEdge ///< Use the fallback value at the image's edge?
-                           ) {
+DefectInterpolationPlan::DefectInterpolationPlan(
+        std::vector<Defect::Ptr> const& _badList, ///< List of Defects to patch
+        geom::BoxI const& bbox,         ///< The (PARENT) bounding box of the images to be patched
+        int nThreads                    ///< Number of threads to use (if OpenMP is available)
+                                                ) :
+    _bbox(bbox), _rows(bbox.getHeight())
+{
 /*
  * Allow for image's origin
  */
-    int const width = mimage.getWidth();
-    int const height = mimage.getHeight();
+    int const width = bbox.getWidth();
+    int const height = bbox.getHeight();
 
     std::vector<Defect::Ptr> badList;
     badList.reserve(_badList.size());
-    for (std::vector<Defect::Ptr>::iterator ptr = _badList.begin(), end = _badList.end(); ptr != end; ++ptr) {
+    for (std::vector<Defect::Ptr>::const_iterator ptr = _badList.begin(), end = _badList.end();
+         ptr != end; ++ptr) {
         geom::BoxI bbox = (*ptr)->getBBox();
-        bbox.shift(geom::ExtentI(-mimage.getX0(), -mimage.getY0())); //allow for image's origin
+        bbox.shift(geom::ExtentI(-_bbox.getMinX(), -_bbox.getMinY())); //allow for image's origin
 		geom::PointI min = bbox.getMin(), max = bbox.getMax();
 		if(min.getX() >= width){
             continue;
@@ -2096,6 +2180,44 @@ void interpolateOverDefects(MaskedImageT& mimage, ///< Image to patch
     }
 
     sort(badList.begin(), badList.end(), Sort_ByX0<Defect>());
+
+    DefectRowIndex const index(badList);
+    /*
+     * Each row is classified independently, so we can process bands of rows in parallel
+     */
+    int const nBand = (nThreads > 1) ? std::min(nThreads, height) : 1;
+#ifdef _OPENMP
+#pragma omp parallel for num_threads(nThreads) schedule(static, 1)
+#endif
+    for (int k = 0; k < nBand; ++k) {
+        ActiveDefects active(index);    // the defects touching the current row
+
+        for (int y = (k*height)/nBand, yEnd = ((k + 1)*height)/nBand; y < yEnd; ++y) {
+            active.setRow(y);
+            _rows[y] = classify_defects(badList, active, y, width);
+        }
+    }
+}
+
+/*!
+ * @brief Process a set of known bad pixels in an image, as prepared by a DefectInterpolationPlan
+ *
+ * @throw lsst::pex::exceptions::LengthError if the image's bounding box isn't the plan's
+ */
+template<typename MaskedImageT>
+void interpolateOverDefects(MaskedImageT& mimage, ///< Image to patch
+                            DefectInterpolationPlan const& plan, ///< the Defects to patch, classified
+                            double fallbackValue,                ///< Value to fallback to if all else fails
+                            bool useFallbackValueAtEdge, ///< Use the fallback value at the image's edge?
+                            int nThreads                 ///< Number of threads to use (if OpenMP is available)
+                           ) {
+    if (mimage.getBBox(image::PARENT) != plan.getBBox()) {
+        throw LSST_EXCEPT(lsst::pex::exceptions::LengthError,
+                          (boost::format("Image's bounding box %s doesn't match the plan's %s") %
+                           mimage.getBBox(image::PARENT) % plan.getBBox()).str());
+    }
+
+    int const height = mimage.getHeight();
 /*
  * Go through the frame looking at each pixel (except the edge ones which we ignore)
  */
@@ -2104,9 +2226,17 @@ void interpolateOverDefects(MaskedImageT& mimage, ///< Image to patch
 
     int nUseInterp = 6;                       // no. of pixels to interpolate towards edge
     assert(nUseInterp < Defect::WIDE_DEFECT); // we'd use C++11's static_assert if available
-
-    for (int y = 0; y != height; y++) {
-        std::vector<Defect::Ptr> badList1D = classify_defects(badList, y, width);
+    /*
+     * Each row is interpolated independently, so we can process rows in parallel
+     */
+#ifdef _OPENMP
+#pragma omp parallel for num_threads(nThreads) schedule(static)
+#endif
+    for (int y = 0; y < height; ++y) {
+        std::vector<Defect::Ptr> const& badList1D = plan.getRow(y);
+        if (badList1D.empty()) {
+            continue;
+        }
 
         do_defects(badList1D, y, *mimage.getImage(),
                    -std::numeric_limits<typename MaskedImageT::Image::Pixel>::max(),
@@ -2120,6 +2250,25 @@ void interpolateOverDefects(MaskedImageT& mimage, ///< Image to patch
     }
 }
 
+/*!
+ * @brief Process a set of known bad pixels in an image
+ *
+ * If you're going to patch many images with the same Defects, make a DefectInterpolationPlan
+ * and use it instead.
+ */
+template<typename MaskedImageT>
+void interpolateOverDefects(MaskedImageT& mimage, ///< Image to patch
+                            lsst::afw::detection::Psf const &, ///< the Image's PSF
+                            std::vector<Defect::Ptr> &badList, ///< List of Defects to patch
+                            double fallbackValue,                ///< Value to fallback to if all else fails
+                            bool useFallbackValueAtEdge, ///< Use the fallback value at the image's edge?
+                            int nThreads                 ///< Number of threads to use (if OpenMP is available)
+                           ) {
+    DefectInterpolationPlan const plan(badList, mimage.getBBox(image::PARENT), nThreads);
+
+    interpolateOverDefects(mimage, plan, fallbackValue, useFallbackValueAtEdge, nThreads);
+}
+
 /*****************************************************************************/
 /**
  *
@@ -2243,8 +2392,11 @@ typedef float ImagePixel;
 
 template
 void interpolateOverDefects(image::MaskedImage<ImagePixel, image::MaskPixel> &image,
-                            lsst::afw::detection::Psf const &, std::vector<Defect::Ptr> &badList, double, bool
-                           );
+                            lsst::afw::detection::Psf const &, std::vector<Defect::Ptr> &badList, double, bool,
+                            int);
+template
+void interpolateOverDefects(image::MaskedImage<ImagePixel, image::MaskPixel> &image,
+                            DefectInterpolationPlan const &, double, bool, int);
 template
 std::pair<bool, ImagePixel> interp::singlePixel(int x, int y,
                                                 image::MaskedImage<ImagePixel, image::MaskPixel> const& image,
@@ -2255,8 +2407,11 @@ std::pair<bool, ImagePixel> interp::singlePixel(int x, int y,
 #if 1
 template
 void interpolateOverDefects(image::MaskedImage<double, image::MaskPixel> &image,
-                            lsst::afw::detection::Psf const &, std::vector<Defect::Ptr> &badList, double, bool
-                           );
+                            lsst::afw::detection::Psf const &, std::vector<Defect::Ptr> &badList, double, bool,
+                            int);
+template
+void interpolateOverDefects(image::MaskedImage<double, image::MaskPixel> &image,
+                            DefectInterpolationPlan const &, double, bool, int);
 
 template
 std::pair<bool, double> interp::singlePixel(int x, int y,
@@ -30,6 +30,7 @@
  * @ingroup algorithms
  */
 #include <cmath>
+#include <vector>
 
 #include "boost/make_shared.hpp"
 
@@ -67,6 +68,51 @@ PTR(afw::detection::Psf) PcaPsf::clone() const {
     return boost::make_shared<PcaPsf>(*this);
 }
 
+std::vector<PTR(afw::detection::Psf::Image)> PcaPsf::doComputeKernelImages(
+    std::vector<afw::geom::Point2D> const & points, afw::image::Color const & color
+) const {
+    afw::math::LinearCombinationKernel const & kernel = *getKernel();
+    if (!kernel.isSpatiallyVarying()) { // every point has the same image, which computeKernelImage caches
+        return KernelPsf::doComputeKernelImages(points, color);
+    }
+    //
+    // This is what LinearCombinationKernel::computeImage does for each point, but we only compute the
+    // (unnormalized) basis images and their sums once
+    //
+    afw::math::KernelList const & basisKernels = kernel.getKernelList();
+    std::vector<PTR(Image)> basisImages;
+    std::vector<double> basisSums;
+    basisImages.reserve(basisKernels.size());
+    basisSums.reserve(basisKernels.size());
+    for (afw::math::KernelList::const_iterator k = basisKernels.begin(); k != basisKernels.end(); ++k) {
+        PTR(Image) basisImage = boost::make_shared<Image>((*k)->getDimensions());
+        basisSums.push_back((*k)->computeImage(*basisImage, false));
+        basisImages.push_back(basisImage);
+    }
+    std::vector<afw::math::Kernel::SpatialFunctionPtr> const spatialFunctions =
+        kernel.getSpatialFunctionList();
+
+    std::vector<PTR(Image)> result;
+    result.reserve(points.size());
+    for (std::vector<afw::geom::Point2D>::const_iterator i = points.begin(); i != points.end(); ++i) {
+        PTR(Image) im = boost::make_shared<Image>(kernel.getDimensions());
+        *im = 0.0;
+        double imSum = 0.0;
+        for (std::size_t k = 0; k != basisImages.size(); ++k) {
+            double const param = (*spatialFunctions[k])(i->getX(), i->getY());
+            im->scaledPlus(param, *basisImages[k]);
+            imSum += param*basisSums[k];
+        }
+        if (imSum == 0.0) {
+            throw LSST_EXCEPT(lsst::pex::exceptions::OverflowError, "Cannot normalize; kernel sum is 0");
+        }
+        *im /= imSum;
+        im->setXY0(-kernel.getCtrX(), -kernel.getCtrY());
+        result.push_back(im);
+    }
+    return result;
+}
+
 namespace {
 
 // registration for table persistence
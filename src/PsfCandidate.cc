@@ -56,6 +56,8 @@ template <typename PixelT>
 float measAlg::PsfCandidate<PixelT>::_pixelThreshold = 0.0;
 template <typename PixelT>
 bool measAlg::PsfCandidate<PixelT>::_doMaskBlends = true;
+template <typename PixelT>
+int measAlg::PsfCandidate<PixelT>::_extractionVersion = 0;
 
 /************************************************************************************************************/
 namespace {
@@ -285,25 +287,49 @@ measAlg::PsfCandidate<PixelT>::extractImage(
 }
 
 
+/**
+ * Forget all the %images of the Source that we've extracted from the parent Exposure
+ *
+ * The %images are cached (by size, and for getOffsetImage by warping algorithm and buffer), as the
+ * candidate's pixels don't usually change while we fit a PSF.  If they do, call this.  Changing the
+ * pixelThreshold or maskBlends clears all the candidates' caches automatically.
+ */
+template <typename PixelT>
+void measAlg::PsfCandidate<PixelT>::clearImageCache() const {
+    _images.clear();
+    _offsetImages.clear();
+    _image.reset();
+}
+
+/*
+ * Clear our caches if the way that we extract images has changed since they were filled
+ */
+template <typename PixelT>
+void measAlg::PsfCandidate<PixelT>::validateImageCache() const {
+    if (_cacheVersion != _extractionVersion) {
+        clearImageCache();
+        _cacheVersion = _extractionVersion;
+    }
+}
+
 /**
  * Return the %image at the position of the Source, without any sub-pixel shifts to put the centre of the
  * object in the centre of a pixel (for that, use getOffsetImage())
  *
+ * The %image is shared with later calls with the same width and height, so don't modify it.
  */
 template <typename PixelT>
 CONST_PTR(afwImage::MaskedImage<PixelT>)
 measAlg::PsfCandidate<PixelT>::getMaskedImage(int width, int height) const {
+    validateImageCache();
 
-
-    if (_haveImage && (width != _image->getWidth() || height != _image->getHeight())) {
-        _haveImage = false;
+    std::pair<int, int> const key(width, height);
+    typename ImageCache::const_iterator ptr = _images.find(key);
+    if (ptr == _images.end()) {
+        ptr = _images.insert(std::make_pair(key, extractImage(width, height))).first;
     }
+    _image = ptr->second;
 
-    if (!_haveImage) {
-        _image = extractImage(width, height);
-        _haveImage = true;
-    }
-    
     return _image;
 }
 
@@ -326,18 +352,22 @@ CONST_PTR(afwImage::MaskedImage<PixelT>) measAlg::PsfCandidate<PixelT>::getMaske
  * @brief Return an offset version of the image of the source.
  * The returned image has been offset to put the centre of the object in the centre of a pixel.
  *
+ * The %image is shared with later calls with the same arguments (and candidate size), so don't modify it.
  */
 template <typename PixelT>
-PTR(afwImage::MaskedImage<PixelT>)
+CONST_PTR(afwImage::MaskedImage<PixelT>)
 measAlg::PsfCandidate<PixelT>::getOffsetImage(
     std::string const algorithm,        // Warping algorithm to use
     unsigned int buffer                 // Buffer for warping
 ) const {
+    validateImageCache();
+
     unsigned int const width = getWidth() == 0 ? _defaultWidth : getWidth();
     unsigned int const height = getHeight() == 0 ? _defaultWidth : getHeight();
-    if (_offsetImage && static_cast<unsigned int>(_offsetImage->getWidth()) == width + 2*buffer && 
-        static_cast<unsigned int>(_offsetImage->getHeight()) == height + 2*buffer) {
-        return _offsetImage;
+    typename OffsetImageCache::key_type const key(width, height, algorithm, buffer);
+    typename OffsetImageCache::const_iterator ptr = _offsetImages.find(key);
+    if (ptr != _offsetImages.end()) {
+        return ptr->second;
     }
 
     PTR(MaskedImageT) image = extractImage(width + 2*buffer, height + 2*buffer);
@@ -350,14 +380,13 @@ measAlg::PsfCandidate<PixelT>::getOffsetImage(
     afwGeom::Point2I llc(buffer, buffer);
     afwGeom::Extent2I dims(width, height);
     afwGeom::Box2I box(llc, dims);
-    _offsetImage.reset(new MaskedImageT(*offset, box, afwImage::LOCAL, true)); // Deep copy
+    PTR(MaskedImageT) shifted(new MaskedImageT(*offset, box, afwImage::LOCAL, true)); // Deep copy
+    _offsetImages[key] = shifted;
 
-    return _offsetImage;
+    return shifted;
 }
 
 
-
-
 /************************************************************************************************************/
 //
 // Explicit instantiations
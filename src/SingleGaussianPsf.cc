@@ -30,9 +30,11 @@
  * @ingroup algorithms
  */
 #include <cmath>
+#include <vector>
 #include "lsst/afw/math/FunctionLibrary.h"
 #include "lsst/pex/exceptions.h"
 #include "lsst/meas/algorithms/SingleGaussianPsf.h"
+#include "lsst/meas/algorithms/detail/GaussianPsfUtils.h"
 #include "lsst/afw/image/ImageUtils.h"
 #include "lsst/afw/table/io/InputArchive.h"
 #include "lsst/afw/table/io/OutputArchive.h"
@@ -100,6 +102,17 @@ PTR(afw::math::Kernel) makeSingleGaussianKernel(int width, int height, double si
     return boost::make_shared<afw::math::SeparableKernel>(width, height, sg, sg);
 }
 
+// Return a vector of exp(-x^2/(2 sigma^2)) at the pixel offsets x = i - ctr, normalized to unit sum;
+// this is the same 1-d function the SeparableKernel evaluates.
+std::vector<double> makeNormalizedGaussian(int size, int ctr, double sigma) {
+    std::vector<double> result(size);
+    double const sum = detail::fillGaussian(result, ctr, sigma);
+    for (int i = 0; i < size; ++i) {
+        result[i] /= sum;
+    }
+    return result;
+}
+
 } // anonymous
 
 SingleGaussianPsf::SingleGaussianPsf(int width, int height, double sigma) :
@@ -113,6 +126,56 @@ PTR(afw::detection::Psf) SingleGaussianPsf::clone() const {
     );
 }
 
+PTR(afw::detection::Psf::Image) SingleGaussianPsf::doComputeKernelImage(
+    afw::geom::Point2D const &, afw::image::Color const &
+) const {
+    afw::math::Kernel const & kernel = *getKernel();
+    PTR(Image) im = boost::make_shared<Image>(kernel.getDimensions());
+    im->setXY0(-kernel.getCtrX(), -kernel.getCtrY());
+    std::vector<double> const gx = makeNormalizedGaussian(kernel.getWidth(), kernel.getCtrX(), _sigma);
+    std::vector<double> const gy = makeNormalizedGaussian(kernel.getHeight(), kernel.getCtrY(), _sigma);
+    for (int y = 0; y < im->getHeight(); ++y) {
+        Image::x_iterator pix = im->row_begin(y);
+        for (int x = 0; x < im->getWidth(); ++x, ++pix) {
+            *pix = gx[x]*gy[y];
+        }
+    }
+    return im;
+}
+
+bool SingleGaussianPsf::isAnalytic() const {
+    return detail::computeTruncatedFraction(*getKernel(), _sigma) <= detail::MAX_TRUNCATED_FRACTION;
+}
+
+double SingleGaussianPsf::doComputeApertureFlux(
+    double radius, afw::geom::Point2D const & position, afw::image::Color const & color
+) const {
+    if (!isAnalytic()) {
+        return KernelPsf::doComputeApertureFlux(radius, position, color);
+    }
+    return 1.0 - std::exp(-0.5*radius*radius/(_sigma*_sigma));
+}
+
+afw::geom::ellipses::Quadrupole SingleGaussianPsf::doComputeShape(
+    afw::geom::Point2D const & position, afw::image::Color const & color
+) const {
+    if (!isAnalytic()) {
+        return KernelPsf::doComputeShape(position, color);
+    }
+    return afw::geom::ellipses::Quadrupole(_sigma*_sigma, _sigma*_sigma, 0.0);
+}
+
+std::vector<afw::geom::ellipses::Quadrupole> SingleGaussianPsf::doComputeShapes(
+    std::vector<afw::geom::Point2D> const & points, afw::image::Color const & color
+) const {
+    if (!isAnalytic()) {
+        return KernelPsf::doComputeShapes(points, color);
+    }
+    return std::vector<afw::geom::ellipses::Quadrupole>(
+        points.size(), doComputeShape(afw::geom::Point2D(), color)
+    );
+}
+
 std::string SingleGaussianPsf::getPersistenceName() const { return "SingleGaussianPsf"; }
 
 void SingleGaussianPsf::write(OutputArchiveHandle & handle) const {
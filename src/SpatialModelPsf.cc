@@ -29,7 +29,11 @@
  *
  * @ingroup algorithms
  */
+#include <algorithm>
+#include <limits>
+#include <map>
 #include <numeric>
+#include <string>
 
 #if !defined(DOXYGEN)
 #   include "Minuit2/FCNBase.h"
@@ -43,6 +47,8 @@
 #include "Eigen/Cholesky"
 #include "Eigen/SVD"
 
+#include "boost/make_shared.hpp"
+
 #include "lsst/afw/detection/Footprint.h"
 #include "lsst/afw/math/SpatialCell.h"
 #include "lsst/afw/math/FunctionLibrary.h"
@@ -93,8 +99,9 @@ public:
         }
 
         try {
-            typename MaskedImageT::Ptr im = imCandidate->getOffsetImage(WARP_ALGORITHM,
-                                                                        WARP_BUFFER);
+            // a copy, as the PCA modifies its images, and the candidate's are reused on every iteration
+            typename MaskedImageT::Ptr im(new MaskedImageT(*imCandidate->getOffsetImage(WARP_ALGORITHM,
+                                                                                         WARP_BUFFER), true));
 
             
             //static int count = 0;
@@ -192,6 +199,166 @@ std::vector<typename ImageT::Ptr> offsetKernel(
     return kernelImages;
 }
 
+/************************************************************************************************************/
+/*
+ * Visit candidates in parallel
+ *
+ * A visitor passed to visitCandidatesInParallel must provide, as well as the CandidateVisitor interface:
+ *
+ *   bool prepareCandidate(afwMath::SpatialCellCandidate *candidate, bool ignoreExceptions)
+ *      Called serially, in the order in which the SpatialCellSet visits the candidates, to do anything that
+ *      isn't thread safe (e.g. extracting the candidate's image).  Return false to skip the candidate.
+ *      A candidate may only be skipped if ignoreExceptions is true (or processCandidate would skip it
+ *      silently anyway); otherwise it must be kept (or the exception rethrown), so that processCandidate
+ *      sees it, and anything it throws is rethrown, just as when visiting the candidates serially.
+ *   boost::shared_ptr<VisitorT> makePartial() const
+ *      Return a visitor with the same setup but no results (and its own scratch space).
+ *   void merge(VisitorT const& partial)
+ *      Add a partial visitor's results to our own.
+ */
+/*
+ * The maximum number of partial visitors, each processing a contiguous block of the candidates.  It's fixed,
+ * rather than set by the number of threads, so that the result doesn't depend on the number of threads;
+ * it also bounds the memory used by the partials (e.g. FillABVisitor's matrices)
+ */
+int const MAX_PARTIALS(16);
+
+/// A class to pass around to all our PsfCandidates which remembers the ones that another visitor can process
+template<typename VisitorT>
+class CollectCandidatesVisitor : public afwMath::CandidateVisitor {
+public:
+    CollectCandidatesVisitor(VisitorT *visitor,     // the visitor that will process the candidates
+                             bool ignoreExceptions  // ignore LengthErrors?
+                            ) :
+        afwMath::CandidateVisitor(), _visitor(visitor), _ignoreExceptions(ignoreExceptions) {}
+
+    void reset() {
+        _candidates.clear();
+    }
+
+    // Called by SpatialCellSet::visitCandidates for each Candidate
+    void processCandidate(afwMath::SpatialCellCandidate *candidate) {
+        if (_visitor->prepareCandidate(candidate, _ignoreExceptions)) {
+            _candidates.push_back(candidate);
+        }
+    }
+
+    std::vector<afwMath::SpatialCellCandidate *> const& getCandidates() const { return _candidates; }
+private:
+    VisitorT *_visitor;
+    bool _ignoreExceptions;
+    std::vector<afwMath::SpatialCellCandidate *> _candidates;
+};
+
+/*
+ * Process a set of candidates in (at most MAX_PARTIALS) contiguous blocks, each with its own partial visitor,
+ * and merge the partials into visitor in order; the result is thus independent of the number of threads.
+ *
+ * As in SpatialCell::visitCandidates, ignoreExceptions only applies to LengthErrors.
+ */
+template<typename VisitorT>
+void processCandidatesInParallel(
+        VisitorT *visitor,                                            // the visitor to accumulate results
+        std::vector<afwMath::SpatialCellCandidate *> const& candidates, // the candidates to process
+        bool const ignoreExceptions,                                  // ignore LengthErrors?
+        int const nThreads                                            // number of threads to use
+                                )
+{
+    int const nCandidate = candidates.size();
+    if (nCandidate == 0) {
+        return;
+    }
+    int const nBlock = std::min(nCandidate, MAX_PARTIALS);
+
+    std::vector<boost::shared_ptr<VisitorT> > partials(nBlock);
+    for (int k = 0; k != nBlock; ++k) {
+        partials[k] = visitor->makePartial();
+    }
+    std::vector<int> failed(nBlock, nCandidate); // index of the first candidate in each block that threw
+
+#ifdef _OPENMP
+#pragma omp parallel for num_threads(nThreads) schedule(dynamic)
+#endif
+    for (int k = 0; k < nBlock; ++k) {
+        for (int i = (k*nCandidate)/nBlock, end = ((k + 1)*nCandidate)/nBlock; i < end; ++i) {
+            try {
+                partials[k]->processCandidate(candidates[i]);
+            } catch(lsst::pex::exceptions::LengthError &) {
+                if (!ignoreExceptions) {
+                    failed[k] = i;
+                    break;
+                }
+            } catch(...) {
+                failed[k] = i;
+                break;
+            }
+        }
+    }
+    /*
+     * Exceptions can't escape from a parallel region, so process the first candidate that failed
+     * again to rethrow its exception
+     */
+    int const firstFailed = *std::min_element(failed.begin(), failed.end());
+    if (firstFailed != nCandidate) {
+        visitor->makePartial()->processCandidate(candidates[firstFailed]);
+        throw LSST_EXCEPT(lsst::pex::exceptions::RuntimeError,
+                          "Processing PSF candidate failed in parallel, but not when repeated");
+    }
+
+    for (int k = 0; k != nBlock; ++k) {
+        visitor->merge(*partials[k]);
+    }
+}
+
+/*
+ * Visit the same candidates as psfCells.visitCandidates(visitor, nStarPerCell, ignoreExceptions),
+ * using up to nThreads threads
+ */
+template<typename VisitorT>
+void visitCandidatesInParallel(
+        afwMath::SpatialCellSet const& psfCells, // the SpatialCellSet containing PsfCandidates
+        VisitorT *visitor,                       // the visitor to apply
+        int const nStarPerCell,                  // max no. of stars per cell; <= 0 => infty
+        bool const ignoreExceptions,             // ignore LengthErrors?
+        int const nThreads                       // number of threads to use
+                              )
+{
+    if (nThreads <= 1) {
+        psfCells.visitCandidates(visitor, nStarPerCell, ignoreExceptions);
+        return;
+    }
+
+    visitor->reset();
+    CollectCandidatesVisitor<VisitorT> collector(visitor, ignoreExceptions);
+    psfCells.visitCandidates(&collector, nStarPerCell, ignoreExceptions);
+
+    processCandidatesInParallel(visitor, collector.getCandidates(), ignoreExceptions, nThreads);
+}
+
+/*
+ * Visit the same candidates as psfCells.visitAllCandidates(visitor, ignoreExceptions),
+ * using up to nThreads threads
+ */
+template<typename VisitorT>
+void visitAllCandidatesInParallel(
+        afwMath::SpatialCellSet const& psfCells, // the SpatialCellSet containing PsfCandidates
+        VisitorT *visitor,                       // the visitor to apply
+        bool const ignoreExceptions,             // ignore LengthErrors?
+        int const nThreads                       // number of threads to use
+                                 )
+{
+    if (nThreads <= 1) {
+        psfCells.visitAllCandidates(visitor, ignoreExceptions);
+        return;
+    }
+
+    visitor->reset();
+    CollectCandidatesVisitor<VisitorT> collector(visitor, ignoreExceptions);
+    psfCells.visitAllCandidates(&collector, ignoreExceptions);
+
+    processCandidatesInParallel(visitor, collector.getCandidates(), ignoreExceptions, nThreads);
+}
+
 } // Anonymous namespace
 
 /************************************************************************************************************/
@@ -457,13 +624,40 @@ public:
                              double lambda
                             ) :
         afwMath::CandidateVisitor(),
-        _chi2(0.0), _kernel(kernel), _lambda(lambda),
+        _chi2(0.0), _kernelCopy(), _kernel(kernel), _lambda(lambda),
         _kImage(KImage::Ptr(new KImage(kernel.getDimensions()))) {
     }
     
     void reset() {
         _chi2 = 0.0;
     }
+
+    // Called by visitCandidatesInParallel for each Candidate, before processCandidate
+    bool prepareCandidate(afwMath::SpatialCellCandidate *candidate, bool ignoreExceptions) {
+        PsfCandidate<PixelT> *imCandidate = dynamic_cast<PsfCandidate<PixelT> *>(candidate);
+        if (imCandidate == NULL) {
+            throw LSST_EXCEPT(lsst::pex::exceptions::LogicError,
+                              "Failed to cast SpatialCellCandidate to PsfCandidate");
+        }
+
+        try {
+            imCandidate->getOffsetImage(WARP_ALGORITHM, WARP_BUFFER);
+        } catch(lsst::pex::exceptions::LengthError &) {
+            return !ignoreExceptions;   // if we're not ignoring it, processCandidate must see it
+        }
+        return true;
+    }
+
+    // Return a visitor for use in another thread; it has its own copy of the Kernel, as evaluating a
+    // spatially-varying Kernel sets its parameters
+    boost::shared_ptr<evalChi2Visitor> makePartial() const {
+        return boost::shared_ptr<evalChi2Visitor>(new evalChi2Visitor(_kernel.clone(), _lambda));
+    }
+
+    // Add the chi^2 from a partial visitor
+    void merge(evalChi2Visitor const& partial) {
+        _chi2 += partial._chi2;
+    }
     
     // Called by SpatialCellSet::visitCandidates for each Candidate
     void processCandidate(afwMath::SpatialCellCandidate *candidate) {
@@ -506,7 +700,14 @@ public:
     double getValue() const { return _chi2; }
     
 private:
+    evalChi2Visitor(PTR(afwMath::Kernel) kernel, double lambda) :
+        afwMath::CandidateVisitor(),
+        _chi2(0.0), _kernelCopy(kernel), _kernel(*_kernelCopy), _lambda(lambda),
+        _kImage(KImage::Ptr(new KImage(kernel->getDimensions()))) {
+    }
+
     double mutable _chi2;            // the desired chi^2
+    CONST_PTR(afwMath::Kernel) _kernelCopy; // our own copy of the kernel, if we're a partial visitor
     afwMath::Kernel const& _kernel;  // the kernel
     double _lambda;                  // floor for variance is _lambda*data
     typename KImage::Ptr mutable _kImage; // The Kernel at this point; a scratch copy
@@ -574,14 +775,16 @@ public:
                           afwMath::SpatialCellSet const& psfCells,
                           int nStarPerCell,
                           int nComponents,
-                          int nSpatialParams
+                          int nSpatialParams,
+                          int nThreads=1
                          ) : _errorDef(1.0),
                              _chi2Visitor(chi2Visitor),
                              _kernel(kernel),
                              _psfCells(psfCells),
                              _nStarPerCell(nStarPerCell),
                              _nComponents(nComponents),
-                             _nSpatialParams(nSpatialParams) {}
+                             _nSpatialParams(nSpatialParams),
+                             _nThreads(nThreads) {}
 
 /**
  * Error definition of the function. MINUIT defines Parameter errors as the
@@ -595,7 +798,7 @@ public:
     double operator()(const std::vector<double>& coeffs) const {
         setSpatialParameters(_kernel, coeffs);
         
-        _psfCells.visitCandidates(&_chi2Visitor, _nStarPerCell);
+        visitCandidatesInParallel(_psfCells, &_chi2Visitor, _nStarPerCell, false, _nThreads);
         
         return _chi2Visitor.getValue();
     }
@@ -610,6 +813,7 @@ private:
     int _nStarPerCell;
     int _nComponents;
     int _nSpatialParams;
+    int _nThreads;
 };
     
 /************************************************************************************************************/
@@ -623,7 +827,8 @@ fitSpatialKernelFromPsfCandidates(
         afwMath::SpatialCellSet const& psfCells, ///< A SpatialCellSet containing PsfCandidates
         int const nStarPerCell,                  ///< max no. of stars per cell; <= 0 => infty
         double const tolerance,                  ///< Tolerance; how close chi^2 should be to true minimum
-        double const lambda                      ///< floor for variance is lambda*data
+        double const lambda,                     ///< floor for variance is lambda*data
+        int const nThreads                       ///< Number of threads to use (if OpenMP is available)
                                  ) {
     typedef typename afwImage::Image<PixelT> Image;
 
@@ -659,7 +864,8 @@ fitSpatialKernelFromPsfCandidates(
     //
     // Create the minuit object that knows how to minimise our functor
     //
-    MinimizeChi2<PixelT> minimizerFunc(getChi2, kernel, psfCells, nStarPerCell, nComponents, nSpatialParams);
+    MinimizeChi2<PixelT> minimizerFunc(getChi2, kernel, psfCells, nStarPerCell, nComponents, nSpatialParams,
+                                       nThreads);
 
     double const errorDef = 1.0;       // use +- 1sigma errors
     minimizerFunc.setErrorDef(errorDef);
@@ -702,7 +908,7 @@ fitSpatialKernelFromPsfCandidates(
     // One time more through the Candidates setting their chi^2 values. We'll
     // do all the candidates this time, not just the first nStarPerCell
     //
-    psfCells.visitAllCandidates(&getChi2, true);
+    visitAllCandidatesInParallel(psfCells, &getChi2, true, nThreads);
     
     return std::make_pair(isValid, minChi2);
 }
@@ -748,6 +954,13 @@ namespace {
 /// nComponents*nSpatialParams.  This affects the bounds of some of the
 /// iterations, below.
 ///
+/// The sum_(u,v) K_i(u,v) K_j(u,v) doesn't depend on the star, so writing
+/// p for the vector of all the F_i(x,y) (and each star's inverse variance
+/// as w), A is the Kronecker product of the components' inner products with
+/// an nSpatialParams*nSpatialParams matrix of ones, multiplied element by element
+/// with sum_(stars) w p p^T.  We accumulate the latter with a rank-1 update of its
+/// upper triangle for each star, and apply the inner products once in getA().
+///
 template<typename PixelT>
 class FillABVisitor : public afwMath::CandidateVisitor {
     typedef afwImage::Image<PixelT> Image;
@@ -765,13 +978,14 @@ public:
         _nSpatialParams(_kernel.getNSpatialParameters()),
         _nComponents(_kernel.getNKernelParameters()),
         _basisImgs(),
-        _A((_nComponents-1)*_nSpatialParams, (_nComponents-1)*_nSpatialParams),
+        _sumWppT((_nComponents-1)*_nSpatialParams, (_nComponents-1)*_nSpatialParams),
+        _A(),
         _b((_nComponents-1)*_nSpatialParams),
         _basisDotBasis(_nComponents, _nComponents)
     {
         _basisImgs.resize(_nComponents);
 
-        _A.setZero();
+        _sumWppT.setZero();
         _b.setZero();
         //
         // Get all the Kernel's components as Images
@@ -795,6 +1009,36 @@ public:
     }
     
     void reset() {}
+
+    // Called by visitCandidatesInParallel for each Candidate, before processCandidate
+    bool prepareCandidate(afwMath::SpatialCellCandidate *candidate, bool ignoreExceptions) {
+        PsfCandidate<PixelT> *imCandidate = dynamic_cast<PsfCandidate<PixelT> *>(candidate);
+        if (imCandidate == NULL) {
+            throw LSST_EXCEPT(lsst::pex::exceptions::LogicError,
+                              "Failed to cast SpatialCellCandidate to PsfCandidate");
+        }
+
+        try {
+            imCandidate->getMaskedImage(_kernel.getWidth(), _kernel.getHeight());
+        } catch(lsst::pex::exceptions::LengthError &) {
+            return !ignoreExceptions;   // if we're not ignoring it, processCandidate must see it
+        }
+        return true;
+    }
+
+    // Return a visitor for use in another thread
+    boost::shared_ptr<FillABVisitor> makePartial() const {
+        boost::shared_ptr<FillABVisitor> partial = boost::make_shared<FillABVisitor>(*this);
+        partial->_sumWppT.setZero();
+        partial->_b.setZero();
+        return partial;
+    }
+
+    // Add the A and b from a partial visitor
+    void merge(FillABVisitor const& partial) {
+        _sumWppT += partial._sumWppT;   // the lower triangles are both zero
+        _b += partial._b;
+    }
     
     // Called by SpatialCellSet::visitCandidates for each Candidate
     void processCandidate(afwMath::SpatialCellCandidate *candidate) {
@@ -835,10 +1079,11 @@ public:
         double const var = imCandidate->getVar();
         double const ivar = 1/(var + _tau2); // Allow for floor on variance
 
-        // Spatial params of all the components
-        std::vector<std::vector<double> > params(_nComponents);
-        for (int ic = 1; ic != _nComponents; ++ic) { // Don't need params[0]
-            params[ic] = _kernel.getSpatialFunction(ic)->getDFuncDParameters(xcen, ycen);
+        // Spatial params of all the components (except the 0th), one after the other
+        Eigen::VectorXd params((_nComponents - 1)*_nSpatialParams);
+        for (int ic = 1; ic != _nComponents; ++ic) {
+            std::vector<double> const dFunc = _kernel.getSpatialFunction(ic)->getDFuncDParameters(xcen, ycen);
+            std::copy(dFunc.begin(), dFunc.end(), params.data() + (ic - 1)*_nSpatialParams);
         }
 
         std::vector<typename KImage::Ptr> basisImages = offsetKernel<KImage>(_kernel, dx, dy);
@@ -852,23 +1097,27 @@ public:
             *dPtr = *dPtr / amp - *bPtr;
         }
 
-        for (int i = 0, ic = 1; ic != _nComponents; ++ic) { // Don't need 0th component now
+        for (int ic = 1; ic != _nComponents; ++ic) { // Don't need 0th component now
             double const basisDotData = afwImage::innerProduct(*basisImages[ic], *dataImage,
                                                                PsfCandidate<PixelT>::getBorderWidth());
-            for (int is = 0; is != _nSpatialParams; ++is, ++i) {
-                _b(i) += ivar*params[ic][is]*basisDotData;
-                
-                for (int j = i, jc = ic; jc != _nComponents; ++jc) {
-                    for (int js = (i == j) ? is : 0; js != _nSpatialParams; ++js, ++j) {
-                        _A(i, j) += ivar*params[ic][is]*params[jc][js]*_basisDotBasis(ic, jc);
-                        _A(j, i) = _A(i, j); // could do this after _A is fully calculated
-                    }
-                }
-            }
+            _b.segment((ic - 1)*_nSpatialParams, _nSpatialParams) +=
+                (ivar*basisDotData)*params.segment((ic - 1)*_nSpatialParams, _nSpatialParams);
         }
+
+        _sumWppT.selfadjointView<Eigen::Upper>().rankUpdate(params, ivar);
     }
 
-    Eigen::MatrixXd const& getA() const { return _A; }
+    // Return A, weighting sum(w p p^T) by the inner products of the components
+    Eigen::MatrixXd const& getA() const {
+        _A = _sumWppT.selfadjointView<Eigen::Upper>();
+        for (int ic = 1; ic != _nComponents; ++ic) {
+            for (int jc = 1; jc != _nComponents; ++jc) {
+                _A.block((ic - 1)*_nSpatialParams, (jc - 1)*_nSpatialParams, _nSpatialParams, _nSpatialParams)
+                    *= _basisDotBasis(ic, jc);
+            }
+        }
+        return _A;
+    }
     Eigen::VectorXd const& getB() const { return _b; }
     
 private:
@@ -877,7 +1126,8 @@ private:
     int const _nSpatialParams;       // number of spatial parameters
     int const _nComponents;          // number of basis functions
     std::vector<typename KImage::Ptr> _basisImgs; // basis function images from _kernel
-    Eigen::MatrixXd _A;              // We'll solve the matrix equation A x = b for the Kernel's coefficients
+    Eigen::MatrixXd _sumWppT;        // sum_(stars) w p p^T (upper triangle only)
+    Eigen::MatrixXd mutable _A;      // We'll solve the matrix equation A x = b for the Kernel's coefficients
     Eigen::VectorXd _b;
     Eigen::MatrixXd _basisDotBasis;  // the inner products of the  Kernel components
 };
@@ -901,9 +1151,56 @@ public:
     }
 };
 
+/*
+ * Solve the normal equations A x = b for the spatial model
+ *
+ * A is symmetric and (in all but degenerate cases) positive definite, so we try an LDL^T
+ * decomposition first; it's O(n^3/3) rather than the SVD's much larger constant, which matters
+ * when there are many spatial parameters.  We only fall back to the SVD if the decomposition
+ * isn't positive or the ratio of its smallest to largest pivot shows that A is (close to) singular;
+ * the SVD is also used if it's explicitly requested.
+ *
+ * Return the name of the solver that was actually used
+ */
+std::string
+solveNormalEquations(Eigen::VectorXd & x,       ///< solution
+                     Eigen::MatrixXd const& A,  ///< the normal matrix
+                     Eigen::VectorXd const& b,  ///< the right hand side
+                     std::string const& solver  ///< "ldlt" or "svd"
+                    )
+{
+    if (solver != "ldlt" && solver != "svd") {
+        throw LSST_EXCEPT(lsst::pex::exceptions::InvalidParameterError,
+                          (boost::format("Unknown solver for spatial fit: %s") % solver).str());
+    }
+
+    if (solver == "ldlt" && A.rows() > 0) {
+        Eigen::LDLT<Eigen::MatrixXd> ldlt(A);
+        if (ldlt.info() == Eigen::Success && ldlt.isPositive()) {
+            Eigen::VectorXd const absD = ldlt.vectorD().cwiseAbs();
+            double const minPivot = absD.minCoeff();
+            double const maxPivot = absD.maxCoeff();
+            // written so that a NaN pivot also sends us to the SVD
+            if (minPivot > A.rows()*std::numeric_limits<double>::epsilon()*maxPivot) {
+                x = ldlt.solve(b);
+                return "ldlt";
+            }
+        }
+    }
+
+    x = A.jacobiSvd(Eigen::ComputeThinU | Eigen::ComputeThinV).solve(b);
+    return "svd";
+}
+
 }
 
 
+/**
+ * Fit the spatial model of a kernel
+ *
+ * The linear fit's normal equations are solved by LDL^T decomposition, falling back to an SVD if they
+ * are poorly conditioned
+ */
 template<typename PixelT>
 std::pair<bool, double>
 fitSpatialKernelFromPsfCandidates(
@@ -912,11 +1209,41 @@ fitSpatialKernelFromPsfCandidates(
         bool const doNonLinearFit,               ///< Use the full-up nonlinear fitter
         int const nStarPerCell,                  ///< max no. of stars per cell; <= 0 => infty
         double const tolerance,                   ///< Tolerance; how close chi^2 should be to true minimum
-        double const lambda                       ///< floor for variance is lambda*data
+        double const lambda,                      ///< floor for variance is lambda*data
+        int const nThreads                        ///< Number of threads to use (if OpenMP is available)
+                                 )
+{
+    std::pair<bool, std::pair<double, std::string> > const result =
+        fitSpatialKernelFromPsfCandidates<PixelT>(kernel, psfCells, doNonLinearFit, nStarPerCell, tolerance,
+                                                  lambda, nThreads, std::string("ldlt"));
+    return std::make_pair(result.first, result.second.first);
+}
+
+/**
+ * Fit the spatial model of a kernel, choosing the linear solver and reporting which was used
+ *
+ * Returns (status, (chi^2, solver)) where solver is the method actually used: "minuit" for
+ * the non-linear fit, otherwise "ldlt" or "svd" (the latter may be used even if "ldlt" was
+ * requested, if the normal equations are too poorly conditioned)
+ */
+template<typename PixelT>
+std::pair<bool, std::pair<double, std::string> >
+fitSpatialKernelFromPsfCandidates(
+        afwMath::Kernel *kernel,                 ///< the Kernel to fit
+        afwMath::SpatialCellSet const& psfCells, ///< A SpatialCellSet containing PsfCandidates
+        bool const doNonLinearFit,               ///< Use the full-up nonlinear fitter
+        int const nStarPerCell,                  ///< max no. of stars per cell; <= 0 => infty
+        double const tolerance,                   ///< Tolerance; how close chi^2 should be to true minimum
+        double const lambda,                      ///< floor for variance is lambda*data
+        int const nThreads,                       ///< Number of threads to use (if OpenMP is available)
+        std::string const& solver                 ///< Linear solver to try first: "ldlt" or "svd"
                                  )
 {
     if (doNonLinearFit) {
-        return fitSpatialKernelFromPsfCandidates<PixelT>(kernel, psfCells, nStarPerCell, tolerance);
+        std::pair<bool, double> const result =
+            fitSpatialKernelFromPsfCandidates<PixelT>(kernel, psfCells, nStarPerCell, tolerance, lambda,
+                                                      nThreads);
+        return std::make_pair(result.first, std::make_pair(result.second, std::string("minuit")));
     }
 
     double const tau = 0;               // softening for errors
@@ -941,14 +1268,14 @@ fitSpatialKernelFromPsfCandidates(
     //
     // Actually visit all our candidates
     //
-    psfCells.visitCandidates(&getAB, nStarPerCell, true);
+    visitCandidatesInParallel(psfCells, &getAB, nStarPerCell, true, nThreads);
     //
     // Extract A and b, and solve Ax = b
     //
     Eigen::MatrixXd const& A = getAB.getA();
     Eigen::VectorXd const& b = getAB.getB();
     Eigen::VectorXd x0(b.size());       // Solution to matrix problem
-    x0 = A.jacobiSvd(Eigen::ComputeThinU | Eigen::ComputeThinV).solve(b);
+    std::string const solverUsed = solveNormalEquations(x0, A, b, solver);
 #if 0
     std::cout << "A " << A << std::endl;
     std::cout << "b " << b.transpose() << std::endl;
@@ -986,9 +1313,9 @@ fitSpatialKernelFromPsfCandidates(
     //
     evalChi2Visitor<PixelT> getChi2(*kernel, lambda);
 
-    psfCells.visitAllCandidates(&getChi2, true);
+    visitAllCandidatesInParallel(psfCells, &getChi2, true, nThreads);
     
-    return std::make_pair(true, getChi2.getValue());
+    return std::make_pair(true, std::make_pair(getChi2.getValue(), solverUsed));
 }
 
 /************************************************************************************************************/
@@ -1159,6 +1486,138 @@ fitKernelToImage(
 }
 
 
+/************************************************************************************************************/
+namespace {
+/// A class to pass around to all our PsfCandidates to measure their kernel parameters' residuals
+/// from the spatial model
+template<typename PixelT>
+class KernelParamResidualsVisitor : public afwMath::CandidateVisitor {
+    typedef afwImage::MaskedImage<PixelT> MaskedImage;
+    // The candidates' stamps, or a null pointer if they couldn't be extracted
+    typedef std::map<afwMath::SpatialCellCandidate const*, typename MaskedImage::ConstPtr> StampMap;
+public:
+    explicit KernelParamResidualsVisitor(afwMath::LinearCombinationKernel const& kernel) :
+        afwMath::CandidateVisitor(),
+        _kernel(kernel), _stamps(new StampMap), _spatialFunctions(), _residuals() {
+        for (int k = 0, nParams = kernel.getNKernelParameters(); k != nParams; ++k) {
+            _spatialFunctions.push_back(kernel.getSpatialFunction(k)); // a clone; evaluating it isn't const
+        }
+    }
+
+    void reset() {
+        _stamps->clear();
+        _residuals.clear();
+    }
+
+    // Called by visitAllCandidatesInParallel for each Candidate, before processCandidate
+    bool prepareCandidate(afwMath::SpatialCellCandidate *candidate, bool) {
+        (*_stamps)[candidate] = getStamp(candidate);
+        return true;                    // unusable candidates get a row of NaNs
+    }
+
+    // Return a visitor for use in another thread; it shares our (by then read-only) stamps
+    boost::shared_ptr<KernelParamResidualsVisitor> makePartial() const {
+        return boost::shared_ptr<KernelParamResidualsVisitor>(new KernelParamResidualsVisitor(*this));
+    }
+
+    // Append the residuals from a partial visitor
+    void merge(KernelParamResidualsVisitor const& partial) {
+        _residuals.insert(_residuals.end(), partial._residuals.begin(), partial._residuals.end());
+    }
+
+    // Called by SpatialCellSet::visitCandidates for each Candidate
+    void processCandidate(afwMath::SpatialCellCandidate *candidate) {
+        typename StampMap::const_iterator const stamp = _stamps->find(candidate);
+        typename MaskedImage::ConstPtr const data = (stamp == _stamps->end()) ?
+            getStamp(candidate) : stamp->second;
+
+        int const nParams = _spatialFunctions.size();
+        if (!data) {
+            _residuals.insert(_residuals.end(), nParams, std::numeric_limits<double>::quiet_NaN());
+            return;
+        }
+
+        PsfCandidate<PixelT> const* imCandidate = dynamic_cast<PsfCandidate<PixelT> const*>(candidate);
+        double const xcen = imCandidate->getXCenter();
+        double const ycen = imCandidate->getYCenter();
+
+        std::pair<std::vector<double>, afwMath::KernelList> const fit =
+            fitKernelParamsToImage(_kernel, *data, afwGeom::Point2D(xcen, ycen));
+        std::vector<double> const& params = fit.first;
+        afwMath::KernelList const& kernels = fit.second;
+
+        double amp = 0.0;
+        for (unsigned int i = 0; i != kernels.size(); ++i) {
+            amp += params[i]*boost::static_pointer_cast<afwMath::FixedKernel>(kernels[i])->getSum();
+        }
+
+        for (int k = 0; k != nParams; ++k) {
+            _residuals.push_back(params[k]/amp - (*_spatialFunctions[k])(xcen, ycen));
+        }
+    }
+
+    // Return the residuals, one row per candidate
+    ndarray::Array<double,2,2> getResiduals() const {
+        int const nParams = _spatialFunctions.size();
+        int const nCandidate = (nParams == 0) ? 0 : _residuals.size()/nParams;
+        ndarray::Array<double,2,2> residuals = ndarray::allocate(ndarray::makeVector(nCandidate, nParams));
+        std::copy(_residuals.begin(), _residuals.end(), residuals.getData());
+
+        return residuals;
+    }
+private:
+    KernelParamResidualsVisitor(KernelParamResidualsVisitor const& rhs) :
+        afwMath::CandidateVisitor(),
+        _kernel(rhs._kernel), _stamps(rhs._stamps), _spatialFunctions(), _residuals() {
+        for (unsigned int k = 0; k != rhs._spatialFunctions.size(); ++k) {
+            _spatialFunctions.push_back(rhs._spatialFunctions[k]->clone());
+        }
+    }
+
+    // Return the candidate's stamp at the size of our kernel, or a null pointer if it's unavailable
+    typename MaskedImage::ConstPtr getStamp(afwMath::SpatialCellCandidate *candidate) const {
+        PsfCandidate<PixelT> *imCandidate = dynamic_cast<PsfCandidate<PixelT> *>(candidate);
+        if (imCandidate == NULL) {
+            throw LSST_EXCEPT(lsst::pex::exceptions::LogicError,
+                              "Failed to cast SpatialCellCandidate to PsfCandidate");
+        }
+
+        try {
+            return imCandidate->getMaskedImage(_kernel.getWidth(), _kernel.getHeight());
+        } catch(lsst::pex::exceptions::Exception &) {
+            return typename MaskedImage::ConstPtr();
+        }
+    }
+
+    afwMath::LinearCombinationKernel const& _kernel;
+    boost::shared_ptr<StampMap> _stamps;
+    std::vector<afwMath::Kernel::SpatialFunctionPtr> _spatialFunctions;
+    std::vector<double> _residuals;     // the residuals, nParams per candidate
+};
+
+}
+
+/**
+ * Return the difference between each candidate's kernel parameters, fit independently and normalised by
+ * its amplitude, and the kernel's spatial model evaluated at the candidate's position
+ *
+ * There is one row for each candidate, in the order that psfCells.visitAllCandidates visits them (i.e.
+ * including the BAD ones); candidates whose image can't be extracted have a row of NaNs.
+ */
+template<typename PixelT>
+ndarray::Array<double,2,2>
+computeKernelParamResiduals(
+        afwMath::LinearCombinationKernel const& kernel, ///< the Kernel with the spatial model
+        afwMath::SpatialCellSet const& psfCells,        ///< A SpatialCellSet containing PsfCandidates
+        int const nThreads                              ///< Number of threads to use (if OpenMP available)
+                           )
+{
+    KernelParamResidualsVisitor<PixelT> getResiduals(kernel);
+    visitAllCandidatesInParallel(psfCells, &getResiduals, false, nThreads);
+
+    return getResiduals.getResiduals();
+}
+
 /************************************************************************************************************/
 //
 // Explicit instantiations
@@ -1177,11 +1636,16 @@ fitKernelToImage(
     template
     std::pair<bool, double>
     fitSpatialKernelFromPsfCandidates<Pixel>(afwMath::Kernel *, afwMath::SpatialCellSet const&,
-                                             int const, double const, double const);
+                                             int const, double const, double const, int const);
     template
     std::pair<bool, double>
     fitSpatialKernelFromPsfCandidates<Pixel>(afwMath::Kernel *, afwMath::SpatialCellSet const&, bool const,
-                                             int const, double const, double const);
+                                             int const, double const, double const, int const);
+    template
+    std::pair<bool, std::pair<double, std::string> >
+    fitSpatialKernelFromPsfCandidates<Pixel>(afwMath::Kernel *, afwMath::SpatialCellSet const&, bool const,
+                                             int const, double const, double const, int const,
+                                             std::string const&);
 
     template
     double subtractPsf(afwDetection::Psf const&, afwImage::MaskedImage<float> *, double, double, double);
@@ -1195,5 +1659,10 @@ fitKernelToImage(
     std::pair<afwMath::Kernel::Ptr, std::pair<double, double> >
     fitKernelToImage(afwMath::LinearCombinationKernel const&,
                      afwImage::MaskedImage<Pixel> const&, afwGeom::Point2D const&);
+
+    template
+    ndarray::Array<double,2,2>
+    computeKernelParamResiduals<Pixel>(afwMath::LinearCombinationKernel const&,
+                                       afwMath::SpatialCellSet const&, int const);
 /// \endcond
 }}}
@@ -22,6 +22,9 @@
  * see <http://www.lsstcorp.org/LegalNotices/>.
  */
 
+#include <cmath>
+
+#include "boost/format.hpp"
 #include "lsst/pex/exceptions.h"
 #include "lsst/meas/algorithms/WarpedPsf.h"
 #include "lsst/afw/math/warpExposure.h"
@@ -123,6 +126,60 @@ PTR(afw::detection::Psf::Image) warpAffine(
     return ret;
 }
 
+/**
+ * @brief Find the signed permutation matrix P (a combination of axis flips and transposition) closest to
+ * the linear transform, and return the maximum displacement between the two over the given image.
+ */
+double computePixelAlignedOffset(
+    afw::detection::Psf::Image const &im, afw::geom::LinearTransform const &linear, Eigen::Matrix2d &aligned
+) {
+    Eigen::Matrix2d const & m = linear.getMatrix();
+    aligned.setZero();
+    if (std::abs(m(0,0)) + std::abs(m(1,1)) >= std::abs(m(0,1)) + std::abs(m(1,0))) {
+        aligned(0,0) = (m(0,0) < 0.0) ? -1.0 : 1.0;
+        aligned(1,1) = (m(1,1) < 0.0) ? -1.0 : 1.0;
+    } else {
+        aligned(0,1) = (m(0,1) < 0.0) ? -1.0 : 1.0;
+        aligned(1,0) = (m(1,0) < 0.0) ? -1.0 : 1.0;
+    }
+    // the displacement (m - aligned) x is largest at a corner of the image
+    double const xMax = std::max(std::abs(im.getX0()), std::abs(im.getX0() + im.getWidth() - 1));
+    double const yMax = std::max(std::abs(im.getY0()), std::abs(im.getY0() + im.getHeight() - 1));
+    Eigen::Matrix2d const diff = (m - aligned).cwiseAbs();
+    return std::max(diff(0,0)*xMax + diff(0,1)*yMax, diff(1,0)*xMax + diff(1,1)*yMax);
+}
+
+/**
+ * @brief Apply a signed permutation matrix to an image without resampling.
+ *
+ * This follows the convention of warpAffine, so out[p] = in[P^{-1}p].
+ */
+PTR(afw::detection::Psf::Image) permuteImage(
+    afw::detection::Psf::Image const &im, Eigen::Matrix2d const &aligned
+) {
+    afw::geom::Box2I const inBBox = im.getBBox();
+    afw::geom::Box2I outBBox;
+    afw::geom::Point2I const corners[2] = { inBBox.getMin(), inBBox.getMax() };
+    for (int i = 0; i < 2; ++i) {
+        for (int j = 0; j < 2; ++j) {
+            Eigen::Vector2d const p = aligned*Eigen::Vector2d(corners[i].getX(), corners[j].getY());
+            outBBox.include(afw::geom::Point2I(int(p.x()), int(p.y())));
+        }
+    }
+    PTR(afw::detection::Psf::Image) ret = boost::make_shared<afw::detection::Psf::Image>(outBBox);
+    // P is orthogonal, so P^{-1} = P^T
+    Eigen::Matrix2d const inverse = aligned.transpose();
+    for (int y = outBBox.getMinY(); y <= outBBox.getMaxY(); ++y) {
+        afw::detection::Psf::Image::x_iterator outPtr = ret->row_begin(y - outBBox.getMinY());
+        for (int x = outBBox.getMinX(); x <= outBBox.getMaxX(); ++x, ++outPtr) {
+            int const u = int(inverse(0,0)*x + inverse(0,1)*y);
+            int const v = int(inverse(1,0)*x + inverse(1,1)*y);
+            *outPtr = im(u - im.getX0(), v - im.getY0());
+        }
+    }
+    return ret;
+}
+
 } // anonymous
 
 WarpedPsf::WarpedPsf(
@@ -133,7 +190,9 @@ WarpedPsf::WarpedPsf(
     ImagePsf(false),
     _undistortedPsf(undistortedPsf),
     _distortion(distortion),
-    _warpingControl(control)
+    _warpingControl(control),
+    _fastPathTolerance(0.0),
+    _fastPathCount(0)
 {
     _init();
 }
@@ -147,7 +206,9 @@ WarpedPsf::WarpedPsf(
     ImagePsf(false),
     _undistortedPsf(undistortedPsf),
     _distortion(distortion),
-    _warpingControl(new afw::math::WarpingControl(kernelName, "", cache))
+    _warpingControl(new afw::math::WarpingControl(kernelName, "", cache)),
+    _fastPathTolerance(0.0),
+    _fastPathCount(0)
 {
     _init();
 }
@@ -179,7 +240,21 @@ afw::geom::Point2D WarpedPsf::getAveragePosition() const {
 }
 
 PTR(afw::detection::Psf) WarpedPsf::clone() const {
-    return boost::make_shared<WarpedPsf>(_undistortedPsf->clone(), _distortion->clone(), _warpingControl);
+    PTR(WarpedPsf) result = boost::make_shared<WarpedPsf>(
+        _undistortedPsf->clone(), _distortion->clone(), _warpingControl
+    );
+    result->setFastPathTolerance(_fastPathTolerance);
+    return result;
+}
+
+void WarpedPsf::setFastPathTolerance(double tolerance) {
+    if (tolerance < 0.0) {
+        throw LSST_EXCEPT(
+            pex::exceptions::InvalidParameterError,
+            (boost::format("WarpedPsf fast path tolerance must be >= 0; got %g") % tolerance).str()
+        );
+    }
+    _fastPathTolerance = tolerance;
 }
 
 PTR(afw::detection::Psf::Image) WarpedPsf::doComputeKernelImage(
@@ -191,8 +266,15 @@ PTR(afw::detection::Psf::Image) WarpedPsf::doComputeKernelImage(
     PTR(Image) im = _undistortedPsf->computeKernelImage(tp, color);
 
     // Go to the warped coordinate system with 'p' at the origin
-    PTR(afw::detection::Psf::Psf::Image) ret
-        = warpAffine(*im, afw::geom::AffineTransform(t.invert().getLinear()), *_warpingControl);
+    afw::geom::LinearTransform const linear = t.invert().getLinear();
+    PTR(afw::detection::Psf::Psf::Image) ret;
+    Eigen::Matrix2d aligned;
+    if (_fastPathTolerance > 0.0 && computePixelAlignedOffset(*im, linear, aligned) <= _fastPathTolerance) {
+        ret = permuteImage(*im, aligned);
+        ++_fastPathCount;
+    } else {
+        ret = warpAffine(*im, afw::geom::AffineTransform(linear), *_warpingControl);
+    }
 
     double normFactor = 1.0;
     // 
@@ -490,6 +490,249 @@ class CoaddPsfTest(unittest.TestCase):
         # important test is that this doesn't throw:
         coaddPsf.computeKernelImage()
 
+    def testInputIndex(self):
+        """Test that the spatial index of the inputs selects the same inputs as a brute-force search"""
+        cd = 5.55555555e-05
+        crval = afwCoord.Coord(afwGeom.Point2D(0.0, 0.0))
+        wcsref = afwImage.makeWcs(crval, afwGeom.PointD(1500, 1500), cd, 0.0, 0.0, cd)
+        schema = afwTable.ExposureTable.makeMinimalSchema()
+        schema.addField("weight", type="D", doc="Coadd weight")
+        mycatalog = afwTable.ExposureCatalog(schema)
+        # a 3x3 mosaic of slightly overlapping 1000x1000 inputs, each with its own Psf
+        for i in range(3):
+            for j in range(3):
+                record = mycatalog.getTable().makeRecord()
+                record.setPsf(measAlg.DoubleGaussianPsf(50, 50, 2.0 + i + 0.5*j, 1.00, 0.0))
+                crpix = afwGeom.PointD(1500 - 950*i, 1500 - 950*j)
+                record.setWcs(afwImage.makeWcs(crval, crpix, cd, 0.0, 0.0, cd))
+                record['weight'] = 1.0
+                record['id'] = 3*i + j
+                record.setBBox(afwGeom.Box2I(afwGeom.Point2I(0,0), afwGeom.Extent2I(1000, 1000)))
+                mycatalog.append(record)
+        mypsf = measAlg.CoaddPsf(mycatalog, wcsref)
+
+        for x, y in [(100, 100), (975, 500), (1500, 1500), (1930, 980), (2800, 2800)]:
+            point = afwGeom.Point2D(x, y)
+            m1, m2 = getPsfSecondMoments(mypsf, point)
+            m1coadd, m2coadd = getCoaddSecondMoments(mypsf, point)
+            self.assertTrue(testRelDiff(m1, m1coadd, .01))
+            self.assertTrue(testRelDiff(m2, m2coadd, .01))
+        self.assertRaises(pexExceptions.InvalidParameterError, mypsf.computeKernelImage,
+                          afwGeom.Point2D(-500, -500))
+
+    def testAffineTransformGrid(self):
+        """Test that interpolated affine transforms reproduce the exact-Wcs CoaddPsf"""
+        crval = afwCoord.Coord(afwGeom.Point2D(30.0, -10.0))
+        cd = 5.55555555e-05
+        wcsref = afwImage.makeWcs(crval, afwGeom.PointD(1000, 1000), cd, 0.0, 0.0, cd)
+        schema = afwTable.ExposureTable.makeMinimalSchema()
+        schema.addField("weight", type="D", doc="Coadd weight")
+        mycatalog = afwTable.ExposureCatalog(schema)
+        # inputs are rotated and on different tangent points, so the transforms are not affine
+        for i, angle in enumerate([0.3, 1.0, 2.0]):
+            c = cd*math.cos(angle)
+            s = cd*math.sin(angle)
+            record = mycatalog.getTable().makeRecord()
+            record.setPsf(makeBiaxialGaussianPsf(41, 41, 2.0, 3.5, 0.0))
+            inputCrval = afwCoord.Coord(afwGeom.Point2D(30.0 + 0.05*i, -10.0 - 0.05*i))
+            record.setWcs(afwImage.makeWcs(inputCrval, afwGeom.PointD(1000, 1000), c, -s, s, c))
+            record['weight'] = 1.0
+            record['id'] = i
+            record.setBBox(afwGeom.Box2I(afwGeom.Point2I(-1000,-1000), afwGeom.Extent2I(4000, 4000)))
+            mycatalog.append(record)
+
+        exact = measAlg.CoaddPsf(mycatalog, wcsref)
+        approx = measAlg.CoaddPsf(mycatalog, wcsref)
+        approx.setAffineTransformGridTolerance(1E-4)
+        self.assertEqual(approx.getAffineTransformGridTolerance(), 1E-4)
+        for point in [afwGeom.Point2D(1000, 1000), afwGeom.Point2D(400.5, 1700.25)]:
+            m1, m2 = getPsfSecondMoments(exact, point)
+            m1approx, m2approx = getPsfSecondMoments(approx, point)
+            self.assertTrue(testRelDiff(m1, m1approx, 1E-4))
+            self.assertTrue(testRelDiff(m2, m2approx, 1E-4))
+        approx.setAffineTransformGridTolerance(0.0)
+        self.assertEqual(approx.getAffineTransformGridTolerance(), 0.0)
+        point = afwGeom.Point2D(1000, 1000)
+        self.assertTrue(numpy.all(exact.computeKernelImage(point).getArray()
+                                  == approx.computeKernelImage(point).getArray()))
+
+    def testBatchEvaluation(self):
+        """Test that computeKernelImages and computeShapes match per-point evaluation"""
+        cd = 5.55555555e-05
+        crval = afwCoord.Coord(afwGeom.Point2D(0.0, 0.0))
+        wcsref = afwImage.makeWcs(crval, afwGeom.PointD(1000, 1000), cd, 0.0, 0.0, cd)
+        schema = afwTable.ExposureTable.makeMinimalSchema()
+        schema.addField("weight", type="D", doc="Coadd weight")
+        mycatalog = afwTable.ExposureCatalog(schema)
+        offsets = [(1999,1999), (1999,0), (0, 0), (0,1999)]
+        for i in range(4):
+            record = mycatalog.getTable().makeRecord()
+            record.setPsf(makeBiaxialGaussianPsf(31 + 2*i, 35, 2.0 + 0.5*i, 3.0, 0.0))
+            record.setWcs(afwImage.makeWcs(crval, afwGeom.PointD(*offsets[i]), cd, 0.0, 0.0, cd))
+            record['weight'] = 1.0 * (i+1)
+            record['id'] = i
+            record.setBBox(afwGeom.Box2I(afwGeom.Point2I(0,0), afwGeom.Extent2I(2000, 2000)))
+            mycatalog.append(record)
+        mypsf = measAlg.CoaddPsf(mycatalog, wcsref)
+
+        points = numpy.array([[1000.0, 1000.0], [1200.5, 900.25], [400.0, 1600.0], [1000.0, 1000.0]])
+        images = mypsf.computeKernelImages(points)
+        shapes = mypsf.computeShapes(points)
+        self.assertEqual(images.shape[0], len(points))
+        self.assertEqual(shapes.shape, (len(points), 3))
+        self.assertEqual(images.shape[1] % 2, 1)
+        self.assertEqual(images.shape[2] % 2, 1)
+        yc, xc = images.shape[1]//2, images.shape[2]//2
+        for n, (x, y) in enumerate(points):
+            point = afwGeom.Point2D(x, y)
+            image = mypsf.computeKernelImage(point)
+            y0 = image.getY0() + yc
+            x0 = image.getX0() + xc
+            stamp = images[n, y0:y0 + image.getHeight(), x0:x0 + image.getWidth()]
+            self.assertTrue(numpy.allclose(stamp, image.getArray(), rtol=0.0, atol=1E-14))
+            self.assertAlmostEqual(images[n].sum(), image.getArray().sum(), 12)
+            shape = mypsf.computeShape(point)
+            self.assertAlmostEqual(shapes[n, 0], shape.getIxx(), 10)
+            self.assertAlmostEqual(shapes[n, 1], shape.getIyy(), 10)
+            self.assertAlmostEqual(shapes[n, 2], shape.getIxy(), 10)
+
+        # the default implementation is used by other ImagePsfs
+        kernelPsf = makeBiaxialGaussianPsf(21, 21, 2.0, 3.0, 0.5)
+        images = kernelPsf.computeKernelImages(points)
+        self.assertEqual(images.shape, (len(points), 21, 21))
+        self.assertTrue(numpy.allclose(images[1], kernelPsf.computeKernelImage().getArray(),
+                                       rtol=0.0, atol=1E-14))
+
+        self.assertRaises(pexExceptions.InvalidParameterError, mypsf.computeKernelImages,
+                          numpy.array([[1000.0, 1000.0], [-5000.0, -5000.0]]))
+
+    def testThreadCount(self):
+        """Test that warping the components in parallel gives exactly the serial result"""
+        cd = 5.55555555e-05
+        crval = afwCoord.Coord(afwGeom.Point2D(0.0, 0.0))
+        wcsref = afwImage.makeWcs(crval, afwGeom.PointD(1000, 1000), cd, 0.0, 0.0, cd)
+        schema = afwTable.ExposureTable.makeMinimalSchema()
+        schema.addField("weight", type="D", doc="Coadd weight")
+        mycatalog = afwTable.ExposureCatalog(schema)
+        for i in range(7):
+            angle = 0.2*i
+            c = cd*math.cos(angle)
+            s = cd*math.sin(angle)
+            record = mycatalog.getTable().makeRecord()
+            record.setPsf(makeBiaxialGaussianPsf(41, 41, 2.0 + 0.1*i, 3.0, 0.0))
+            record.setWcs(afwImage.makeWcs(crval, afwGeom.PointD(1000 + 3.3*i, 1000), c, -s, s, c))
+            record['weight'] = 1.0 + i
+            record['id'] = i
+            record.setBBox(afwGeom.Box2I(afwGeom.Point2I(0,0), afwGeom.Extent2I(2000, 2000)))
+            mycatalog.append(record)
+        serial = measAlg.CoaddPsf(mycatalog, wcsref)
+        self.assertEqual(serial.getThreadCount(), 1)
+        for threadCount in (2, 3, 8):
+            threaded = measAlg.CoaddPsf(mycatalog, wcsref)
+            threaded.setThreadCount(threadCount)
+            self.assertEqual(threaded.getThreadCount(), threadCount)
+            for point in [afwGeom.Point2D(1000, 1000), afwGeom.Point2D(1100.5, 950.25)]:
+                self.assertTrue(numpy.all(threaded.computeKernelImage(point).getArray()
+                                          == serial.computeKernelImage(point).getArray()))
+        self.assertRaises(pexExceptions.InvalidParameterError, serial.setThreadCount, 0)
+
+    def testWarpFastPath(self):
+        """Test that pixel-aligned inputs skip the warp but give the same image"""
+        cd = 5.55555555e-05
+        crval = afwCoord.Coord(afwGeom.Point2D(0.0, 0.0))
+        crpix = afwGeom.PointD(1000, 1000)
+        wcsref = afwImage.makeWcs(crval, crpix, cd, 0.0, 0.0, cd)
+        schema = afwTable.ExposureTable.makeMinimalSchema()
+        schema.addField("weight", type="D", doc="Coadd weight")
+        mycatalog = afwTable.ExposureCatalog(schema)
+        # the first input has the coadd's Wcs, the second has its axes swapped, the third is rotated
+        wcsList = [wcsref,
+                   afwImage.makeWcs(crval, crpix, 0.0, cd, cd, 0.0),
+                   afwImage.makeWcs(crval, crpix, cd*math.cos(0.3), -cd*math.sin(0.3),
+                                    cd*math.sin(0.3), cd*math.cos(0.3))]
+        for i, wcs in enumerate(wcsList):
+            record = mycatalog.getTable().makeRecord()
+            record.setPsf(makeBiaxialGaussianPsf(41, 41, 1.5, 4.0, 0.0))
+            record.setWcs(wcs)
+            record['weight'] = 1.0
+            record['id'] = i
+            record.setBBox(afwGeom.Box2I(afwGeom.Point2I(0,0), afwGeom.Extent2I(2000, 2000)))
+            mycatalog.append(record)
+        warped = measAlg.CoaddPsf(mycatalog, wcsref)
+        fast = measAlg.CoaddPsf(mycatalog, wcsref)
+        fast.setWarpFastPathTolerance(1E-4)
+        self.assertEqual(fast.getWarpFastPathTolerance(), 1E-4)
+        point = afwGeom.Point2D(1000.5, 999.25)
+        m0, xbar, ybar, mxx, myy, x0, y0 = getPsfMoments(warped, point)
+        fm0, fxbar, fybar, fmxx, fmyy, fx0, fy0 = getPsfMoments(fast, point)
+        self.assertEqual(fast.getWarpFastPathCount(), 2)
+        self.assertEqual(warped.getWarpFastPathCount(), 0)
+        self.assertAlmostEqual(x0 + xbar, fx0 + fxbar, 6)
+        self.assertAlmostEqual(y0 + ybar, fy0 + fybar, 6)
+        self.assertTrue(testRelDiff(mxx, fmxx, 1E-6))
+        self.assertTrue(testRelDiff(myy, fmyy, 1E-6))
+
+    def testKernelImageCache(self):
+        """Test that the optional kernel image cache returns the same images as uncached evaluation"""
+        cd = 5.55555555e-05
+        crval = afwCoord.Coord(afwGeom.Point2D(0.0, 0.0))
+        wcsref = afwImage.makeWcs(crval, afwGeom.PointD(1000, 1000), cd, 0.0, 0.0, cd)
+        schema = afwTable.ExposureTable.makeMinimalSchema()
+        schema.addField("weight", type="D", doc="Coadd weight")
+        mycatalog = afwTable.ExposureCatalog(schema)
+        offsets = [(1999,1999), (1999,0), (0, 0), (0,1999)]
+        for i in range(4):
+            record = mycatalog.getTable().makeRecord()
+            record.setPsf(measAlg.DoubleGaussianPsf(50, 50, 4.0 + i, 1.00, 0.0))
+            record.setWcs(afwImage.makeWcs(crval, afwGeom.PointD(*offsets[i]), cd, 0.0, 0.0, cd))
+            record['weight'] = 1.0 * (i+1)
+            record['id'] = i
+            record.setBBox(afwGeom.Box2I(afwGeom.Point2I(0,0), afwGeom.Extent2I(2000, 2000)))
+            mycatalog.append(record)
+
+        uncached = measAlg.CoaddPsf(mycatalog, wcsref)
+        cached = measAlg.CoaddPsf(mycatalog, wcsref)
+        cached.setKernelImageCacheSize(2)
+        self.assertEqual(cached.getKernelImageCacheSize(), 2)
+
+        points = [afwGeom.Point2D(1000, 1000), afwGeom.Point2D(1200, 900), afwGeom.Point2D(1000, 1000)]
+        for point in points:
+            self.assertTrue(numpy.all(cached.computeKernelImage(point).getArray()
+                                      == uncached.computeKernelImage(point).getArray()))
+        self.assertEqual(cached.getKernelImageCacheMisses(), 2)
+        self.assertEqual(cached.getKernelImageCacheHits(), 1)
+
+        # a third distinct position evicts the least-recently-used entry, (1200, 900)
+        cached.computeKernelImage(afwGeom.Point2D(800, 800))
+        cached.computeKernelImage(afwGeom.Point2D(1200, 900))
+        self.assertEqual(cached.getKernelImageCacheMisses(), 4)
+        self.assertEqual(cached.getKernelImageCacheHits(), 1)
+
+        # with a position quantum, nearby points share the image computed at the cell centre
+        cached.setKernelImageCacheSize(10, 2.0)
+        self.assertEqual(cached.getKernelImageCacheHits(), 0)
+        im1 = cached.computeKernelImage(afwGeom.Point2D(1000.2, 1000.7))
+        im2 = cached.computeKernelImage(afwGeom.Point2D(1001.9, 1000.1))
+        self.assertEqual(cached.getKernelImageCacheHits(), 1)
+        self.assertTrue(numpy.all(im1.getArray() == im2.getArray()))
+        self.assertTrue(numpy.all(im1.getArray()
+                                  == uncached.computeKernelImage(afwGeom.Point2D(1001, 1001)).getArray()))
+
+        # the cell [1000, 1002)^2 straddles the corners of all four inputs, so its points are contained
+        # in different sets of inputs; they must all share the image made from the centre's inputs
+        centreImage = uncached.computeKernelImage(afwGeom.Point2D(1001, 1001)).getArray()
+        for x, y in [(1000.1, 1000.1), (1000.1, 1001.9), (1001.9, 1000.1), (1001.9, 1001.9)]:
+            im = cached.computeKernelImage(afwGeom.Point2D(x, y))
+            self.assertTrue(numpy.all(im.getArray() == centreImage))
+        self.assertEqual(cached.getKernelImageCacheMisses(), 1)
+        self.assertEqual(cached.getKernelImageCacheHits(), 5)
+
+        cached.clearKernelImageCache()
+        self.assertEqual(cached.getKernelImageCacheHits(), 0)
+        self.assertEqual(cached.getKernelImageCacheMisses(), 0)
+        cached.setKernelImageCacheSize(0)
+        self.assertEqual(cached.getKernelImageCacheSize(), 0)
+
 #-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 
 
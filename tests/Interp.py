@@ -38,6 +38,7 @@ import unittest
 import eups
 import math, numpy
 import lsst.utils.tests as tests
+import lsst.pex.exceptions as pexExceptions
 import lsst.pex.logging as logging
 import lsst.afw.detection as afwDetection
 import lsst.afw.image as afwImage
@@ -239,6 +240,133 @@ class interpolationTestCase(unittest.TestCase):
             self.assertGreater(numpy.min(ima), -2)
             self.assertGreater(2, numpy.max(ima))
 
+class DefectListTestCase(unittest.TestCase):
+    """Interpolation over a large synthetic list of defects"""
+    def setUp(self):
+        self.psf = algorithms.DoubleGaussianPsf(15, 15, 1./(2*math.sqrt(2*math.log(2))))
+
+        width, height = 300, 200
+        rand = numpy.random.RandomState(42)
+        self.mi = afwImage.MaskedImageF(width, height)
+        self.mi.setXY0(afwGeom.Point2I(5, 10))
+        self.mi.getImage().getArray()[:] = 100 + 10*rand.randn(height, width)
+        self.mi.getVariance().set(100)
+        self.mi.getMask().addMaskPlane("INTRP")
+        #
+        # Bad columns (some touching, some at the edges), bad blocks, and single bad pixels,
+        # a few of them extending off the image
+        #
+        x0, y0 = self.mi.getX0(), self.mi.getY0()
+        self.defectList = algorithms.DefectListT()
+        for x in [0, 1, 4, 5, 30, 32, 33, 100, 101, 102, 150, width - 2, width - 1, width + 3]:
+            ylo = rand.randint(-5, height//2)
+            yhi = rand.randint(ylo + 1, height + 5)
+            bbox = afwGeom.BoxI(afwGeom.PointI(x0 + x, y0 + ylo), afwGeom.PointI(x0 + x, y0 + yhi))
+            self.defectList.append(algorithms.Defect(bbox))
+        for i in range(20):
+            x, y = rand.randint(-3, width), rand.randint(-3, height)
+            bbox = afwGeom.BoxI(afwGeom.PointI(x0 + x, y0 + y),
+                                afwGeom.ExtentI(rand.randint(1, 15), rand.randint(1, 8)))
+            self.defectList.append(algorithms.Defect(bbox))
+        for i in range(100):
+            x, y = rand.randint(0, width), rand.randint(0, height)
+            self.defectList.append(algorithms.Defect(afwGeom.BoxI(afwGeom.PointI(x0 + x, y0 + y),
+                                                                  afwGeom.ExtentI(1, 1))))
+
+    def tearDown(self):
+        del self.mi
+        del self.psf
+        del self.defectList
+
+    def interpolate(self, *args):
+        """Interpolate over our defects in a copy of our image, returning the copy"""
+        mi = self.mi.Factory(self.mi, True)
+        algorithms.interpolateOverDefects(mi, self.psf, self.defectList, 50.0, *args)
+        return mi
+
+    def assertMaskedImagesEqual(self, mi1, mi2):
+        self.assertTrue((mi1.getImage().getArray() == mi2.getImage().getArray()).all())
+        self.assertTrue((mi1.getMask().getArray() == mi2.getMask().getArray()).all())
+        self.assertTrue((mi1.getVariance().getArray() == mi2.getVariance().getArray()).all())
+
+    def testThreads(self):
+        """Check that the results don't depend on the number of threads"""
+        for useFallbackValueAtEdge in (False, True):
+            mi = self.interpolate(useFallbackValueAtEdge, 1)
+            self.assertTrue((mi.getMask().getArray() & mi.getMask().getPlaneBitMask("INTRP")).any())
+            for nThreads in (2, 3, 8):
+                self.assertMaskedImagesEqual(self.interpolate(useFallbackValueAtEdge, nThreads), mi)
+
+    def testMaskCoverage(self):
+        """Check that every pixel in a defect is interpolated, and no others"""
+        bbox = self.mi.getBBox(afwImage.PARENT)
+        expected = numpy.zeros_like(self.mi.getMask().getArray(), dtype=bool)
+        for defect in self.defectList:
+            dbox = defect.getBBox()
+            dbox.clip(bbox)
+            if dbox.isEmpty():
+                continue
+            dbox.shift(afwGeom.ExtentI(-bbox.getMinX(), -bbox.getMinY()))
+            expected[dbox.getMinY():dbox.getMaxY() + 1, dbox.getMinX():dbox.getMaxX() + 1] = True
+
+        for nThreads in (1, 3):
+            mi = self.interpolate(False, nThreads)
+            interp = (mi.getMask().getArray() & mi.getMask().getPlaneBitMask("INTRP")) != 0
+            self.assertTrue((interp == expected).all())
+
+    def testPlan(self):
+        """Check that a DefectInterpolationPlan can be applied to many images"""
+        bbox = self.mi.getBBox(afwImage.PARENT)
+        plan = algorithms.DefectInterpolationPlan(self.defectList, bbox)
+        expected = self.interpolate(True, 1)
+        for nThreads in (1, 3):
+            for i in range(2):
+                mi = self.mi.Factory(self.mi, True)
+                algorithms.interpolateOverDefects(mi, plan, 50.0, True, nThreads)
+                self.assertMaskedImagesEqual(mi, expected)
+
+        mi = self.mi.Factory(self.mi, True)
+        mi.setXY0(afwGeom.Point2I(0, 0))
+        self.assertRaises(pexExceptions.LengthError, algorithms.interpolateOverDefects, mi, plan)
+
+    def testPlanCache(self):
+        """Check that plans are reused for the same detector, bbox and defects"""
+        class Detector(object):
+            def __init__(self, name):
+                self.name = name
+            def getName(self):
+                return self.name
+
+        bbox = self.mi.getBBox(afwImage.PARENT)
+        ccd1, ccd2 = Detector("ccd1"), Detector("ccd2")
+        try:
+            plan = algorithms.getDefectInterpolationPlan(self.defectList, bbox, ccd1)
+            self.assertTrue(algorithms.getDefectInterpolationPlan(self.defectList, bbox, ccd1) is plan)
+            self.assertFalse(algorithms.getDefectInterpolationPlan(self.defectList, bbox, ccd2) is plan)
+            self.assertFalse(algorithms.getDefectInterpolationPlan(self.defectList, bbox) is plan)
+
+            subBox = afwGeom.BoxI(bbox.getMin(), afwGeom.ExtentI(100, 100))
+            subPlan = algorithms.getDefectInterpolationPlan(self.defectList, subBox, ccd1)
+            self.assertFalse(subPlan is plan)
+            self.assertEqual(subPlan.getBBox(), subBox)
+            #
+            # A different list of defects for the same detector gets its own plan
+            #
+            defectList = algorithms.DefectListT()
+            for defect in list(self.defectList)[1:]:
+                defectList.append(defect)
+            otherPlan = algorithms.getDefectInterpolationPlan(defectList, bbox, ccd1)
+            self.assertFalse(otherPlan is plan)
+            self.assertTrue(algorithms.getDefectInterpolationPlan(self.defectList, bbox, ccd1) is plan)
+            #
+            # Only the most recently used plans are kept
+            #
+            for i in range(algorithms.maxDefectInterpolationPlans):
+                algorithms.getDefectInterpolationPlan(self.defectList, bbox, Detector("ccd%d" % (i + 3)))
+            self.assertFalse(algorithms.getDefectInterpolationPlan(self.defectList, bbox, ccd1) is plan)
+        finally:
+            algorithms.clearDefectInterpolationPlanCache()
+
 #-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 
 def suite():
@@ -250,6 +378,7 @@ def suite():
         suites += unittest.makeSuite(interpolationTestCase)
     else:
         print "Skipping interpolation test case as afwdata isn't set up"
+    suites += unittest.makeSuite(DefectListTestCase)
     suites += unittest.makeSuite(tests.MemoryTestCase)
     return unittest.TestSuite(suites)
 
@@ -37,9 +37,11 @@ import os
 import sys
 from math import *
 import unittest
+import numpy
 import eups
 import lsst.utils.tests as tests
 import lsst.pex.config as pexConfig
+import lsst.pex.exceptions as pexExceptions
 import lsst.pex.logging as logging
 import lsst.afw.image as afwImage
 import lsst.afw.math as afwMath
@@ -189,6 +191,194 @@ class CosmicRayNullTestCase(unittest.TestCase):
         self.assertEqual(len(crs), 0, "Found %d CRs in empty image" % len(crs))
         
 
+class CosmicRayThreadsTestCase(unittest.TestCase):
+    """Check that the CRs found don't depend on how we scan for them"""
+    def setUp(self):
+        self.FWHM = 5                   # pixels
+        self.psf = algorithms.DoubleGaussianPsf(29, 29, self.FWHM/(2*sqrt(2*log(2))))
+
+        width, height = 200, 203
+        self.mi = afwImage.MaskedImageF(width, height)
+        rand = numpy.random.RandomState(12345)
+        self.mi.getImage().getArray()[:] = 100 + 10*rand.randn(height, width)
+        self.mi.getVariance().set(100)
+        #
+        # Add CRs, some of which cross the boundaries between the bands of rows scanned in parallel
+        #
+        im = self.mi.getImage().getArray()
+        for i in range(40):
+            x, y = rand.randint(5, width - 5), rand.randint(5, height - 5)
+            length = rand.randint(1, 12)
+            dx, dy = [(1, 0), (0, 1), (1, 1), (1, -1)][i%4]
+            for j in range(length):
+                xx, yy = x + j*dx, y + j*dy
+                if 0 <= xx < width and 0 <= yy < height:
+                    im[yy, xx] += 1000*(1 + rand.uniform())
+
+    def tearDown(self):
+        del self.psf
+        del self.mi
+
+    def testThresholds(self):
+        crConfig = algorithms.FindCosmicRaysConfig()
+        policy = pexConfig.makePolicy(crConfig)
+        centre = afwGeom.Point2D(self.mi.getWidth()/2.0, self.mi.getHeight()/2.0)
+
+        thresholds = crConfig.makeThresholds(self.psf, centre)
+        self.assertGreater(thresholds.getThresH(), 0)
+
+        results = []
+        for arg in (self.psf, thresholds):
+            mi = self.mi.Factory(self.mi, True)
+            crs = algorithms.findCosmicRays(mi, arg, 100.0, policy)
+            results.append((len(crs), mi))
+
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertTrue((results[0][1].getImage().getArray() == results[1][1].getImage().getArray()).all())
+
+    def testRowKernel(self):
+        results = []
+        for useRowKernel in (False, True):
+            mi = self.mi.Factory(self.mi, True)
+            crConfig = algorithms.FindCosmicRaysConfig()
+            crConfig.useRowKernel = useRowKernel
+            crs = algorithms.findCosmicRays(mi, self.psf, 100.0, pexConfig.makePolicy(crConfig))
+            results.append((len(crs), mi))
+
+        self.assertGreater(results[0][0], 0)
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertTrue((results[0][1].getImage().getArray() == results[1][1].getImage().getArray()).all())
+        self.assertTrue((results[0][1].getMask().getArray() == results[1][1].getMask().getArray()).all())
+
+    def testThreads(self):
+        results = []
+        for nThreads in (1, 2, 4, 7):
+            mi = self.mi.Factory(self.mi, True)
+            crConfig = algorithms.FindCosmicRaysConfig()
+            crConfig.nThreads = nThreads
+            crs = algorithms.findCosmicRays(mi, self.psf, 100.0, pexConfig.makePolicy(crConfig))
+            results.append((nThreads, len(crs), mi))
+
+        self.assertGreater(results[0][1], 0)
+        for nThreads, nCR, mi in results[1:]:
+            self.assertEqual(nCR, results[0][1], "nThreads = %d" % nThreads)
+            self.assertTrue((mi.getImage().getArray() == results[0][2].getImage().getArray()).all())
+            self.assertTrue((mi.getMask().getArray() == results[0][2].getMask().getArray()).all())
+
+class CosmicRayTilesTestCase(unittest.TestCase):
+    """Test finding CRs a tile at a time"""
+    def setUp(self):
+        self.FWHM = 5                   # pixels
+        self.psf = algorithms.DoubleGaussianPsf(29, 29, self.FWHM/(2*sqrt(2*log(2))))
+        self.tileSize = 64
+
+        width, height = 4*self.tileSize, 3*self.tileSize
+        self.mi = afwImage.MaskedImageF(width, height)
+        self.mi.setXY0(afwGeom.Point2I(10, 20))
+        rand = numpy.random.RandomState(666)
+        self.mi.getImage().getArray()[:] = 100 + 10*rand.randn(height, width)
+        self.mi.getVariance().set(100)
+        #
+        # Add CRs, well away from the boundaries of the tiles; there are many more in the first tile
+        #
+        im = self.mi.getImage().getArray()
+        for ty in range(height//self.tileSize):
+            for tx in range(width//self.tileSize):
+                first = (tx == 0 and ty == 0)
+                for i in range(15 if first else 2):
+                    x = tx*self.tileSize + rand.randint(20, 40)
+                    y = ty*self.tileSize + rand.randint(20, 40)
+                    dx, dy = [(1, 0), (0, 1), (1, 1), (1, -1)][i%4]
+                    for j in range(rand.randint(6 if first else 2, 12)):
+                        im[y + j*dy, x + j*dx] += 1000*(1 + rand.uniform())
+
+    def tearDown(self):
+        del self.psf
+        del self.mi
+
+    def testTiles(self):
+        crConfig = algorithms.FindCosmicRaysConfig()
+        crConfig.tileSize = self.tileSize
+
+        mi = self.mi.Factory(self.mi, True)
+        crs = algorithms.findCosmicRays(mi, self.psf, 100.0, pexConfig.makePolicy(crConfig))
+
+        tiled = self.mi.Factory(self.mi, True)
+        result = algorithms.findCosmicRaysInTiles(tiled, self.psf, 100.0, crConfig)
+
+        self.assertGreater(len(crs), 0)
+        self.assertEqual(len(result.crs), len(crs))
+        self.assertEqual(result.overflowedTiles, [])
+        self.assertTrue((tiled.getMask().getArray() == mi.getMask().getArray()).all())
+        #
+        # Thresholds computed once by the caller give the same answer
+        #
+        thresholds = crConfig.makeThresholds(self.psf, afwGeom.Point2D(self.mi.getWidth()/2.0,
+                                                                       self.mi.getHeight()/2.0))
+        tiled = self.mi.Factory(self.mi, True)
+        result = algorithms.findCosmicRaysInTiles(tiled, self.psf, 100.0, crConfig, thresholds=thresholds)
+        self.assertEqual(len(result.crs), len(crs))
+        self.assertTrue((tiled.getMask().getArray() == mi.getMask().getArray()).all())
+
+    def testSeams(self):
+        """Check that CRs that cross the boundaries between tiles are found just as in the whole image"""
+        mi = self.mi.Factory(self.mi.getDimensions())
+        mi.setXY0(self.mi.getXY0())
+        rand = numpy.random.RandomState(42)
+        mi.getImage().getArray()[:] = 100 + 10*rand.randn(mi.getHeight(), mi.getWidth())
+        mi.getVariance().set(100)
+        #
+        # CRs across vertical and horizontal seams, and through the corners where four tiles meet
+        #
+        im = mi.getImage().getArray()
+        ts = self.tileSize
+        for x, y, dx, dy, length in [(ts - 5, 30, 1, 0, 10), (2*ts - 1, 100, 1, 0, 3),
+                                     (3*ts + 20, ts - 4, 0, 1, 9), (40, 2*ts - 2, 1, 1, 5),
+                                     (2*ts - 3, ts - 3, 1, 1, 7), (3*ts + 3, 2*ts - 4, -1, 1, 8)]:
+            for j in range(length):
+                im[y + j*dy, x + j*dx] += 1000*(1 + rand.uniform())
+
+        crConfig = algorithms.FindCosmicRaysConfig()
+        crConfig.tileSize = self.tileSize
+        for keepCRs in (True, False):
+            untiled = mi.Factory(mi, True)
+            crs = algorithms.findCosmicRays(untiled, self.psf, 100.0, pexConfig.makePolicy(crConfig), keepCRs)
+
+            tiled = mi.Factory(mi, True)
+            result = algorithms.findCosmicRaysInTiles(tiled, self.psf, 100.0, crConfig, keepCRs)
+
+            self.assertEqual(len(crs), 6)
+            self.assertEqual(len(result.crs), len(crs), "keepCRs = %s" % keepCRs)
+            self.assertEqual(sorted(cr.getNpix() for cr in result.crs), sorted(cr.getNpix() for cr in crs))
+            self.assertTrue((tiled.getMask().getArray() == untiled.getMask().getArray()).all())
+            if keepCRs:
+                self.assertTrue((tiled.getImage().getArray() == mi.getImage().getArray()).all())
+
+    def testOverflow(self):
+        crConfig = algorithms.FindCosmicRaysConfig()
+        crConfig.tileSize = self.tileSize
+        crConfig.nCrPixelMax = 40
+
+        mi = self.mi.Factory(self.mi, True)
+        self.assertRaises(pexExceptions.LengthError, algorithms.findCosmicRays,
+                          mi, self.psf, 100.0, pexConfig.makePolicy(crConfig))
+
+        tiled = self.mi.Factory(self.mi, True)
+        result = algorithms.findCosmicRaysInTiles(tiled, self.psf, 100.0, crConfig)
+
+        self.assertGreater(len(result.crs), 0)
+        self.assertEqual(len(result.overflowedTiles), 1)
+        bbox = result.overflowedTiles[0]
+        self.assertEqual(bbox.getMin(), self.mi.getXY0())
+        #
+        # The overflowed tile is untouched
+        #
+        sub = afwImage.MaskedImageF(tiled, bbox, afwImage.PARENT)
+        original = afwImage.MaskedImageF(self.mi, bbox, afwImage.PARENT)
+        self.assertTrue((sub.getImage().getArray() == original.getImage().getArray()).all())
+        crBit = tiled.getMask().getPlaneBitMask("CR")
+        self.assertFalse((sub.getMask().getArray() & crBit).any())
+
 #-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 
 def suite():
@@ -201,6 +391,8 @@ def suite():
     else:
         print >> sys.stderr, "afwdata is not setup; skipping CosmicRayTestCase"
     suites += unittest.makeSuite(CosmicRayNullTestCase)
+    suites += unittest.makeSuite(CosmicRayThreadsTestCase)
+    suites += unittest.makeSuite(CosmicRayTilesTestCase)
     suites += unittest.makeSuite(tests.MemoryTestCase)
     return unittest.TestSuite(suites)
 
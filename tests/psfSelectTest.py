@@ -38,6 +38,7 @@ import lsst.afw.image           as afwImage
 import lsst.afw.geom            as afwGeom
 import lsst.afw.table           as afwTable
 import lsst.afw.geom.ellipses   as geomEllip
+import lsst.afw.detection       as afwDetection
 import lsst.meas.algorithms     as measAlg
 import lsst.meas.base           as measBase
 
@@ -461,6 +462,151 @@ class PsfSelectionTestCase(unittest.TestCase):
         # no contamination by small gxys
         self.assertEqual(ngxyC, 0)
 
+    def testShapeHistogramFill(self):
+        """Check that filling the shape histogram with arrays matches inserting one point at a time"""
+        from lsst.meas.algorithms.secondMomentStarSelector import _PsfShapeHistogram
+
+        xSize, ySize = 32, 32
+        rand = numpy.random.RandomState(12345)
+        ixx = rand.uniform(-5, 35, 2000)
+        iyy = rand.uniform(-5, 35, 2000)
+        ixx[:3] = [numpy.nan, 0.5, 29.99]
+        iyy[:3] = [1.0, 0.5, 30.0]
+
+        hist = _PsfShapeHistogram(xSize=xSize, ySize=ySize, ixxMax=30, iyyMax=30)
+        inserted = hist.insertMoments(ixx, iyy)
+        #
+        # The rule that _PsfShapeHistogram.insert used to apply source by source
+        #
+        expected = numpy.zeros((ySize, xSize))
+        expectedInserted = numpy.zeros(len(ixx), dtype=bool)
+        for k, (xx, yy) in enumerate(zip(ixx, iyy)):
+            x, y = hist.momentsToPixel(xx, yy)
+            try:
+                i, j = int(x), int(y)
+            except ValueError:
+                continue
+            if 0 <= i < xSize and 0 <= j < ySize and (i != 0 or j != 0):
+                expected[j, i] += 1
+                expectedInserted[k] = True
+
+        self.assertTrue(numpy.all(inserted == expectedInserted))
+        self.assertTrue(numpy.all(hist.getImage().getArray() == expected))
+        self.assertEqual(hist._num, expectedInserted.sum())
+
+
+    def testShapeHistogramClumps(self):
+        """Check that the clumps found in the shape histogram agree with running the measurement framework
+        on it, as getClumps used to do"""
+        from lsst.meas.algorithms.secondMomentStarSelector import _PsfShapeHistogram
+
+        xSize, ySize = 32, 32
+        hist = _PsfShapeHistogram(xSize=xSize, ySize=ySize, ixxMax=30, iyyMax=30)
+        #
+        # A smooth, tilted, clump
+        #
+        y, x = numpy.indices((ySize, xSize))
+        dx, dy = x - 12.3, y - 9.7
+        sxx, sxy, syy = 4.0, 1.0, 2.5
+        det = sxx*syy - sxy**2
+        hist._hist[:] = numpy.round(200*numpy.exp(-0.5*(syy*dx**2 - 2*sxy*dx*dy + sxx*dy**2)/det))
+        hist._num = int(hist._hist.sum())
+
+        clumps = hist.getClumps()
+        expected = measureHistogramClumps(hist.getImage())
+        self.assertEqual(len(clumps), 1)
+        self.assertEqual(len(expected), 1)
+
+        clump, (x, y, ixx, ixy, iyy) = clumps[0], expected[0]
+        self.assertLess(abs(clump.x - x), 0.1)
+        self.assertLess(abs(clump.y - y), 0.1)
+        det = ixx*iyy - ixy**2
+        for val, expect in [(clump.a, iyy/det), (clump.b, -ixy/det), (clump.c, ixx/det)]:
+            self.assertLess(abs(val - expect), 0.05*max(iyy, ixx)/det)
+
+    def testSourceMoments(self):
+        """Check getSourceMoments against transforming each source's moments by the transform linearized at
+        its own position, both for small catalogs (which are linearized exactly) and large ones (for which
+        the linearization is interpolated)"""
+        from lsst.meas.algorithms.utils import getSourceMoments
+
+        #
+        # A 1% distortion at the corners of the image.  The errors in bilinearly interpolating its
+        # linearization are ~(grid spacing)^2*(its second derivatives) ~ 5e-6
+        #
+        pixToTanXYTransform = afwGeom.RadialXYTransform([0.0, 1.0, 0.0, 2e-8])
+        nGrid = 32
+
+        schema = afwTable.SourceTable.makeMinimalSchema()
+        for name in ["centroid_x", "centroid_y", "shape_xx", "shape_yy", "shape_xy"]:
+            schema.addField(name, type=float)
+        for name in ["centroid_flag", "shape_flag"]:
+            schema.addField(name, type='Flag')
+
+        rand = numpy.random.RandomState(54321)
+        for nSource, tol in [(nGrid*nGrid, 1e-10), (nGrid*nGrid + 1, 1e-4), (5000, 1e-4)]:
+            catalog = afwTable.SourceCatalog(schema)
+            catalog.defineCentroid("centroid")
+            catalog.defineShape("shape")
+            for i in range(nSource):
+                source = catalog.addNew()
+                source.set("centroid_x", rand.uniform(0, self.nx - 1))
+                source.set("centroid_y", rand.uniform(0, self.ny - 1))
+                source.set("shape_xx", rand.uniform(1, 10))
+                source.set("shape_yy", rand.uniform(1, 10))
+                source.set("shape_xy", rand.uniform(-1, 1))
+
+            ixx, ixy, iyy = getSourceMoments(catalog, pixToTanXYTransform, nGrid)
+            for i, source in enumerate(catalog):
+                p = afwGeom.Point2D(source.getX(), source.getY())
+                linTransform = pixToTanXYTransform.linearizeForwardTransform(p).getLinear()
+                m = geomEllip.Quadrupole(source.getIxx(), source.getIyy(), source.getIxy())
+                m.transform(linTransform)
+                scale = m.getIxx() + m.getIyy()
+                self.assertLess(abs(ixx[i] - m.getIxx()), tol*scale)
+                self.assertLess(abs(ixy[i] - m.getIxy()), tol*scale)
+                self.assertLess(abs(iyy[i] - m.getIyy()), tol*scale)
+
+def measureHistogramClumps(psfImage):
+    """Measure the clumps in a shape histogram with FootprintSet and the measurement framework, as
+    _PsfShapeHistogram.getClumps used to; return a list of (x, y, ixx, ixy, iyy)"""
+    width, height = psfImage.getWidth(), psfImage.getHeight()
+    largeImg = psfImage.Factory(afwGeom.ExtentI(2*width, 2*height))
+    largeImg.set(0)
+    subLargeImg = psfImage.Factory(largeImg, afwGeom.BoxI(afwGeom.PointI(width, height),
+                                                          afwGeom.ExtentI(width, height)), afwImage.LOCAL)
+    subLargeImg <<= psfImage
+    del subLargeImg
+
+    var = afwImage.ImageF(largeImg.getDimensions())
+    var.set(1)
+    mpsfImage = afwImage.MaskedImageF(largeImg, afwImage.MaskU(largeImg.getDimensions(), 0), var)
+    mpsfImage.setXY0(afwGeom.PointI(-width, -height))
+    exposure = afwImage.makeExposure(mpsfImage)
+    exposure.setPsf(measAlg.DoubleGaussianPsf(11, 11, 1.5))
+
+    maxVal = psfImage.getArray().max()
+    threshold = maxVal - math.sqrt(maxVal)
+    ds = afwDetection.FootprintSet(mpsfImage, afwDetection.Threshold(threshold), "DETECTED")
+
+    schema = afwTable.SourceTable.makeMinimalSchema()
+    config = measBase.SingleFrameMeasurementConfig()
+    config.slots.centroid = "base_SdssCentroid"
+    config.slots.psfFlux = None
+    config.slots.apFlux = "base_CircularApertureFlux_0"
+    config.slots.modelFlux = None
+    config.slots.instFlux = None
+    config.slots.shape = "base_SdssShape"
+    config.algorithms.names = ["base_SdssCentroid", "base_CircularApertureFlux", "base_SdssShape"]
+    config.algorithms["base_CircularApertureFlux"].radii = [3.0]
+    task = measBase.SingleFrameMeasurementTask(schema, config=config)
+
+    catalog = afwTable.SourceCatalog(schema)
+    ds.makeSources(catalog)
+    task.run(exposure, catalog)
+
+    return [(s.getX(), s.getY(), s.getIxx(), s.getIxy(), s.getIyy()) for s in catalog
+            if not s.getCentroidFlag()]
 
 #-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 
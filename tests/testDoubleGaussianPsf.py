@@ -164,6 +164,50 @@ class DoubleGaussianPsfTestCase(unittest.TestCase):
             mos.setBackground(-0.1)
             ds9.mtv(mos.makeMosaic([kIm, dgIm, diff], mode="x"), frame=1)
 
+    def testAnalyticEvaluation(self):
+        """Test the analytic kernel image, shape and aperture flux against the generic KernelPsf
+        implementations"""
+        sigma = self.psf.getSigma1()
+        for psf in (self.psf,
+                    measAlg.DoubleGaussianPsf(self.ksize, self.ksize, sigma),
+                    measAlg.SingleGaussianPsf(self.ksize, self.ksize, sigma)):
+            kPsf = measAlg.KernelPsf(psf.getKernel())
+
+            for point in (afwGeom.Point2D(0, 0), afwGeom.Point2D(10.3, -5.7)):
+                im = psf.computeKernelImage(point)
+                kIm = kPsf.computeKernelImage(point)
+                self.assertEqual(im.getBBox(afwImage.PARENT), kIm.getBBox(afwImage.PARENT))
+                self.assertLess(numpy.abs(im.getArray() - kIm.getArray()).max(), 1E-14)
+
+                shape = psf.computeShape(point)
+                kShape = kPsf.computeShape(point)
+                self.assertAlmostEqual(shape.getIxx()/kShape.getIxx(), 1.0, places=3)
+                self.assertAlmostEqual(shape.getIyy()/kShape.getIyy(), 1.0, places=3)
+                self.assertAlmostEqual(shape.getIxy(), 0.0)
+
+                for radius in (1.0, 3.0, 5.0):
+                    self.assertAlmostEqual(psf.computeApertureFlux(radius, point),
+                                           kPsf.computeApertureFlux(radius, point), places=3)
+
+    def testTruncatedAnalyticEvaluation(self):
+        """Test that the shape and aperture flux describe the kernel image when the kernel's box
+        truncates the profile, as it does for GaussianPsfFactory's defaults"""
+        factory = measAlg.GaussianPsfFactory()
+        dgPsf = factory.apply()
+        factory.addWing = False
+        sgPsf = factory.apply()
+        for psf in (dgPsf, sgPsf):
+            kPsf = measAlg.KernelPsf(psf.getKernel())
+            point = afwGeom.Point2D(0, 0)
+            for radius in (3.0, 4.0):
+                self.assertAlmostEqual(psf.computeApertureFlux(radius, point),
+                                       kPsf.computeApertureFlux(radius, point), places=6)
+            shape = psf.computeShape(point)
+            kShape = kPsf.computeShape(point)
+            self.assertAlmostEqual(shape.getIxx(), kShape.getIxx(), places=6)
+            self.assertAlmostEqual(shape.getIyy(), kShape.getIyy(), places=6)
+            self.assertAlmostEqual(shape.getIxy(), kShape.getIxy(), places=6)
+
     def testCast(self):
         base1 = self.psf.clone()
         self.assertEqual(type(base1), afwDetect.Psf)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+#
+# LSST Data Management System
+# Copyright 2008-2015 LSST Corporation.
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <http://www.lsstcorp.org/LegalNotices/>.
+#
+"""Tests for the k-means clustering used by the objectSize star selector"""
+import unittest
+
+import numpy
+
+import lsst.utils.tests as utilsTests
+from lsst.meas.algorithms.objectSizeStarSelector import _assignClusters, _clusterCenters, _kcenters, \
+    _improveCluster
+
+class ObjectSizeClusteringTestCase(unittest.TestCase):
+    """Cluster a fixed set of sizes, and check the answers against those worked out by hand"""
+
+    def setUp(self):
+        # 20 stars of widths 2.00, 2.01, ..., 2.19 and 10 galaxies of widths 5.0, 5.1, ..., 5.9, shuffled
+        self.stars = 2.0 + 0.01*numpy.arange(20)
+        self.galaxies = 5.0 + 0.1*numpy.arange(10)
+        self.yvec = numpy.concatenate([self.stars, self.galaxies])
+        self.order = numpy.random.RandomState(12345).permutation(len(self.yvec))
+        self.yvec = self.yvec[self.order]
+        self.isStar = self.order < len(self.stars)
+
+    def testAssignClusters(self):
+        """Points go to the nearest centre, ties to the lower-numbered one, and never to a NaN centre"""
+        yvec = numpy.array([0.9, 1.0, 1.5, 2.1, 3.2])
+        self.assertEqual(list(_assignClusters(yvec, [1.0, 2.0, numpy.nan])), [0, 0, 0, 1, 1])
+        self.assertEqual(list(_assignClusters(yvec, [2.0, 1.0])), [1, 1, 0, 0, 0])
+        self.assertEqual(list(_assignClusters(yvec, [numpy.nan, 2.0])), [0, 0, 0, 0, 0])
+
+    def testClusterCenters(self):
+        """The means and medians of the clusters, with NaN for an empty one"""
+        ysorted = numpy.array([1.0, 2.0, 3.0, 4.0, 10.0, 11.0])
+        clusterId = numpy.array([0, 1, 0, 2, 1, 0])
+        #
+        # Cluster 0 is (1, 3, 11), cluster 1 is (2, 10), cluster 2 is (4), and cluster 3 is empty
+        #
+        means = _clusterCenters(ysorted, clusterId, 4, False)
+        self.assertTrue(numpy.allclose(means[:3], [5.0, 6.0, 4.0]))
+        self.assertTrue(numpy.isnan(means[3]))
+
+        medians = _clusterCenters(ysorted, clusterId, 4, True)
+        self.assertTrue(numpy.allclose(medians[:3], [3.0, 6.0, 4.0]))
+        self.assertTrue(numpy.isnan(medians[3]))
+
+    def testKCenters(self):
+        """Separate the stars from the galaxies, using both the mean and the median"""
+        for useMedian in (False, True):
+            centers, clusterId = _kcenters(self.yvec, 2, useMedian=useMedian)
+            self.assertTrue(numpy.all(clusterId == numpy.where(self.isStar, 0, 1)))
+            self.assertTrue(numpy.allclose(centers, [2.095, 5.45]))
+
+        centers, clusterId = _kcenters(numpy.concatenate([self.yvec, [2.0, 2.0, 2.0, 9.0]]), 2,
+                                       useMedian=True)
+        self.assertTrue(numpy.allclose(centers, [2.08, 5.5]))
+
+    def testImproveCluster(self):
+        """Clip two galaxies that were wrongly put in the stars' cluster
+
+        The median of the 22 points in cluster 0 is 2.105, and their standard deviation (0.85) is
+        larger than 0.741*(interquartile range) = 0.0815, so with nsigma = 2 the points within 0.163
+        of 2.105, i.e. the stars, are kept; next time round the median is 2.095, and the standard
+        deviation is 0.058, so the stars are all still within 2 sigma
+        """
+        clusterId = numpy.where(self.isStar, 0, 1)
+        misassigned = numpy.where(numpy.logical_not(self.isStar))[0][:2]
+        clusterId[misassigned] = 0
+        centers = numpy.array([2.0, 5.0])
+
+        clusterId = _improveCluster(self.yvec, centers, clusterId, nsigma=2.0)
+        expected = numpy.where(self.isStar, 0, 1)
+        expected[misassigned] = -1
+        self.assertTrue(numpy.all(clusterId == expected))
+        self.assertAlmostEqual(centers[0], 2.095)
+        self.assertEqual(centers[1], 5.0)
+        #
+        # With a tight enough clip some of the stars go too; now the standard deviation is smaller than
+        # 0.741*(interquartile range) = 0.0741, so it's used as sigma
+        #
+        clusterId = numpy.where(self.isStar, 0, 1)
+        clusterId = _improveCluster(self.yvec, centers, clusterId, nsigma=0.5, nIteration=1)
+        kept = numpy.abs(self.yvec - 2.095) < 0.5*numpy.std(self.stars)
+        nStar = numpy.count_nonzero(clusterId == 0)
+        self.assertGreater(nStar, 0)
+        self.assertLess(nStar, len(self.stars))
+        self.assertTrue(numpy.all(clusterId[self.isStar] == numpy.where(kept[self.isStar], 0, -1)))
+        self.assertTrue(numpy.all(clusterId[numpy.logical_not(self.isStar)] == 1))
+
+    def testImproveSmallCluster(self):
+        """Clusters of fewer than 5 points are left alone"""
+        clusterId = numpy.array([0, 0, 0, 0, 1, 1])
+        yvec = numpy.array([1.0, 1.1, 1.2, 9.0, 5.0, 6.0])
+        centers = numpy.array([1.0, 5.5])
+        self.assertTrue(numpy.all(_improveCluster(yvec, centers, clusterId.copy()) == clusterId))
+        self.assertEqual(list(centers), [1.0, 5.5])
+
+#-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
+
+def suite():
+    """Returns a suite containing all the test cases in this module."""
+    utilsTests.init()
+
+    suites = []
+    suites += unittest.makeSuite(ObjectSizeClusteringTestCase)
+    suites += unittest.makeSuite(utilsTests.MemoryTestCase)
+    return unittest.TestSuite(suites)
+
+def run(exit=False):
+    """Run the tests"""
+    utilsTests.run(suite(), exit)
+
+if __name__ == "__main__":
+    run(True)
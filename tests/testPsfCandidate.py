@@ -150,6 +150,39 @@ class CandidateMaskingTestCase(unittest.TestCase):
         """
         self.checkCandidateMasking([(self.x+5, self.y, 0.5)], threshold=0.9, pixelThreshold=1.0)
 
+    def testImageCache(self):
+        """Test that the candidate's images are cached until we ask for them to be cleared"""
+        cand = self.createCandidate()
+        image = self.exp.getMaskedImage().getImage()
+
+        def getCenter(size):
+            return cand.getMaskedImage(size, size).getImage().get(size//2, size//2)
+
+        def getOffsetCenter(buffer=1):
+            im = cand.getOffsetImage("lanczos5", buffer).getImage()
+            return im.get(im.getWidth()//2, im.getHeight()//2)
+
+        self.assertEqual(getCenter(25), 1.0)
+        self.assertAlmostEqual(getOffsetCenter(), 1.0, places=5)
+
+        image[self.x, self.y] = 2.0
+        self.assertEqual(getCenter(25), 1.0)
+        self.assertAlmostEqual(getOffsetCenter(), 1.0, places=5)
+        self.assertEqual(getCenter(23), 2.0) # a new size
+        self.assertAlmostEqual(getOffsetCenter(2), 2.0, places=5) # a new buffer
+
+        cand.clearImageCache()
+        self.assertEqual(getCenter(25), 2.0)
+        self.assertAlmostEqual(getOffsetCenter(), 2.0, places=5)
+
+        image[self.x, self.y] = 3.0
+        oldPixelThreshold = cand.getPixelThreshold()
+        try:
+            cand.setPixelThreshold(oldPixelThreshold + 1.0) # invalidates all candidates' images
+            self.assertEqual(getCenter(25), 3.0)
+        finally:
+            cand.setPixelThreshold(oldPixelThreshold)
+
 
 #-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-
 
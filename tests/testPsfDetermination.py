@@ -218,7 +218,8 @@ class SpatialModelPsfTestCase(unittest.TestCase):
         del self.catalog
 
     @staticmethod
-    def setupDeterminer(exposure, nEigenComponents=3, starSelectorAlg="secondMoment"):
+    def setupDeterminer(exposure, nEigenComponents=3, starSelectorAlg="secondMoment", nThreads=1,
+                        spatialSolver="ldlt"):
         """Setup the starSelector and psfDeterminer"""
         starSelectorFactory = measAlg.starSelectorRegistry[starSelectorAlg]
         starSelectorConfig = starSelectorFactory.ConfigClass()
@@ -251,6 +252,8 @@ class SpatialModelPsfTestCase(unittest.TestCase):
         psfDeterminerConfig.kernelSizeMin = 31
         psfDeterminerConfig.nStarPerCell = 0
         psfDeterminerConfig.nStarPerCellSpatialFit = 0 # unlimited
+        psfDeterminerConfig.nThreads = nThreads
+        psfDeterminerConfig.spatialSolver = spatialSolver
         psfDeterminer = psfDeterminerFactory(psfDeterminerConfig)
 
         return starSelector, psfDeterminer
@@ -365,6 +368,99 @@ class SpatialModelPsfTestCase(unittest.TestCase):
 
         self.assertEqual(psf.getKernel().getNKernelParameters(), nEigen)
 
+    def testPsfDeterminerThreads(self):
+        """Test that the PSF doesn't depend on the number of threads used to fit it"""
+
+        kImages = {}
+        for nThreads in (1, 2, 4):
+            starSelector, psfDeterminer = \
+                SpatialModelPsfTestCase.setupDeterminer(self.exposure, nEigenComponents=2, nThreads=nThreads)
+            metadata = dafBase.PropertyList()
+            psfCandidateList = starSelector.selectStars(self.exposure, self.catalog)
+            psf, cellSet = psfDeterminer.determinePsf(self.exposure, psfCandidateList, metadata)
+
+            kImages[nThreads] = [psf.computeKernelImage(afwGeom.Point2D(x, y)).getArray()
+                                 for x, y in [(20, 20), (55, 150), (90, 280)]]
+
+        for k1, k2, k4 in zip(kImages[1], kImages[2], kImages[4]):
+            self.assertTrue((k2 == k4).all()) # the partial sums are the same, whatever the no. of threads
+            self.assertLess(numpy.abs(k1 - k2).max(), 1e-6*numpy.abs(k1).max())
+
+    def testPsfDeterminerSolver(self):
+        """Test that the LDL^T and SVD spatial solvers agree, and that we're told which was used"""
+
+        kImages = {}
+        for solver in ("ldlt", "svd"):
+            starSelector, psfDeterminer = \
+                SpatialModelPsfTestCase.setupDeterminer(self.exposure, nEigenComponents=2,
+                                                        spatialSolver=solver)
+            metadata = dafBase.PropertyList()
+            psfCandidateList = starSelector.selectStars(self.exposure, self.catalog)
+            psf, cellSet = psfDeterminer.determinePsf(self.exposure, psfCandidateList, metadata)
+            self.assertEqual(metadata.get("spatialFitSolver"), solver)
+
+            kImages[solver] = [psf.computeKernelImage(afwGeom.Point2D(x, y)).getArray()
+                               for x, y in [(20, 20), (55, 150), (90, 280)]]
+
+        for kLdlt, kSvd in zip(kImages["ldlt"], kImages["svd"]):
+            self.assertLess(numpy.abs(kLdlt - kSvd).max(), 1e-6*numpy.abs(kSvd).max())
+        #
+        # Only callers that pass a solver are told which one was used
+        #
+        kernel = afwMath.cast_LinearCombinationKernel(psf.getKernel())
+        status, chi2 = measAlg.fitSpatialKernelFromPsfCandidates(kernel, cellSet, False, 0)
+        self.assertTrue(status)
+        status, (chi2Solver, solver) = measAlg.fitSpatialKernelFromPsfCandidates(kernel, cellSet, False, 0,
+                                                                               1e-5, 0.0, 1, "ldlt")
+        self.assertTrue(status)
+        self.assertEqual(solver, "ldlt")
+        self.assertEqual(chi2Solver, chi2)
+
+    def testKernelParamResiduals(self):
+        """Test computing all the candidates' kernel parameter residuals from the spatial model at once"""
+
+        starSelector, psfDeterminer = SpatialModelPsfTestCase.setupDeterminer(self.exposure)
+        metadata = dafBase.PropertyList()
+        psfCandidateList = starSelector.selectStars(self.exposure, self.catalog)
+        psf, cellSet = psfDeterminer.determinePsf(self.exposure, psfCandidateList, metadata)
+
+        kernel = afwMath.cast_LinearCombinationKernel(psf.getKernel())
+        expected = []
+        for cell in cellSet.getCellList():
+            for cand in cell.begin(False):
+                cand = measAlg.cast_PsfCandidateF(cand)
+                x, y = cand.getXCenter(), cand.getYCenter()
+                try:
+                    im = cand.getMaskedImage(kernel.getWidth(), kernel.getHeight())
+                except Exception:
+                    expected.append([numpy.nan]*kernel.getNKernelParameters())
+                    continue
+
+                params, kernels = measAlg.fitKernelParamsToImage(kernel, im, afwGeom.Point2D(x, y))
+                amp = sum(p*afwMath.cast_FixedKernel(k).getSum() for p, k in zip(params, kernels))
+                expected.append([p/amp - kernel.getSpatialFunction(i)(x, y) for i, p in enumerate(params)])
+        expected = numpy.array(expected)
+
+        for nThreads in (1, 2):
+            residuals = measAlg.computeKernelParamResiduals(kernel, cellSet, nThreads)
+            self.assertEqual(residuals.shape, expected.shape)
+            self.assertTrue((numpy.isnan(residuals) == numpy.isnan(expected)).all())
+            good = numpy.isfinite(expected)
+            self.assertLess(numpy.abs(residuals[good] - expected[good]).max(), 1e-10)
+
+    def testPcaPsfBatchEvaluation(self):
+        """Test that PcaPsf's computeKernelImages matches per-point evaluation"""
+        xMax, yMax = self.mi.getWidth() - 1.0, self.mi.getHeight() - 1.0
+        points = numpy.array([[0.0, 0.0], [100.5, 200.25], [xMax, yMax], [numpy.nan, numpy.nan],
+                              [100.5, 200.25]])
+        images = self.exactPsf.computeKernelImages(points)
+        self.assertEqual(images.shape, (len(points), self.ksize, self.ksize))
+        for n, (x, y) in enumerate(points):
+            point = afwGeom.Point2D(x, y) if numpy.isfinite(x) else self.exactPsf.getAveragePosition()
+            image = self.exactPsf.computeKernelImage(point)
+            self.assertTrue(numpy.allclose(images[n], image.getArray(), rtol=0.0, atol=1E-14))
+        self.assertFalse(numpy.allclose(images[0], images[2], rtol=0.0, atol=1E-6))
+
     def testCandidateList(self):
         self.assertFalse(self.cellSet.getCellList()[0].empty())
         self.assertTrue(self.cellSet.getCellList()[1].empty())